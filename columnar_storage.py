@@ -0,0 +1,443 @@
+"""
+This is a typed, column-by-column storage format for the dataframes handed from one step to the next.
+
+Every step reads the previous step's CSV with pd.read_csv and writes its own with to_csv, so every step
+parses all of the floats again, guesses every column's dtype again, and can turn missing values into the
+string "nan" or real words like "null" and "NA" into missing values. A table stored here is a folder with:
+    schema.json             the step, the number of rows, and the name and type of every column
+    {i}.npy                 the values of column i if it is a float, int, Int64 or bool column
+    {i}.offsets.npy         where each value of string column i starts and ends in {i}.data.npy
+    {i}.data.npy            the UTF-8 bytes of all of the values of string column i
+    {i}.valid.npy           which values of string or Int64 column i are not missing
+
+The .npy files are memory-mapped when they are read, so numeric columns are read without copying,
+and only the columns that are asked for are opened. Each section 2 step has a fixed schema (the columns
+it must have and their types), which is checked when its table is written. Counts and 0/1 columns that can be
+missing are Int64 (nullable integer) columns, so they are written to CSV files as "15", the same as the notebooks,
+and not as "15.0".
+
+CSV files are still used for the steps that are annotated by hand (1.3, 1.5 and 2.13), with export_csv and import_csv.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+ASR_SYSTEMS = ["amazon", "deepspeech", "google", "IBMWatson", "microsoft"]
+
+#only these ASR systems give a confidence level
+CONFIDENCE_ASR_SYSTEMS = ["deepspeech", "google", "IBMWatson"]
+
+COLUMN_TYPES = ("string", "float", "int", "Int64", "bool")
+
+SCHEMA_FILENAME = "schema.json"
+
+
+#####################################################################################################
+############################### SECTION 1: SCHEMAS ##################################################
+#####################################################################################################
+
+def _per_ASR(column_template, column_type):
+    return [(column_template.format(asr=asr), column_type) for asr in ASR_SYSTEMS]
+
+
+#the columns each step adds, in the order it adds them. the features that only some CSVs have are in FEATURE_COLUMNS
+STAGE_ADDED_COLUMNS = {
+    "2.0": [("File", "string"), ("Line", "int"), ("Speaker", "string"),
+            ("UttStartTime", "float"), ("UttEndTime", "float"), ("UttLength", "float"),
+            ("Content", "string"), ("InstancesCountPerLine", "int"), ("FeatureCountPerLine", "int")],
+    "2.2": [("WadaSNRMeade", "float"), ("WadaSNRRigal", "float"), ("NistSNRRigal", "float")],
+    "2.3": [("SyllableCount", "Int64"), ("SpeechRate", "float")],
+    "2.4": (_per_ASR("{asr}_transcription", "string")
+            + [(f"{asr}_ConfidenceLevel", "float") for asr in CONFIDENCE_ASR_SYSTEMS]),
+    "2.5": [("Content_cleaned", "string")] + _per_ASR("{asr}_transcription_cleaned", "string"),
+    "2.6": ([("IterationNumber", "int"),
+             ("Content_WordCount", "Int64"), ("Content_PreFeature", "string"), ("Content_PreFeature_WordCount", "Int64"),
+             ("Content_PostFeature", "string"), ("Content_PostFeature_WordCount", "Int64"),
+             ("Content_cleaned_WordCount", "Int64"), ("Content_cleaned_PreFeature", "string"),
+             ("Content_cleaned_PreFeature_WordCount", "Int64"), ("Content_cleaned_PostFeature", "string"),
+             ("Content_cleaned_PostFeature_WordCount", "Int64")]
+            + _per_ASR("{asr}_transcription_WordCount", "Int64")
+            + _per_ASR("{asr}_transcription_cleaned_WordCount", "Int64")),
+    "2.7": _per_ASR("{asr}_transcription_cleaned_TotalWER", "float"),
+    "2.8": (_per_ASR("{asr}_transcription_cleaned_Alignments", "string")
+            + _per_ASR("{asr}_transcription_cleaned_preFeature_errorCount", "Int64")
+            + _per_ASR("{asr}_transcription_cleaned_postFeature_errorCount", "Int64")),
+    "2.9": (_per_ASR("{asr}_transcription_cleaned_preFeature_WER", "float")
+            + _per_ASR("{asr}_transcription_cleaned_postFeature_WER", "float")),
+    "2.10": _per_ASR("{asr}_transcription_cleaned_containsFeature", "Int64"),
+    "2.11": _per_ASR("{asr}_transcription_cleaned_adjacentTokens", "Int64"),
+    "2.12": _per_ASR("{asr}_transcription_cleaned_correctness", "Int64"),
+    "2.12.5": [],
+    "2.13": [],
+}
+
+STAGE_ORDER = list(STAGE_ADDED_COLUMNS)
+
+#the columns only one feature's CSVs have, with the step that adds them
+FEATURE_COLUMNS = {
+    "aint_variations": [("2.0", "AintVariation", "string"), ("2.13", "Aint_NonAint", "Int64")],
+    "be": [("2.12.5", "Habituality", "Int64")],
+    "done": [("2.12.5", "Completive", "Int64")],
+}
+
+
+def get_stage_schema(stage, feature=None):
+    """
+    Takes a step name (like "2.5") and optionally a feature. Returns a dictionary of
+    column name: type for every column the step's table must have.
+    """
+
+    if stage not in STAGE_ADDED_COLUMNS:
+        raise ValueError(f"There is no schema for step {stage}. The steps with schemas are {', '.join(STAGE_ORDER)}.")
+
+    schema = {}
+
+    for earlier_stage in STAGE_ORDER[:STAGE_ORDER.index(stage) + 1]:
+
+        schema.update(STAGE_ADDED_COLUMNS[earlier_stage])
+
+        for column_stage, column_name, column_type in FEATURE_COLUMNS.get(feature, []):
+            if column_stage == earlier_stage:
+                schema[column_name] = column_type
+
+    return schema
+
+
+def infer_column_type(values):
+    """Takes a pandas series and returns the storage type that fits its dtype."""
+
+    if pd.api.types.is_bool_dtype(values):
+        return "bool"
+
+    if pd.api.types.is_integer_dtype(values):
+        return "Int64" if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) else "int"
+
+    if pd.api.types.is_float_dtype(values):
+        return "float"
+
+    return "string"
+
+
+def get_column_types(df, stage=None, feature=None, extra_columns=None):
+    """
+    Takes a dataframe, and optionally a step, a feature and a dictionary of column name: type for columns
+    that are not in the step's schema. Returns a dictionary of column name: type in the dataframe's column order.
+    Without a step, the types are inferred from the dtypes. With a step, every column of the step's schema
+    must be in the dataframe, and every column of the dataframe must be in the schema or extra_columns.
+    """
+
+    extra_columns = extra_columns or {}
+
+    if stage is None:
+        return {column_name: extra_columns.get(column_name, infer_column_type(df[column_name])) for column_name in df.columns}
+
+    schema = get_stage_schema(stage, feature)
+    schema.update(extra_columns)
+
+    missing_columns = [column_name for column_name in schema if column_name not in df.columns and column_name not in extra_columns]
+    unknown_columns = [column_name for column_name in df.columns if column_name not in schema]
+
+    if missing_columns:
+        raise ValueError(f"The step {stage} table is missing these columns: {missing_columns}")
+
+    if unknown_columns:
+        raise ValueError(f"These columns are not in the step {stage} schema: {unknown_columns}. Pass their types with extra_columns.")
+
+    return {column_name: schema[column_name] for column_name in df.columns}
+
+
+#####################################################################################################
+############################### SECTION 2: WRITING ##################################################
+#####################################################################################################
+
+def _is_missing(value):
+
+    return value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value))
+
+
+def _write_string_column(values, column_path):
+
+    valid = np.zeros(len(values), dtype=bool)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    chunks = []
+
+    for row_number, value in enumerate(values):
+
+        if _is_missing(value):
+            offsets[row_number + 1] = offsets[row_number]
+            continue
+
+        if not isinstance(value, str):
+            raise TypeError(f"Row {row_number} of a string column has the {type(value).__name__} value {value!r}.")
+
+        encoded_value = value.encode("utf-8")
+
+        chunks.append(encoded_value)
+        valid[row_number] = True
+        offsets[row_number + 1] = offsets[row_number] + len(encoded_value)
+
+    np.save(f"{column_path}.offsets.npy", offsets)
+    np.save(f"{column_path}.data.npy", np.frombuffer(b"".join(chunks), dtype=np.uint8))
+    np.save(f"{column_path}.valid.npy", valid)
+
+
+def _write_value_column(values, column_type, column_path):
+
+    if column_type == "float":
+        array = pd.to_numeric(values, errors="raise").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    elif column_type == "int":
+        if values.isna().any():
+            raise ValueError(f"The int column {values.name} has missing values. Declare it as an Int64 column instead.")
+
+        array = values.to_numpy(dtype=np.int64)
+
+    elif column_type == "Int64":
+        #raises if a value is not a whole number
+        values = pd.to_numeric(values, errors="raise").astype("Int64")
+
+        np.save(f"{column_path}.valid.npy", values.notna().to_numpy())
+        array = values.to_numpy(dtype=np.int64, na_value=0)
+
+    else:
+        if values.isna().any():
+            raise ValueError(f"The bool column {values.name} has missing values. Declare it as a float column instead.")
+
+        array = values.to_numpy(dtype=bool)
+
+    np.save(f"{column_path}.npy", array)
+
+
+def write_table(df, table_path, stage=None, feature=None, extra_columns=None):
+    """
+    Takes a dataframe, the folder to store it in, and optionally the step and feature whose schema it
+    must follow and the types of columns that are not in the schema. Writes the table, replacing the
+    folder if it already exists, and returns the dictionary of column name: type that was used.
+    """
+
+    column_types = get_column_types(df, stage, feature, extra_columns)
+
+    #writes to a temporary folder first so a crash never leaves half a table
+    temporary_path = f"{table_path.rstrip(os.sep)}.writing"
+
+    if os.path.exists(temporary_path):
+        shutil.rmtree(temporary_path)
+
+    os.makedirs(temporary_path)
+
+    for column_number, (column_name, column_type) in enumerate(column_types.items()):
+
+        column_path = os.path.join(temporary_path, str(column_number))
+
+        if column_type == "string":
+            _write_string_column(df[column_name].tolist(), column_path)
+        else:
+            _write_value_column(df[column_name], column_type, column_path)
+
+    with open(os.path.join(temporary_path, SCHEMA_FILENAME), "w") as schema_file:
+        json.dump({"stage": stage, "feature": feature, "n_rows": len(df),
+                   "columns": [{"name": column_name, "type": column_type} for column_name, column_type in column_types.items()]},
+                  schema_file, indent=1)
+
+    if os.path.exists(table_path):
+        shutil.rmtree(table_path)
+
+    os.replace(temporary_path, table_path)
+
+    return column_types
+
+
+#####################################################################################################
+############################### SECTION 3: READING ##################################################
+#####################################################################################################
+
+class StringColumn:
+    """
+    A string column read from a table. The bytes stay memory-mapped until values are asked for.
+    Missing values are returned as None.
+    """
+
+    def __init__(self, offsets, data, valid):
+
+        self.offsets = offsets
+        self.data = data
+        self.valid = valid
+
+    def __len__(self):
+
+        return len(self.valid)
+
+    def __getitem__(self, row_number):
+
+        if not self.valid[row_number]:
+            return None
+
+        return bytes(self.data[self.offsets[row_number]:self.offsets[row_number + 1]]).decode("utf-8")
+
+    def to_list(self, missing=None):
+        """Returns all of the values as a list, with missing values replaced by missing."""
+
+        #decodes the whole column at once and then cuts it up, which is much faster than decoding value by value
+        text = bytes(self.data).decode("utf-8")
+
+        if text.isascii():
+            offsets = self.offsets.tolist()
+        else:
+            #the byte offsets have to be turned into character offsets
+            character_lengths = [len(bytes(self.data[start:end]).decode("utf-8"))
+                                 for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+            offsets = np.concatenate(([0], np.cumsum(character_lengths, dtype=np.int64))).tolist()
+
+        return [text[start:end] if is_valid else missing
+                for start, end, is_valid in zip(offsets[:-1], offsets[1:], self.valid.tolist())]
+
+
+class Table:
+    """
+    A table opened for reading. Columns are only opened when they are asked for.
+    """
+
+    def __init__(self, table_path, mmap=True):
+
+        self.table_path = table_path
+        self.mmap_mode = "r" if mmap else None
+
+        with open(os.path.join(table_path, SCHEMA_FILENAME), "r") as schema_file:
+            schema = json.load(schema_file)
+
+        self.stage = schema["stage"]
+        self.feature = schema["feature"]
+        self.n_rows = schema["n_rows"]
+        self.column_types = {column["name"]: column["type"] for column in schema["columns"]}
+        self.column_numbers = {column["name"]: column_number for column_number, column in enumerate(schema["columns"])}
+
+    def __len__(self):
+
+        return self.n_rows
+
+    @property
+    def columns(self):
+
+        return list(self.column_types)
+
+    def _load(self, column_name, suffix):
+
+        return np.load(os.path.join(self.table_path, f"{self.column_numbers[column_name]}{suffix}"), mmap_mode=self.mmap_mode)
+
+    def column(self, column_name):
+        """
+        Returns a column as a numpy array (memory-mapped for float, int and bool columns),
+        a pandas Int64 array, or a StringColumn.
+        """
+
+        if column_name not in self.column_types:
+            raise KeyError(f"{self.table_path} has no column named {column_name}.")
+
+        if self.column_types[column_name] == "string":
+            return StringColumn(self._load(column_name, ".offsets.npy"), self._load(column_name, ".data.npy"),
+                                self._load(column_name, ".valid.npy"))
+
+        if self.column_types[column_name] == "Int64":
+            return pd.arrays.IntegerArray(np.asarray(self._load(column_name, ".npy")), ~np.asarray(self._load(column_name, ".valid.npy")))
+
+        return self._load(column_name, ".npy")
+
+    def to_pandas(self, columns=None, nullable=True):
+        """
+        Returns the table, or only the given columns, as a dataframe. Missing strings are NaN,
+        the same as pd.read_csv gives. With nullable=False, Int64 columns are int64 columns, or float64
+        columns if they have missing values, also the same as pd.read_csv gives.
+        """
+
+        columns = self.columns if columns is None else columns
+
+        data = {}
+
+        for column_name in columns:
+
+            column = self.column(column_name)
+
+            if isinstance(column, StringColumn):
+                data[column_name] = pd.Series(column.to_list(missing=np.nan), dtype=object)
+            elif isinstance(column, pd.arrays.IntegerArray) and not nullable:
+                data[column_name] = column.to_numpy(dtype=np.float64, na_value=np.nan) if column.isna().any() else column.to_numpy(dtype=np.int64)
+            else:
+                data[column_name] = column if isinstance(column, pd.arrays.IntegerArray) else np.asarray(column)
+
+        return pd.DataFrame(data, columns=columns)
+
+
+def read_table(table_path, columns=None, mmap=True, nullable=True):
+    """
+    Takes the folder of a table and optionally the columns to read. Returns a dataframe.
+    Only the files of the columns asked for are opened.
+    """
+
+    return Table(table_path, mmap).to_pandas(columns, nullable)
+
+
+#####################################################################################################
+############################### SECTION 4: CSV FILES ################################################
+#####################################################################################################
+
+def export_csv(table_path, csv_path, columns=None):
+    """
+    Writes a table (or some of its columns) to a CSV file the same way the notebooks do,
+    for the steps that are annotated by hand.
+    """
+
+    read_table(table_path, columns).to_csv(csv_path, index=False)
+
+
+def read_typed_csv(csv_path, stage=None, feature=None, extra_columns=None):
+    """
+    Reads a CSV file with the column types of a step's schema. Only empty cells in string columns are
+    read as missing, so words like "null", "NA" and "nan" stay as they are.
+    """
+
+    column_names = pd.read_csv(csv_path, nrows=0).columns
+
+    if stage is None:
+        schema = dict(extra_columns or {})
+    else:
+        schema = get_stage_schema(stage, feature)
+        schema.update(extra_columns or {})
+
+    string_columns = [column_name for column_name in column_names if schema.get(column_name) == "string"]
+    Int64_columns = [column_name for column_name in column_names if schema.get(column_name) == "Int64"]
+
+    df = pd.read_csv(csv_path, dtype={**{column_name: object for column_name in string_columns},
+                                      **{column_name: "Int64" for column_name in Int64_columns}},
+                     keep_default_na=False,
+                     na_values={column_name: ([""] if column_name in string_columns else ["", "nan", "NaN", "NA", "N/A", "null"])
+                                for column_name in column_names})
+
+    return df
+
+
+def import_csv(csv_path, table_path, stage=None, feature=None, extra_columns=None):
+    """
+    Reads a CSV file, such as one annotated by hand, and writes it as a table with the step's schema.
+    Returns the dataframe.
+    """
+
+    df = read_typed_csv(csv_path, stage, feature, extra_columns)
+
+    write_table(df, table_path, stage, feature, extra_columns)
+
+    return df
+
+
+## Designate the input path where a step's CSVs are stored and the output path for its tables
+# csv_input_path = "path"
+# table_output_path = "path"
+
+##this will convert the step 2.5 CSVs into tables, and read back only the columns step 2.6 needs
+# for feature in ["aint_variations", "be", "done"]:
+#     import_csv(f"{csv_input_path}{feature}_cleanedUtterances.csv", f"{table_output_path}{feature}_cleanedUtterances", "2.5", feature)
+# cleaned_df = read_table(f"{table_output_path}be_cleanedUtterances", columns=["Content_cleaned", "amazon_transcription_cleaned"])
@@ -0,0 +1,583 @@
+"""
+This is a positional inverted index of every token in the corpora, for the searches in steps 1.6, 1.7 and 1.8.
+
+The step 1.6, 1.7 and 1.8 notebooks find the per-corpus CSVs with os.listdir, read them again, and work out
+the words to the left and right of one search word at a time, so looking at a new feature (e.g. "finna" or
+"steady") means running step 1.1 and all three notebooks again over every corpus.
+The code here does the following instead:
+    (1) reads each corpus' transcripts once, with the same parsers as step 1.1, and stores every token
+        with the corpus, File, Line and position in the line where it occurs
+    (2) finds any word or phrase in all of the corpora with a binary search and a few numpy lookups
+    (3) returns concordance (KWIC) lines, L3-R3 n-gram tables and counts per 100,000 words from what it finds
+    (4) adds or replaces one corpus at a time without touching the others
+
+Tokens are the words of Content split on whitespace, the same as the step 1.4 split content columns.
+They are matched after being lowercased and having their punctuation removed, except for apostrophes and
+dashes, the same as the cleaned n-grams of step 1.8, and then having the dashes at their ends removed, so
+"Be," and the cut-off "be-" both match "be", the same as the whole word regex of step 1.1. A closing quote
+after the punctuation at the end of a token is removed too, so "be.'" also matches "be" (words joined with
+an apostrophe, like "Be's", are the only instances step 1.1 finds and the index does not).
+The counts per 100,000 words use the corpus word counts of step 1.1 (nltk tokens that are not punctuation).
+
+An index is a folder with:
+    index.json              the corpora in the index and their word, file, line and token counts
+    {corpus}/               one folder of .npy files per corpus, which are memory-mapped when they are read
+"""
+
+import importlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from string import punctuation
+
+import numpy as np
+import pandas as pd
+
+
+MANIFEST_FILENAME = "index.json"
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+#the same punctuation the step 1.8 notebook removes from the n-grams and from the single L3-R3 tokens
+PUNCTUATION_NO_APOSTROPHE_NO_DASH = punctuation.replace("'", "").replace("-", "")
+PUNCTUATION_NO_APOSTROPHE = punctuation.replace("'", "")
+
+TOKEN_CLEANING_TABLE = str.maketrans("", "", PUNCTUATION_NO_APOSTROPHE_NO_DASH)
+SLOT_CLEANING_TABLE = str.maketrans("", "", PUNCTUATION_NO_APOSTROPHE)
+
+LEFT_SLOTS = ["L3", "L2", "L1"]
+RIGHT_SLOTS = ["R1", "R2", "R3"]
+
+SEGMENT_ARRAYS = ["keys", "postings_offsets", "postings", "token_keys", "raw_tokens", "token_raw",
+                  "line_offsets", "line_numbers", "line_files", "files", "content_offsets", "content_data"]
+
+
+def clean_token(token):
+    """Takes a token and returns it cleaned the same as the step 1.8 n-grams: lowercased, without punctuation other than ' and -."""
+
+    return token.lower().strip().translate(TOKEN_CLEANING_TABLE)
+
+
+def get_token_key(token):
+    """
+    Takes a token and returns the form it is matched by: the cleaned token without dashes at its ends and
+    without the closing quotes after its punctuation (the ' of "be.'", but not the ' of "goin'").
+    """
+
+    without_quotes = token.strip().rstrip("'")
+    if without_quotes and without_quotes[-1] in PUNCTUATION_NO_APOSTROPHE_NO_DASH:
+        token = without_quotes
+
+    return clean_token(token).strip("-")
+
+
+def _encode(strings):
+
+    return np.array([string.encode("utf-8") for string in strings], dtype=bytes)
+
+
+def _decode(byte_strings):
+
+    return [byte_string.decode("utf-8") for byte_string in byte_strings.tolist()]
+
+
+#####################################################################################################
+############################### SECTION 1: BUILDING A CORPUS ########################################
+#####################################################################################################
+
+def _import_step1_1():
+    """Imports the step 1.1 streaming ingestion code, whose file name has a hyphen in it."""
+
+    if CODE_ROOT not in sys.path:
+        sys.path.insert(0, CODE_ROOT)
+
+    return importlib.import_module("step1-1_streaming_corpus_ingestion")
+
+
+def read_transcript_lines(txt_import_path, txt_filename, corpus_name):
+    """
+    Takes one transcript file and its corpus name. Parses it with the step 1.1 parser for the corpus and
+    returns (dataframe of File, Line and Content, the file's word count the same as step 1.1).
+    This is the function that runs in the worker processes.
+    """
+
+    streaming = _import_step1_1()
+
+    file_df = streaming.CORPUS_PARSERS[corpus_name.lower()](txt_import_path, txt_filename)
+
+    lines_df = file_df[[column for column in ["File", "Line", "Content"] if column in file_df.columns]]
+
+    return lines_df, streaming.get_file_word_count(file_df, corpus_name)
+
+
+def build_corpus_arrays(lines_df):
+    """
+    Takes a dataframe of File, Line (optional) and Content for one corpus and returns a dictionary of the arrays
+    that make up its part of the index:
+        keys                the sorted cleaned forms of its tokens (UTF-8)
+        postings_offsets    where the positions of each key start and end in postings
+        postings            the positions in the token stream of every token, grouped by key
+        token_keys          the key of every token in the token stream
+        raw_tokens          the tokens as they are written in Content (UTF-8)
+        token_raw           the raw token of every token in the token stream
+        line_offsets        where each line starts and ends in the token stream
+        line_numbers        the Line of each line
+        line_files          the File of each line, as a position in files
+        files               the File names (UTF-8)
+        content_offsets     where the Content of each line starts and ends in content_data
+        content_data        the UTF-8 bytes of the Content of every line, as it is written in the transcript
+    """
+
+    #TIMIT transcripts have no Line column because each file is a single utterance, so their lines are numbered here
+    if "Line" not in lines_df.columns:
+        lines_df = lines_df.assign(Line=lines_df.groupby("File").cumcount() + 1)
+
+    lines_df = lines_df[lines_df["Content"].map(lambda content: type(content) == str)]
+
+    line_tokens = [content.split() for content in lines_df["Content"]]
+    line_lengths = np.array([len(tokens) for tokens in line_tokens], dtype=np.int64)
+
+    #numbers every token by its raw form and then numbers the raw forms by their cleaned form
+    token_raw, raw_tokens = pd.factorize(pd.Series([token for tokens in line_tokens for token in tokens], dtype=object))
+    raw_keys, keys = pd.factorize(pd.Series([get_token_key(token) for token in raw_tokens], dtype=object))
+
+    #the keys are sorted by their bytes so they can be found with a binary search
+    encoded_keys = _encode(keys)
+    key_order = np.argsort(encoded_keys, kind="stable")
+    key_ranks = np.empty(len(key_order), dtype=np.int32)
+    key_ranks[key_order] = np.arange(len(key_order), dtype=np.int32)
+
+    token_keys = key_ranks[raw_keys][token_raw] if len(token_raw) else np.zeros(0, dtype=np.int32)
+
+    line_files, files = pd.factorize(lines_df["File"].astype(str))
+
+    encoded_contents = [content.encode("utf-8") for content in lines_df["Content"]]
+
+    return {"keys": encoded_keys[key_order],
+            "postings_offsets": np.concatenate(([0], np.cumsum(np.bincount(token_keys, minlength=len(keys))))).astype(np.int64),
+            "postings": np.argsort(token_keys, kind="stable").astype(np.int64),
+            "token_keys": token_keys.astype(np.int32),
+            "raw_tokens": _encode(raw_tokens),
+            "token_raw": token_raw.astype(np.int32),
+            "line_offsets": np.concatenate(([0], np.cumsum(line_lengths))).astype(np.int64),
+            "line_numbers": pd.to_numeric(lines_df["Line"]).to_numpy(dtype=np.int64),
+            "line_files": line_files.astype(np.int32),
+            "files": _encode(files),
+            "content_offsets": np.concatenate(([0], np.cumsum([len(content) for content in encoded_contents]))).astype(np.int64),
+            "content_data": np.frombuffer(b"".join(encoded_contents), dtype=np.uint8)}
+
+
+#####################################################################################################
+############################### SECTION 2: SEARCHING A CORPUS #######################################
+#####################################################################################################
+
+class CorpusSegment:
+    """
+    The part of the index for one corpus. Finds phrases in the corpus' token stream and
+    gets the tokens around them.
+    """
+
+    def __init__(self, corpus_name, arrays, info):
+
+        self.corpus_name = corpus_name
+        self.info = info
+
+        for array_name in SEGMENT_ARRAYS:
+            setattr(self, array_name, arrays[array_name])
+
+    def lookup_keys(self, phrase_keys):
+        """Takes a list of token keys and returns their key numbers, with -1 for the ones not in the corpus."""
+
+        if len(self.keys) == 0:
+            return np.full(len(phrase_keys), -1)
+
+        encoded_keys = _encode(phrase_keys)
+
+        positions = np.searchsorted(self.keys, encoded_keys)
+        positions[positions == len(self.keys)] = 0
+
+        return np.where(self.keys[positions] == encoded_keys, positions, -1)
+
+    def find_phrase(self, phrase_keys):
+        """
+        Takes a list of token keys. Returns (positions in the token stream where the phrase starts, line numbers
+        in the index of those positions). A phrase only matches inside one line.
+        """
+
+        key_numbers = self.lookup_keys(phrase_keys)
+
+        if len(phrase_keys) == 0 or (key_numbers < 0).any():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        first_key = key_numbers[0]
+        positions = np.asarray(self.postings[self.postings_offsets[first_key]:self.postings_offsets[first_key + 1]])
+        line_indexes = np.searchsorted(self.line_offsets, positions, side="right") - 1
+
+        #keeps only the positions where the rest of the phrase follows in the same line
+        for offset, key_number in enumerate(key_numbers[1:], start=1):
+
+            in_line = positions + offset < self.line_offsets[line_indexes + 1]
+            positions, line_indexes = positions[in_line], line_indexes[in_line]
+
+            matches = np.asarray(self.token_keys[positions + offset]) == key_number
+            positions, line_indexes = positions[matches], line_indexes[matches]
+
+        return positions, line_indexes
+
+    def get_tokens(self, positions, line_indexes, offset):
+        """
+        Takes positions in the token stream, their line numbers in the index and an offset. Returns the raw tokens
+        offset tokens away from each position, with None where that is outside of the line.
+        """
+
+        shifted_positions = positions + offset
+
+        in_line = ((shifted_positions >= self.line_offsets[line_indexes])
+                   & (shifted_positions < self.line_offsets[line_indexes + 1]))
+
+        tokens = [None] * len(positions)
+
+        for row_number, raw_token in zip(np.flatnonzero(in_line).tolist(),
+                                         _decode(self.raw_tokens[self.token_raw[shifted_positions[in_line]]])):
+            tokens[row_number] = raw_token
+
+        return tokens
+
+    def get_lines(self, line_indexes):
+        """Takes line numbers in the index and returns their Content, as it is written in the transcript."""
+
+        return [bytes(self.content_data[self.content_offsets[line_index]:self.content_offsets[line_index + 1]]).decode("utf-8")
+                for line_index in line_indexes.tolist()]
+
+
+#####################################################################################################
+############################### SECTION 3: THE INDEX ################################################
+#####################################################################################################
+
+class CorpusTokenIndex:
+    """
+    A positional inverted index of the tokens of any number of corpora, stored in the folder index_path.
+    The folder is created when the first corpus is added.
+    """
+
+    def __init__(self, index_path):
+
+        self.index_path = index_path
+        self._segments = {}
+
+        manifest_path = os.path.join(index_path, MANIFEST_FILENAME)
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as manifest_file:
+                self.corpora = json.load(manifest_file)["corpora"]
+        else:
+            self.corpora = {}
+
+    def _save_manifest(self):
+
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILENAME)
+
+        #writes to a temporary file first so a crash can't leave a half-written manifest
+        with open(f"{manifest_path}.tmp", "w") as manifest_file:
+            json.dump({"corpora": self.corpora}, manifest_file, indent=2)
+
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _write_corpus(self, corpus_name, arrays, total_word_count, total_file_count):
+
+        os.makedirs(self.index_path, exist_ok=True)
+
+        corpus_path = os.path.join(self.index_path, corpus_name)
+        writing_path = f"{corpus_path}.writing"
+
+        if os.path.exists(writing_path):
+            shutil.rmtree(writing_path)
+
+        os.makedirs(writing_path)
+
+        for array_name, array in arrays.items():
+            np.save(os.path.join(writing_path, f"{array_name}.npy"), array)
+
+        #the old version of the corpus is only removed once the new one is completely written
+        self._segments.pop(corpus_name, None)
+
+        if os.path.exists(corpus_path):
+            shutil.rmtree(corpus_path)
+
+        os.rename(writing_path, corpus_path)
+
+        self.corpora[corpus_name] = {"TotalCorpusWordCount": int(total_word_count),
+                                     "TotalFileCount": int(total_file_count),
+                                     "TotalLineCount": len(arrays["line_numbers"]),
+                                     "TotalTokenCount": len(arrays["token_keys"])}
+
+        self._save_manifest()
+
+    def add_corpus(self, corpus_name, txt_import_path, max_workers=None):
+        """
+        Takes a corpus name (one of the step 1.1 corpus names), the filepath of its transcripts, and the number
+        of worker processes to use (defaults to the number of CPUs). Reads the transcripts with the step 1.1 parsers
+        and adds the corpus to the index, replacing it if it is already there. The other corpora are not touched.
+        """
+
+        streaming = _import_step1_1()
+
+        if corpus_name.lower() not in streaming.CORPUS_NAMES:
+            raise Exception("""The corpus name you gave is not valid. Please use one of the following: CORAAL, Switchboard, Hub5, Fisher, LibriSpeech, or TIMIT.""")
+
+        txt_filenames = streaming.get_txt_filenames(txt_import_path)
+
+        #the files are read in parallel but kept in the same order as the step 1.1 notebook
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(read_transcript_lines, [txt_import_path] * len(txt_filenames), txt_filenames,
+                                        [corpus_name] * len(txt_filenames)))
+
+        lines_df = pd.concat([file_df for file_df, _ in results]) if results else pd.DataFrame(columns=["File", "Line", "Content"])
+
+        self._write_corpus(corpus_name, build_corpus_arrays(lines_df),
+                           sum(word_count for _, word_count in results), len(txt_filenames))
+
+    def add_corpus_dataframe(self, corpus_name, lines_df, total_word_count=None, total_file_count=None):
+        """
+        Takes a corpus name and a dataframe with File, Line and Content columns (e.g. the step 1.1 dataframes),
+        and adds the corpus to the index, replacing it if it is already there. The counts per 100,000 words
+        use total_word_count, which defaults to the number of tokens in Content.
+        """
+
+        arrays = build_corpus_arrays(lines_df)
+
+        if total_word_count is None:
+            total_word_count = len(arrays["token_keys"])
+
+        if total_file_count is None:
+            total_file_count = len(arrays["files"])
+
+        self._write_corpus(corpus_name, arrays, total_word_count, total_file_count)
+
+    def remove_corpus(self, corpus_name):
+        """Removes a corpus from the index."""
+
+        self._segments.pop(corpus_name, None)
+        del self.corpora[corpus_name]
+
+        self._save_manifest()
+        shutil.rmtree(os.path.join(self.index_path, corpus_name))
+
+    def get_segment(self, corpus_name):
+        """Returns the CorpusSegment of a corpus, opening its arrays the first time it is asked for."""
+
+        if corpus_name not in self._segments:
+
+            corpus_path = os.path.join(self.index_path, corpus_name)
+
+            arrays = {array_name: np.load(os.path.join(corpus_path, f"{array_name}.npy"), mmap_mode="r", allow_pickle=False)
+                      for array_name in SEGMENT_ARRAYS}
+
+            self._segments[corpus_name] = CorpusSegment(corpus_name, arrays, self.corpora[corpus_name])
+
+        return self._segments[corpus_name]
+
+    def _find(self, phrase, corpora):
+        """Yields (segment, positions, line indexes, number of tokens in the phrase) for every corpus asked for."""
+
+        phrase_keys = [get_token_key(token) for token in phrase.split()]
+
+        if corpora is None:
+            corpora = list(self.corpora)
+
+        for corpus_name in corpora:
+
+            segment = self.get_segment(corpus_name)
+            positions, line_indexes = segment.find_phrase(phrase_keys)
+
+            yield segment, positions, line_indexes, len(phrase_keys)
+
+    def find(self, phrase, corpora=None):
+        """
+        Takes a word or phrase and, optionally, a list of corpus names to search (defaults to all of them).
+        Returns a dataframe with one row per instance: Corpus, File, Line and Position (the number of tokens
+        before the instance in its line).
+        """
+
+        found_dfs = []
+
+        for segment, positions, line_indexes, _ in self._find(phrase, corpora):
+
+            found_dfs.append(pd.DataFrame({"Corpus": segment.corpus_name,
+                                           "File": _decode(segment.files[segment.line_files[line_indexes]]),
+                                           "Line": np.asarray(segment.line_numbers[line_indexes]),
+                                           "Position": positions - segment.line_offsets[line_indexes]}))
+
+        if not found_dfs:
+            return pd.DataFrame(columns=["Corpus", "File", "Line", "Position"])
+
+        return pd.concat(found_dfs, ignore_index=True)
+
+    def get_context_dataframe(self, phrase, width=3, corpora=None):
+        """
+        Takes a word or phrase, the number of tokens to get on each side and, optionally, a list of corpus names.
+        Returns the dataframe from find() with Content, the L{width}-L1 tokens, the matched tokens (ContentFeature)
+        and the R1-R{width} tokens, the same as the step 1.4 split content columns. Tokens outside of the line are None.
+        """
+
+        context_dfs = []
+
+        for segment, positions, line_indexes, phrase_length in self._find(phrase, corpora):
+
+            context_df = pd.DataFrame({"Corpus": segment.corpus_name,
+                                       "File": _decode(segment.files[segment.line_files[line_indexes]]),
+                                       "Line": np.asarray(segment.line_numbers[line_indexes]),
+                                       "Position": positions - segment.line_offsets[line_indexes],
+                                       "Content": segment.get_lines(line_indexes)})
+
+            for distance in range(width, 0, -1):
+                context_df[f"L{distance}"] = segment.get_tokens(positions, line_indexes, -distance)
+
+            context_df["ContentFeature"] = [" ".join(tokens) for tokens in
+                                            zip(*[segment.get_tokens(positions, line_indexes, offset) for offset in range(phrase_length)])]
+
+            for distance in range(1, width + 1):
+                context_df[f"R{distance}"] = segment.get_tokens(positions, line_indexes, phrase_length + distance - 1)
+
+            context_dfs.append(context_df)
+
+        if not context_dfs:
+            return pd.DataFrame(columns=["Corpus", "File", "Line", "Position", "Content"]
+                                + [f"L{distance}" for distance in range(width, 0, -1)] + ["ContentFeature"]
+                                + [f"R{distance}" for distance in range(1, width + 1)])
+
+        return pd.concat(context_dfs, ignore_index=True)
+
+    def get_kwic(self, phrase, window=5, corpora=None):
+        """
+        Takes a word or phrase, the number of tokens to show on each side and, optionally, a list of corpus names.
+        Returns a dataframe of concordance lines: Corpus, File, Line, Position, Left, Match and Right.
+        """
+
+        context_df = self.get_context_dataframe(phrase, width=window, corpora=corpora)
+
+        left_slots = [f"L{distance}" for distance in range(window, 0, -1)]
+        right_slots = [f"R{distance}" for distance in range(1, window + 1)]
+
+        kwic_df = context_df[["Corpus", "File", "Line", "Position"]].copy()
+        kwic_df["Left"] = [" ".join(token for token in tokens if type(token) == str) for tokens in context_df[left_slots].itertuples(index=False)]
+        kwic_df["Match"] = context_df["ContentFeature"]
+        kwic_df["Right"] = [" ".join(token for token in tokens if type(token) == str) for tokens in context_df[right_slots].itertuples(index=False)]
+
+        return kwic_df
+
+    def get_ngram_counts(self, phrase, slots=("L3", "L2", "L1"), corpora=None):
+        """
+        Takes a word or phrase, a list of slots around it (e.g. ["L1"] or ["R1", "R2", "R3"]) and, optionally,
+        a list of corpus names. Returns a dataframe with the number of times each cleaned n-gram in those slots
+        occurs with the phrase in each corpus, most frequent first: Corpus, Ngram, Count and NormCount
+        (the count per 100,000 words in the corpus). Slots outside of the line are left out of the n-gram,
+        the same as the cleaned tuples of step 1.8.
+        """
+
+        width = max(int(slot[1:]) for slot in slots)
+
+        context_df = self.get_context_dataframe(phrase, width=width, corpora=corpora)
+
+        context_df["Ngram"] = [tuple(clean_token(token) for token in tokens if type(token) == str)
+                               for tokens in context_df[list(slots)].itertuples(index=False)]
+
+        ngram_df = context_df.groupby(["Corpus", "Ngram"], sort=False).size().reset_index(name="Count")
+
+        ngram_df["NormCount"] = ngram_df["Count"] / ngram_df["Corpus"].map(
+            lambda corpus_name: self.corpora[corpus_name]["TotalCorpusWordCount"]) * 100000
+
+        return ngram_df.sort_values(by=["Corpus", "Count"], ascending=[True, False], kind="stable").reset_index(drop=True)
+
+    def get_frequencies(self, phrase, corpora=None):
+        """
+        Takes a word or phrase and, optionally, a list of corpus names. Returns a dataframe laid out like
+        the step 1.1 all corpora info dataframes, with one column per corpus and the rows TotalCorpusWordCount,
+        TotalWordInstancesCount, NormalizedWordInstancesCount (per 100,000 words) and TotalFileCount.
+        """
+
+        info = {}
+
+        for segment, positions, _, _ in self._find(phrase, corpora):
+
+            total_word_count = segment.info["TotalCorpusWordCount"]
+
+            info[segment.corpus_name] = [total_word_count, len(positions),
+                                         len(positions) / total_word_count * 100000 if total_word_count else 0,
+                                         segment.info["TotalFileCount"]]
+
+        info_df = pd.DataFrame(info, index=['TotalCorpusWordCount', 'TotalWordInstancesCount',
+                                            'NormalizedWordInstancesCount', 'TotalFileCount'])
+
+        #Pandas defaults to scientific notation. This will correct that.
+        return info_df.round(2)
+
+    def get_trigram_dataframe(self, phrase, corpus_name):
+        """
+        Takes a word or phrase and a corpus name. Returns the same columns as create_trigram_df in the step 1.8
+        notebook, for every instance found in the corpus and in the same order, except for FeatureCountPerLine,
+        which only exists once the instances have been annotated by hand in step 1.5.
+        """
+
+        #the step 1.4 split content rows that step 1.8 reads are sorted by File, Line and the instance's place in the line
+        context_df = self.get_context_dataframe(phrase, width=3, corpora=[corpus_name]).sort_values(
+            by=["File", "Line", "Position"], kind="stable").reset_index(drop=True)
+        corpus_word_count_total = self.corpora[corpus_name]["TotalCorpusWordCount"]
+
+        trigram_df = context_df[["File", "Line"]].copy()
+        trigram_df["InstancesCountPerLine"] = context_df.groupby(["File", "Line"])["Position"].transform("size")
+        trigram_df["Content"] = context_df["Content"]
+
+        #missing tokens are NaN in the step 1.4 CSVs that step 1.8 reads
+        context_df[LEFT_SLOTS + RIGHT_SLOTS] = context_df[LEFT_SLOTS + RIGHT_SLOTS].astype(object).where(
+            context_df[LEFT_SLOTS + RIGHT_SLOTS].notna(), np.nan)
+
+        for side, slots in [("L3_L1", LEFT_SLOTS), ("R1_R3", RIGHT_SLOTS)]:
+
+            trigram_df[f"{side}_List"] = context_df[slots].values.tolist()
+            trigram_df[f"{side}_Tuple"] = [tuple(sublist) for sublist in trigram_df[f"{side}_List"]]
+            trigram_df[f"Cleaned{side}_List"] = [[clean_token(word) for word in sublist if type(word) != float]
+                                                 for sublist in trigram_df[f"{side}_List"]]
+            trigram_df[f"Cleaned{side}_Tuple"] = [tuple(sublist) for sublist in trigram_df[f"Cleaned{side}_List"]]
+
+            #the number of instances with the same cleaned n-gram, which the notebook counts with list.count row by row
+            trigram_df[f"Count_Cleaned{side}_Tuple"] = trigram_df.groupby(f"Cleaned{side}_Tuple")["File"].transform("size").astype(float)
+            trigram_df[f"NormCount_Cleaned{side}_Tuple"] = trigram_df[f"Count_Cleaned{side}_Tuple"]/corpus_word_count_total*100000
+
+        for header in LEFT_SLOTS + RIGHT_SLOTS:
+
+            trigram_df[header] = context_df[header]
+            trigram_df[f"Cleaned_{header}"] = context_df[header].apply(
+                lambda x: x.lower().strip().translate(SLOT_CLEANING_TABLE) if type(x) != float else x)
+
+            #missing tokens are counted together, the same as in the notebook
+            trigram_df[f"{header}_Count"] = trigram_df.groupby(f"Cleaned_{header}", dropna=False)["File"].transform("size").astype(float)
+            trigram_df[f"{header}_Norm_Count"] = trigram_df[f"{header}_Count"]/corpus_word_count_total*100000
+
+        return trigram_df
+
+
+## path to the folder of the index, which is created when the first corpus is added
+# index_path = "path"
+
+##This is the file path where you keep all the corpora sub-folders
+## MAKE SURE IT ENDS WITH THE PROPER SLASH
+# corpora_path = "path"
+
+##this reads every corpus once. after that, only a corpus that is added or changed has to be read again
+## NOTE: when running this in a notebook, keep this file in the same folder as the notebook
+# index = CorpusTokenIndex(index_path)
+# index.add_corpus("CORAAL", f"{corpora_path}CORAAL/")
+# index.add_corpus("Fisher", f"{corpora_path}Fisher/")
+# index.add_corpus("LibriSpeech", f"{corpora_path}LibriSpeech/")
+# index.add_corpus("Switchboard", f"{corpora_path}SwitchboardHub5/Switchboard/")
+# index.add_corpus("Hub5", f"{corpora_path}SwitchboardHub5/hub5_noHeader/")
+# index.add_corpus("TIMIT", f"{corpora_path}TIMIT/")
+
+##looking at a new feature
+# print(index.get_frequencies("finna"))
+# print(index.get_kwic("finna", window=5).head(20))
+# print(index.get_ngram_counts("finna", ["R1"]).head(20))
+# index.get_trigram_dataframe("finna", "CORAAL").to_csv("finna_coraal_trigrams.csv", index=False)
@@ -0,0 +1,783 @@
+"""
+This is a benchmark suite for the pipeline steps, run on a synthetic corpus and synthetic audio.
+
+The corpus is made of CORAAL-like utterances with ain't, be and done in them at about the rate of the real
+corpora, numbers, times, reductions and punctuation for the cleaning to deal with, and five ASR outputs with
+substitutions, deletions and insertions. The audio is 16khz 16-bit wav files of the corpus' first files, with
+harmonic "speech" in each utterance's window over noise. Both are made from a seed, so every run with the same
+seed and size benchmarks the same data, and both are written once to a data folder and re-used.
+
+Each stage is run in its own fresh process, so the memory one stage leaves behind does not count against the next
+one, and is timed with pipeline_profiling.profile_stage. The rows per second, seconds, CPU seconds and peak memory
+of every stage are appended to a JSON lines results file together with the git commit, the package versions and the
+size of the data. Each run is compared with the last run of the same size in the results file, and the stages whose
+rows per second dropped by more than the threshold are reported as slower.
+
+The section 2 stages use the be rows. Stage 2.2 only runs the WADA SNR, since snreval needs its own binary.
+
+Usage:
+    python pipeline_benchmark.py run [--utterances 100000] [--audio-minutes 30] [--stages 2.5 2.7] [--results benchmark_results.jsonl]
+    python pipeline_benchmark.py compare [--results benchmark_results.jsonl]
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import string
+import subprocess
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import pipeline_profiling
+
+
+#the folder this file is in, where the step .py files are
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+ASR_SYSTEMS = ["amazon", "deepspeech", "google", "IBMWatson", "microsoft"]
+
+SAMPLE_RATE = 16000
+
+#the utterances of each synthetic transcript file
+UTTERANCES_PER_FILE = 400
+
+DATA_INFO_FILENAME = "data.json"
+
+#a stage is reported as slower when its rows per second dropped by more than this
+REGRESSION_THRESHOLD = 0.1
+
+#common words, ranked by how often they are picked
+WORDS = ["i", "the", "and", "you", "it", "to", "a", "that", "like", "was", "know", "we", "they", "he", "in", "of",
+         "she", "my", "is", "so", "just", "but", "yeah", "me", "what", "go", "on", "with", "for", "there", "all",
+         "get", "don't", "it's", "this", "people", "be", "have", "when", "out", "them", "up", "said", "got", "one",
+         "do", "mean", "then", "no", "about", "right", "school", "because", "little", "back", "think", "really",
+         "used", "time", "her", "his", "if", "were", "say", "see", "come", "from", "not", "would", "going", "or",
+         "can", "had", "down", "good", "mama", "house", "work", "church", "neighborhood", "street", "friends",
+         "always", "never", "everybody", "somebody", "years", "old", "young", "kids", "money", "car", "store",
+         "home", "outside", "around", "still", "thing", "things", "want", "make", "take", "talk", "remember",
+         "done", "ain't", "didn't", "can't", "won't", "i'm", "that's", "y'all", "gonna", "wanna", "gotta",
+         "finna", "'em", "cause", "til", "5", "twenty", "1,000", "10:30", "$5", "%", "uh", "um", "mm", "hm"]
+
+#phrases with the features in them, with the other uses of the same words, put into the utterances
+FEATURE_PHRASES = ["he be working", "they be like", "she be going out", "it be like that", "I'm a be there",
+                   "you gotta be", "it will be", "might be", "to be honest", "be quiet",
+                   "I done told you", "he done left", "have you done", "we done with that",
+                   "that ain't right", "ain't nobody", "isn't it", "aren't you", "I'm not", "I didn't know",
+                   "haven't seen", "he hasn't been"]
+
+#the share of utterances with a feature phrase in them
+FEATURE_RATE = 0.2
+
+#the chances that an ASR system substitutes, deletes or inserts a word
+ASR_ERROR_RATES = {"amazon": 0.08, "deepspeech": 0.2, "google": 0.1, "IBMWatson": 0.15, "microsoft": 0.09}
+
+CONTRACTION_REGEX = re.compile(r"(\w)(n't|'m|'s|'re|'ll|'d|'ve)\b")
+NON_WORD_REGEX = re.compile(r"[^\w\s']")
+
+
+#####################################################################################################
+############################### SECTION 1: SYNTHETIC CORPUS #########################################
+#####################################################################################################
+
+def get_word_probabilities(n_words):
+    """Returns Zipf-like probabilities for n_words words ranked by frequency."""
+
+    weights = 1 / np.arange(1, n_words + 1) ** 1.1
+
+    return weights / weights.sum()
+
+
+def generate_utterances(n_utterances, rng):
+    """Takes the number of utterances and a numpy random generator and returns a list of utterances."""
+
+    lengths = 1 + rng.poisson(9, n_utterances)
+    word_indexes = rng.choice(len(WORDS), size=lengths.sum(), p=get_word_probabilities(len(WORDS)))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    phrase_indexes = np.where(rng.random(n_utterances) < FEATURE_RATE, rng.integers(0, len(FEATURE_PHRASES), n_utterances), -1)
+    phrase_positions = rng.random(n_utterances)
+    endings = rng.choice([".", "?", ",", ""], size=n_utterances, p=[0.6, 0.15, 0.1, 0.15])
+
+    words = np.array(WORDS, dtype=object)
+    utterances = []
+
+    for row_number in range(n_utterances):
+
+        utterance_words = words[word_indexes[offsets[row_number]:offsets[row_number + 1]]].tolist()
+
+        if phrase_indexes[row_number] >= 0:
+            position = int(phrase_positions[row_number] * len(utterance_words))
+            utterance_words.insert(position, FEATURE_PHRASES[phrase_indexes[row_number]])
+
+        utterance = " ".join(utterance_words)
+
+        utterances.append(utterance[0].upper() + utterance[1:] + endings[row_number])
+
+    return utterances
+
+
+def generate_lines_df(n_utterances, seed=0):
+    """
+    Takes the number of utterances and a seed. Returns a dataframe of File, Line, Speaker, UttStartTime,
+    UttEndTime, UttLength and Content, the same as a CORAAL dataframe from step 1.1.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    file_numbers = np.arange(n_utterances) // UTTERANCES_PER_FILE
+    lines = np.arange(n_utterances) % UTTERANCES_PER_FILE + 1
+
+    #each utterance lasts 1 to 6 seconds, with a pause of up to a second before it
+    utt_lengths = np.round(rng.uniform(1, 6, n_utterances), 4)
+    pauses = np.round(rng.uniform(0.1, 1, n_utterances), 4)
+
+    ends = np.cumsum(utt_lengths + pauses)
+    file_starts = np.concatenate(([0], ends))[np.flatnonzero(lines == 1)][file_numbers]
+    utt_end_times = np.round(ends - file_starts, 4)
+    utt_start_times = np.round(utt_end_times - utt_lengths, 4)
+
+    files = np.array([f"SYN_se0_ag1_f_{file_number:02d}_1" for file_number in range(file_numbers.max() + 1 if n_utterances else 0)], dtype=object)
+
+    return pd.DataFrame({"File": files[file_numbers],
+                         "Line": lines,
+                         "Speaker": np.where(rng.random(n_utterances) < 0.3, "SYN_int_01", files[file_numbers]),
+                         "UttStartTime": utt_start_times,
+                         "UttEndTime": utt_end_times,
+                         "UttLength": np.round(utt_end_times - utt_start_times, 4),
+                         "Content": generate_utterances(n_utterances, rng)})
+
+
+def write_coraal_transcripts(lines_df, transcripts_path):
+    """Takes a lines dataframe and writes it as CORAAL tab-separated transcripts, one per File."""
+
+    os.makedirs(transcripts_path, exist_ok=True)
+
+    for file_name, file_df in lines_df.groupby("File", sort=False):
+
+        transcript_df = file_df.rename(columns={"Speaker": "Spkr", "UttStartTime": "StTime", "UttEndTime": "EnTime"})
+
+        transcript_df[["Line", "Spkr", "StTime", "Content", "EnTime"]].to_csv(os.path.join(transcripts_path, f"{file_name}.txt"), sep="\t", index=False)
+
+
+def simple_clean(utterance):
+    """
+    Takes an utterance and returns a cleaned version of it that is close to step 2.5's: lowercased, without
+    punctuation, and with contractions split the way nltk splits them. This is much faster than step 2.5
+    and is only used to make the inputs of the stages after it.
+    """
+
+    if type(utterance) != str:
+        return np.nan
+
+    return " ".join(CONTRACTION_REGEX.sub(r"\1 \2", NON_WORD_REGEX.sub(" ", utterance.lower())).split())
+
+
+def generate_ASR_outputs(utterances, asr, rng):
+    """
+    Takes a list of utterances, the ASR system and a numpy random generator. Returns the ASR system's outputs,
+    with words substituted, deleted and inserted at the system's error rate and 1% of the outputs missing.
+    """
+
+    utterance_tokens = [utterance.split() for utterance in utterances]
+    lengths = np.array([len(tokens) for tokens in utterance_tokens], dtype=np.int64)
+    tokens = np.array([token for tokens in utterance_tokens for token in tokens], dtype=object)
+
+    error_rate = ASR_ERROR_RATES[asr]
+
+    #0 keeps a word, 1 substitutes it, 2 deletes it and 3 inserts a word after it
+    operations = rng.choice(4, size=len(tokens), p=[1 - error_rate, error_rate / 2, error_rate / 4, error_rate / 4])
+
+    random_words = np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), len(tokens))]
+    tokens = np.where(operations == 1, random_words, tokens)
+
+    repeats = np.where(operations == 2, 0, np.where(operations == 3, 2, 1))
+    output_tokens = np.repeat(tokens, repeats)
+
+    #the second copy of each inserted word is replaced with a random word
+    inserted = np.cumsum(repeats)[operations == 3] - 1
+    output_tokens[inserted] = random_words[operations == 3]
+
+    row_repeats = np.add.reduceat(repeats, np.concatenate(([0], np.cumsum(lengths)[:-1]))) if len(tokens) else np.zeros(len(utterances), dtype=np.int64)
+    row_repeats[lengths == 0] = 0
+    offsets = np.concatenate(([0], np.cumsum(row_repeats)))
+
+    outputs = [" ".join(output_tokens[offsets[row_number]:offsets[row_number + 1]].tolist()) for row_number in range(len(utterances))]
+
+    missing = rng.random(len(utterances)) < 0.01
+
+    return [np.nan if is_missing else output for output, is_missing in zip(outputs, missing)]
+
+
+def build_gold_standard_df(lines_df, search_word_string, rng):
+    """
+    Takes a lines dataframe, a search word and a numpy random generator. Returns the lines with the search word
+    in them, with InstancesCountPerLine and a FeatureCountPerLine that is lower than it for 10% of the lines,
+    like a step 1.3 gold standard dataframe.
+    """
+
+    search_word_regex = rf"\b[{search_word_string[0].upper()}|{search_word_string[0].lower()}]{search_word_string[1:]}\b"
+
+    gs_df = lines_df[lines_df["Content"].str.contains(search_word_regex, regex=True)].copy()
+
+    gs_df["InstancesCountPerLine"] = gs_df["Content"].str.count(search_word_regex)
+    gs_df["FeatureCountPerLine"] = np.where(rng.random(len(gs_df)) < 0.1,
+                                            rng.integers(0, gs_df["InstancesCountPerLine"] + 1),
+                                            gs_df["InstancesCountPerLine"])
+
+    return gs_df.reset_index(drop=True)
+
+
+def build_section2_df(gs_df, rng):
+    """
+    Takes a gold standard dataframe and a numpy random generator. Returns a row per instance of the feature,
+    with IterationNumber, the ASR outputs, and the cleaned Content and ASR columns with their word counts,
+    like the dataframes of the section 2 steps.
+    """
+
+    split_df = gs_df.loc[gs_df.index.repeat(gs_df["InstancesCountPerLine"].clip(lower=1))].reset_index(drop=True)
+    split_df["IterationNumber"] = split_df.groupby(["File", "Line"]).cumcount() + 1
+
+    split_df["Content_cleaned"] = [simple_clean(content) for content in split_df["Content"]]
+
+    for asr in ASR_SYSTEMS:
+
+        column_name = f"{asr}_transcription"
+
+        split_df[column_name] = generate_ASR_outputs(split_df["Content"].tolist(), asr, rng)
+        split_df[f"{column_name}_cleaned"] = [simple_clean(output) for output in split_df[column_name]]
+        split_df[f"{column_name}_cleaned_WordCount"] = [len(output.split()) if type(output) == str else np.nan
+                                                        for output in split_df[f"{column_name}_cleaned"]]
+
+    return split_df
+
+
+#####################################################################################################
+############################### SECTION 2: SYNTHETIC AUDIO ##########################################
+#####################################################################################################
+
+def write_synthetic_wav(wav_filepath, file_df, rng, block_seconds=60):
+    """
+    Takes the path of the wav file to write, the lines of one File, a numpy random generator, and the length of the
+    blocks that are written at a time. Writes 16khz 16-bit mono audio as long as the File, with noise throughout and
+    harmonic "speech" with a random pitch and loudness in each utterance's window. Returns the length in seconds.
+    """
+
+    duration = float(file_df["UttEndTime"].max()) + 1
+    n_frames = int(duration * SAMPLE_RATE)
+    block_frames = block_seconds * SAMPLE_RATE
+
+    utt_starts = (file_df["UttStartTime"].to_numpy() * SAMPLE_RATE).astype(np.int64)
+    utt_ends = (file_df["UttEndTime"].to_numpy() * SAMPLE_RATE).astype(np.int64)
+    pitches = rng.uniform(100, 250, len(file_df))
+    loudnesses = rng.uniform(0.05, 0.3, len(file_df))
+    noise_level = rng.uniform(0.002, 0.03)
+
+    with wave.open(wav_filepath, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+
+        for block_start in range(0, n_frames, block_frames):
+
+            block_end = min(block_start + block_frames, n_frames)
+            frames = np.arange(block_start, block_end)
+
+            block = rng.normal(0, noise_level, len(frames))
+
+            for utt_number in np.flatnonzero((utt_starts < block_end) & (utt_ends > block_start)):
+
+                in_utterance = (frames >= utt_starts[utt_number]) & (frames < utt_ends[utt_number])
+                times = frames[in_utterance] / SAMPLE_RATE
+
+                #three harmonics, with the loudness going up and down about 4 times a second like syllables
+                voice = sum(np.sin(2 * np.pi * pitches[utt_number] * harmonic * times) / harmonic for harmonic in (1, 2, 3))
+                block[in_utterance] += loudnesses[utt_number] * voice * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * times))
+
+            wav_file.writeframes((np.clip(block, -1, 1) * 32767).astype("<i2").tobytes())
+
+    return duration
+
+
+def write_synthetic_audio(lines_df, audio_path, audio_minutes, rng):
+    """
+    Takes a lines dataframe, the folder to write the audio to, how many minutes of audio to write, and a numpy
+    random generator. Writes a 16khz_{File}.wav file for the first Files until there are audio_minutes of audio.
+    Returns the list of Files that have audio.
+    """
+
+    os.makedirs(audio_path, exist_ok=True)
+
+    audio_files = []
+    total_seconds = 0
+
+    for file_name, file_df in lines_df.groupby("File", sort=False):
+
+        if total_seconds >= audio_minutes * 60:
+            break
+
+        total_seconds += write_synthetic_wav(os.path.join(audio_path, f"16khz_{file_name}.wav"), file_df, rng)
+        audio_files.append(file_name)
+
+    return audio_files
+
+
+def write_pronunciation_dictionary(dictionary_path, words):
+    """Takes the path to write to and a list of words, and writes a pronunciation dictionary with made up phonemes for them."""
+
+    vowels = ["AA1", "AE1", "AH0", "EH1", "ER0", "IH1", "IY1", "OW1", "UW1"]
+    consonants = ["B", "D", "G", "K", "L", "M", "N", "P", "R", "S", "T", "W"]
+
+    with open(dictionary_path, "w") as dictionary_file:
+
+        for word_number, word in enumerate(sorted(set(words))):
+
+            n_syllables = 1 + word_number % 3
+            phonemes = [phoneme for syllable in range(n_syllables)
+                        for phoneme in (consonants[(word_number + syllable) % len(consonants)], vowels[(word_number * 7 + syllable) % len(vowels)])]
+
+            dictionary_file.write(f"{word.upper()}\t{' '.join(phonemes)}\n")
+
+
+#####################################################################################################
+############################### SECTION 3: BENCHMARK DATA ###########################################
+#####################################################################################################
+
+def get_data_path(work_path, n_utterances, audio_minutes, seed):
+
+    return os.path.join(work_path, f"utterances{n_utterances}_audio{audio_minutes}_seed{seed}")
+
+
+def prepare_data(work_path, n_utterances, audio_minutes, seed=0):
+    """
+    Takes the work folder, the number of utterances, the minutes of audio and the seed. Writes the synthetic data
+    to a folder in the work folder, unless it is already there, and returns the folder's path.
+    """
+
+    data_path = get_data_path(work_path, n_utterances, audio_minutes, seed)
+
+    if os.path.exists(os.path.join(data_path, DATA_INFO_FILENAME)):
+        return data_path
+
+    if os.path.exists(data_path):
+        shutil.rmtree(data_path)
+
+    os.makedirs(data_path)
+
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    lines_df = generate_lines_df(n_utterances, seed)
+    lines_df.to_pickle(os.path.join(data_path, "lines.pkl"))
+
+    write_coraal_transcripts(lines_df, os.path.join(data_path, "transcripts", ""))
+
+    be_instances_df = lines_df[lines_df["Content"].str.contains(r"\b[B|b]e\b", regex=True)].copy()
+    be_instances_df["InstancesCountPerLine"] = be_instances_df["Content"].str.count(r"\b[B|b]e\b")
+    be_instances_df.to_pickle(os.path.join(data_path, "be_instances.pkl"))
+
+    gs_df = build_gold_standard_df(lines_df, "be", rng)
+    gs_df.to_pickle(os.path.join(data_path, "be_gold_standard.pkl"))
+
+    section2_df = build_section2_df(gs_df, rng)
+    section2_df.to_pickle(os.path.join(data_path, "be_section2.pkl"))
+
+    audio_files = write_synthetic_audio(lines_df, os.path.join(data_path, "audio", ""), audio_minutes, rng)
+    audio_gs_df = gs_df[gs_df["File"].isin(audio_files)]
+
+    #adds a row whose window starts after the end of its recording, which step 2.1 clips as silence, the same as extract_part
+    if len(audio_gs_df):
+        past_end_df = audio_gs_df.tail(1).copy()
+        past_end_df["Line"] = UTTERANCES_PER_FILE + 1
+        past_end_df["UttStartTime"] = lines_df.loc[lines_df["File"] == past_end_df["File"].iloc[0], "UttEndTime"].max() + 5
+        past_end_df["UttEndTime"] = past_end_df["UttStartTime"] + past_end_df["UttLength"]
+        audio_gs_df = pd.concat([audio_gs_df, past_end_df], ignore_index=True)
+
+    audio_gs_df.to_pickle(os.path.join(data_path, "be_audio_gold_standard.pkl"))
+
+    write_pronunciation_dictionary(os.path.join(data_path, "pronunciation_dictionary.txt"),
+                                   [word.strip(string.punctuation) for word in WORDS + " ".join(FEATURE_PHRASES).split()])
+
+    with open(os.path.join(data_path, DATA_INFO_FILENAME), "w") as info_file:
+        json.dump({"utterances": n_utterances, "audio_minutes": audio_minutes, "seed": seed,
+                   "gold_standard_rows": len(gs_df), "section2_rows": len(section2_df), "audio_files": len(audio_files),
+                   "seconds": time.perf_counter() - start_time}, info_file)
+
+    return data_path
+
+
+#####################################################################################################
+############################### SECTION 4: STAGES ###################################################
+#####################################################################################################
+
+def _import_step(module_name):
+    """Imports one of the step .py files, whose names have hyphens in them."""
+
+    if CODE_ROOT not in sys.path:
+        sys.path.insert(0, CODE_ROOT)
+
+    return importlib.import_module(module_name)
+
+
+class BenchmarkStage(NamedTuple):
+    """
+    A stage of the benchmark. load takes the data folder and returns the arguments of run, and is not timed.
+    run returns the number of rows it went through.
+    """
+    name: str
+    load: object
+    run: object
+
+
+def _load_pickle(filename):
+    return lambda data_path: (pd.read_pickle(os.path.join(data_path, filename)),)
+
+
+def run_ingestion(transcripts_path):
+
+    streaming = _import_step("step1-1_streaming_corpus_ingestion")
+
+    #one worker process, so the rows per second are comparable between machines
+    instances_info_dataframes = streaming.get_instances_info_dataframes_streaming({"coraal": transcripts_path}, ["ain't", "be", "done"], max_workers=1)
+
+    return streaming.count_instances(instances_info_dataframes)
+
+
+def run_habitual_be(be_instances_df):
+
+    habituality = _import_step("step1-2_determining_habitual_be_automatically_v7")
+
+    return len(habituality.determine_be_habituality(be_instances_df))
+
+
+def run_token_table(lines_df, output_path):
+
+    token_table = _import_step("step1-4_compact_token_table").build_token_table(lines_df, "be")
+
+    token_table.export_split_content_csv(os.path.join(output_path, "be_splitContent.csv"))
+
+    return len(lines_df)
+
+
+def run_token_index(lines_df, index_path):
+
+    corpus_token_index = _import_step("corpus_token_index")
+
+    index = corpus_token_index.CorpusTokenIndex(index_path)
+    index.add_corpus_dataframe("SYN", lines_df)
+
+    return len(lines_df)
+
+
+def run_clipping(gs_df, audio_path, clips_path):
+
+    return _import_step("step2-01_clipping_audio_by_source_file").clip_feature_audio(gs_df, audio_path, clips_path)
+
+
+def load_clips(data_path):
+    """Loads the gold standard rows with audio, making their clips first if they are not there yet."""
+
+    gs_df = pd.read_pickle(os.path.join(data_path, "be_audio_gold_standard.pkl"))
+    clips_path = os.path.join(data_path, "clips", "")
+
+    if not os.path.exists(clips_path):
+        os.makedirs(clips_path)
+        run_clipping(gs_df, os.path.join(data_path, "audio", ""), clips_path)
+
+    return gs_df, clips_path
+
+
+def run_wada_snr(gs_df, clips_path):
+
+    return len(_import_step("step2-02_batched_signal_to_noise_ratio").add_wada_snr_column(gs_df, clips_path))
+
+
+def load_speech_rate(data_path):
+
+    speech_rate = _import_step("step2-03_compiled_pronunciation_index")
+
+    index = speech_rate.PronunciationIndex.from_dictionary(os.path.join(data_path, "pronunciation_dictionary.txt"))
+
+    return pd.read_pickle(os.path.join(data_path, "be_gold_standard.pkl")), index
+
+
+def run_speech_rate(gs_df, index):
+
+    gs_df, _ = _import_step("step2-03_compiled_pronunciation_index").add_speech_rate_columns(gs_df, index)
+
+    return len(gs_df)
+
+
+def run_cleaning(section2_df):
+
+    cleaning = _import_step("step2-05_compiled_utterance_cleaning")
+
+    cleaning.clean_columns(section2_df)
+
+    return len(section2_df)
+
+
+def run_WER(section2_df, WER_filepath=None):
+
+    section2_df = _import_step("step2-07_shared_word_alignment").add_WER_columns(section2_df)
+
+    if WER_filepath is not None:
+        section2_df.to_pickle(WER_filepath)
+
+    return len(section2_df)
+
+
+def load_WER(data_path):
+    """Loads the be rows with the step 2.7 WER columns, which step 2.8 adds its columns next to, making them first if they are not there yet."""
+
+    WER_filepath = os.path.join(data_path, "be_section2_WER.pkl")
+
+    if not os.path.exists(WER_filepath):
+        run_WER(pd.read_pickle(os.path.join(data_path, "be_section2.pkl")), WER_filepath)
+
+    return (pd.read_pickle(WER_filepath),)
+
+
+def run_error_counts(section2_df):
+
+    return len(_import_step("step2-07_shared_word_alignment").add_error_count_columns(section2_df, "be"))
+
+
+def run_feature_scan(section2_df):
+
+    return len(_import_step("step2-10_single_pass_feature_scanner").scan_features(section2_df, "be"))
+
+
+def _load_with_output_folder(filename, folder_name):
+    """Returns a load function that gives the pickle and a new, empty folder in the data folder to write to."""
+
+    def load(data_path):
+
+        output_path = os.path.join(data_path, folder_name, "")
+
+        if os.path.exists(output_path):
+            shutil.rmtree(output_path)
+
+        os.makedirs(output_path)
+
+        return pd.read_pickle(os.path.join(data_path, filename)), output_path
+
+    return load
+
+
+def _load_clipping(data_path):
+
+    gs_df, clips_path = _load_with_output_folder("be_audio_gold_standard.pkl", "benchmark_clips")(data_path)
+
+    return gs_df, os.path.join(data_path, "audio", ""), clips_path
+
+
+BENCHMARK_STAGES = [
+    BenchmarkStage("1.1", lambda data_path: (os.path.join(data_path, "transcripts", ""),), run_ingestion),
+    BenchmarkStage("1.2", _load_pickle("be_instances.pkl"), run_habitual_be),
+    BenchmarkStage("1.4", _load_with_output_folder("lines.pkl", "split_content"), run_token_table),
+    BenchmarkStage("token-index", _load_with_output_folder("lines.pkl", "token_index"), run_token_index),
+    BenchmarkStage("2.1", _load_clipping, run_clipping),
+    BenchmarkStage("2.2", load_clips, run_wada_snr),
+    BenchmarkStage("2.3", load_speech_rate, run_speech_rate),
+    BenchmarkStage("2.5", _load_pickle("be_section2.pkl"), run_cleaning),
+    BenchmarkStage("2.7", _load_pickle("be_section2.pkl"), run_WER),
+    BenchmarkStage("2.8", load_WER, run_error_counts),
+    BenchmarkStage("2.10-2.12.5", _load_pickle("be_section2.pkl"), run_feature_scan),
+]
+
+BENCHMARK_STAGES_BY_NAME = {stage.name: stage for stage in BENCHMARK_STAGES}
+
+
+def run_benchmark_stage(stage_name, data_path):
+    """Loads a stage's data and runs the stage inside profile_stage. Returns its record. This is what the worker processes call."""
+
+    stage = BENCHMARK_STAGES_BY_NAME[stage_name]
+
+    args = stage.load(data_path)
+
+    with pipeline_profiling.profile_stage(stage_name, measure=True) as record:
+        record["rows"] = stage.run(*args)
+
+    return record
+
+
+#####################################################################################################
+############################### SECTION 5: RUNNING AND COMPARING ####################################
+#####################################################################################################
+
+def get_git_commit():
+    """Returns the current git commit of the code, or None if it is not in a git repository."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(work_path, n_utterances, audio_minutes, seed=0, stage_names=None):
+    """
+    Takes the work folder, the size of the data, the seed, and the names of the stages to run (defaults to all).
+    Runs each stage in its own new process and returns the run's record. Stages that fail are recorded with their error.
+    """
+
+    data_path = prepare_data(work_path, n_utterances, audio_minutes, seed)
+
+    with open(os.path.join(data_path, DATA_INFO_FILENAME)) as info_file:
+        data_info = json.load(info_file)
+
+    stage_records = []
+
+    for stage in BENCHMARK_STAGES:
+
+        if stage_names is not None and stage.name not in stage_names:
+            continue
+
+        #a new process that does not share anything with this one, so each stage's memory is its own
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+
+            try:
+                stage_records.append(executor.submit(run_benchmark_stage, stage.name, data_path).result())
+
+            except Exception as e:
+                #the error on one line, since nltk's errors are boxes of asterisks
+                stage_records.append({"stage": stage.name, "error": f"{type(e).__name__}: {' '.join(str(e).replace('*', '').split())}"})
+
+        print(format_stage_record(stage_records[-1]))
+
+    return {"timestamp": time.time(),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "utterances": n_utterances,
+            "audio_minutes": audio_minutes,
+            "seed": seed,
+            "data": data_info,
+            "stages": stage_records}
+
+
+def format_stage_record(record):
+
+    if "error" in record:
+        return f"{record['stage']:<14}failed: {record['error'][:100]}"
+
+    return (f"{record['stage']:<14}{record['rows']:>10} rows  {record['seconds']:>9.3f} s  "
+            f"{record['rows_per_second'] or 0:>12.1f} rows/s  {record['peak_rss_mb'] or 0:>9.1f} MB peak")
+
+
+def save_results(results_path, run):
+    """Appends a run's record to the JSON lines results file."""
+
+    with open(results_path, "a") as results_file:
+        results_file.write(json.dumps(run) + "\n")
+
+
+def load_results(results_path):
+    """Returns the list of run records in the JSON lines results file, oldest first."""
+
+    if not os.path.exists(results_path):
+        return []
+
+    with open(results_path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def find_previous_run(runs, run):
+    """Returns the last run before run in runs with the same data size and seed, or None."""
+
+    same_data = [previous_run for previous_run in runs
+                 if previous_run is not run and previous_run["timestamp"] < run["timestamp"]
+                 and (previous_run["utterances"], previous_run["audio_minutes"], previous_run["seed"])
+                 == (run["utterances"], run["audio_minutes"], run["seed"])]
+
+    return same_data[-1] if same_data else None
+
+
+def compare_runs(previous_run, run, threshold=REGRESSION_THRESHOLD):
+    """
+    Takes two runs and the threshold. Returns a dataframe with a row per stage of run with its rows per second and
+    peak memory in both runs, the change in rows per second, and whether it is slower by more than the threshold.
+    """
+
+    previous_records = {record["stage"]: record for record in previous_run["stages"] if "error" not in record}
+
+    comparison_rows = []
+
+    for record in run["stages"]:
+
+        if "error" in record:
+            continue
+
+        previous_record = previous_records.get(record["stage"], {})
+        previous_rows_per_second = previous_record.get("rows_per_second")
+
+        change = (record["rows_per_second"] / previous_rows_per_second - 1
+                  if previous_rows_per_second and record["rows_per_second"] else np.nan)
+
+        comparison_rows.append({"Stage": record["stage"],
+                                "RowsPerSecond": record["rows_per_second"],
+                                "PreviousRowsPerSecond": previous_rows_per_second,
+                                "Change": change,
+                                "PeakRSSMB": record["peak_rss_mb"],
+                                "PreviousPeakRSSMB": previous_record.get("peak_rss_mb"),
+                                "Slower": bool(change < -threshold)})
+
+    return pd.DataFrame(comparison_rows)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline steps on synthetic data.")
+
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("--utterances", type=int, default=10000, help="the number of synthetic utterances")
+    parser.add_argument("--audio-minutes", type=int, default=10, help="the minutes of synthetic 16khz audio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=list(BENCHMARK_STAGES_BY_NAME), help="only these stages (defaults to all)")
+    parser.add_argument("--work-path", default="benchmark_data", help="the folder the synthetic data is written to")
+    parser.add_argument("--results", default="benchmark_results.jsonl", help="the JSON lines file the results are saved to")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="the drop in rows per second reported as slower")
+
+    args = parser.parse_args(argv)
+
+    runs = load_results(args.results)
+
+    if args.command == "run":
+        run = run_benchmarks(args.work_path, args.utterances, args.audio_minutes, args.seed, args.stages)
+        save_results(args.results, run)
+
+    else:
+        if not runs:
+            sys.exit(f"There are no runs in {args.results}.")
+        run = runs[-1]
+
+    previous_run = find_previous_run(runs, run)
+
+    if previous_run is None:
+        print("There is no earlier run of the same size to compare with.")
+        return 0
+
+    comparison_df = compare_runs(previous_run, run, args.threshold)
+
+    print(f"\ncompared with the run of {previous_run['git_commit']} at {time.ctime(previous_run['timestamp'])}:")
+    print(comparison_df.round(3).to_string(index=False))
+
+    return 1 if comparison_df["Slower"].any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+This adds opt-in profiling to the pipeline steps.
+
+The steps have no instrumentation other than the commented-out print(f"{file_row.File}--{file_row.Line}")
+lines in the notebooks. The code here times any block of code wrapped in profile_stage and records:
+    stage, feature, rows        what ran, and how many rows it went through
+    seconds, cpu_seconds        the wall clock and CPU time of the block
+    rows_per_second             rows / seconds
+    start_rss_mb, peak_rss_mb   the memory of the process when the block started, and the most it used during it
+    pid, timestamp              the process the block ran in and when it finished
+    function                    the step function, for the functions decorated with profiled
+
+Nothing is measured unless profiling is turned on, by setting the PIPELINE_PROFILE environment variable to
+the path of a JSON lines file or by calling enable_profiling(path), so the hooks cost nothing in normal runs.
+When it is on, each block appends one line to the file. The worker processes of the pipeline runner inherit
+the environment variable, so they write to the same file.
+
+The entry functions of the step .py files (e.g. step 1.1's get_instances_info_dataframes_streaming) are decorated
+with profiled, so the same records are written when they are run from a notebook or script on the real corpora.
+A step .py file copied next to a notebook without this file uses a profiled that does nothing.
+
+On Linux, the peak memory is sampled from /proc/self/statm every 10 milliseconds while the block runs.
+Elsewhere, it is the peak of the whole process so far (ru_maxrss), which only grows.
+
+Usage:
+    PIPELINE_PROFILE=profile.jsonl python pipeline_runner.py run --config pipeline_config.json
+    python pipeline_runner.py run --config pipeline_config.json --profile profile.jsonl
+    python pipeline_profiling.py profile.jsonl
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+PROFILE_ENV_VARIABLE = "PIPELINE_PROFILE"
+
+#how often the memory is sampled on Linux, in seconds
+SAMPLE_INTERVAL = 0.01
+
+#the file enable_profiling was called with. This is used before the environment variable
+_profile_path = None
+
+
+def enable_profiling(profile_path):
+    """Turns profiling on for this process, writing to the JSON lines file at profile_path."""
+
+    global _profile_path
+    _profile_path = profile_path
+
+
+def disable_profiling():
+    """Turns off the profiling turned on by enable_profiling. The environment variable is left alone."""
+
+    global _profile_path
+    _profile_path = None
+
+
+def get_profile_path():
+    """Returns the file the profile records are written to, or None if profiling is off."""
+
+    return _profile_path or os.environ.get(PROFILE_ENV_VARIABLE) or None
+
+
+#####################################################################################################
+############################### SECTION 1: MEMORY ###################################################
+#####################################################################################################
+
+def get_rss_mb():
+    """Returns the memory (resident set size) of this process in MB, or None where /proc is not available."""
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_max_rss_mb():
+    """Returns the most memory this process has used so far in MB, or None where it cannot be read."""
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    #ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+class MemorySampler:
+    """
+    Samples the memory of this process in a background thread while it is running.
+    Where /proc is not available, peak_mb is ru_maxrss when the sampler is stopped.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+
+        self.interval = interval
+        self.start_mb = get_rss_mb()
+        self.peak_mb = self.start_mb
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, get_rss_mb())
+
+    def start(self):
+
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, get_rss_mb())
+
+        else:
+            self.peak_mb = get_max_rss_mb()
+
+        return self.peak_mb
+
+
+#####################################################################################################
+############################### SECTION 2: HOOKS ####################################################
+#####################################################################################################
+
+def write_record(record, profile_path):
+    """Appends a record to the JSON lines file. Each record is one write, so processes can share the file."""
+
+    with open(profile_path, "a") as profile_file:
+        profile_file.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def profile_stage(stage, feature=None, rows=None, profile_path=None, measure=False, **details):
+    """
+    Times the block of code inside the with statement. Takes the stage name, the feature, the number of rows
+    (which can also be set inside the block with record["rows"] = ...), the file to write to (defaults to
+    get_profile_path()), whether to measure even when profiling is off, and any other details to record.
+    Yields the record, which is filled in when the block is finished. If profiling is off and measure is False,
+    nothing is measured or written.
+    """
+
+    profile_path = profile_path or get_profile_path()
+
+    record = {"stage": stage, "feature": feature, "rows": rows}
+    record.update(details)
+
+    if profile_path is None and not measure:
+        yield record
+        return
+
+    sampler = MemorySampler().start()
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+
+    try:
+        yield record
+
+    finally:
+        seconds = time.perf_counter() - start_time
+
+        record.update({"seconds": seconds,
+                       "cpu_seconds": time.process_time() - start_cpu_time,
+                       "rows_per_second": record["rows"] / seconds if record["rows"] and seconds > 0 else None,
+                       "start_rss_mb": sampler.start_mb,
+                       "peak_rss_mb": sampler.stop(),
+                       "pid": os.getpid(),
+                       "timestamp": time.time()})
+
+        if profile_path is not None:
+            write_record(record, profile_path)
+
+
+def profiled(stage, count_rows=len, count_result_rows=None):
+    """
+    A decorator that runs a function inside profile_stage, with the function's name recorded as function.
+    The rows are count_result_rows of what the function returns if it is given, or else count_rows of the
+    function's first argument (its length by default), or not recorded if both are None.
+    """
+
+    def decorator(function):
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+
+            rows = count_rows(args[0]) if count_rows is not None and count_result_rows is None and args else None
+
+            with profile_stage(stage, rows=rows, function=function.__qualname__) as record:
+                result = function(*args, **kwargs)
+
+                if count_result_rows is not None:
+                    record["rows"] = count_result_rows(result)
+
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+#####################################################################################################
+############################### SECTION 3: READING PROFILES ##########################################
+#####################################################################################################
+
+def read_profile(profile_path):
+    """Takes a JSON lines profile file and returns a dataframe with one row per record."""
+
+    import pandas as pd
+
+    with open(profile_path) as profile_file:
+        return pd.DataFrame([json.loads(line) for line in profile_file if line.strip()])
+
+
+def summarize_profile(profile_df):
+    """
+    Takes a profile dataframe and returns one row per stage (and per function, for the records of the step functions
+    decorated with profiled), slowest first, with the number of times it ran, its total rows, seconds and CPU seconds,
+    its rows per second, and its largest peak memory.
+    """
+
+    #the pipeline runner's records of a whole stage have no function
+    profile_df = profile_df.assign(function=profile_df["function"].fillna("") if "function" in profile_df.columns else "")
+
+    summary_df = (profile_df.groupby(["stage", "function"], sort=False)
+                  .agg(Runs=("seconds", "size"), Rows=("rows", "sum"), Seconds=("seconds", "sum"),
+                       CPUSeconds=("cpu_seconds", "sum"), PeakRSSMB=("peak_rss_mb", "max")))
+
+    summary_df["RowsPerSecond"] = summary_df["Rows"] / summary_df["Seconds"]
+
+    return summary_df.sort_values(by="Seconds", ascending=False).round(3)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python pipeline_profiling.py profile.jsonl")
+
+    print(summarize_profile(read_profile(sys.argv[1])).to_string())
@@ -0,0 +1,770 @@
+"""
+This runs the section 2 steps as an incremental pipeline.
+
+Each step is declared as a stage with the files it reads and the files it writes. The runner
+fingerprints the inputs by their content (sha256) and only runs a stage again for a feature
+(aint_variations, be or done) when one of that feature's inputs changed since the last run. A stage's
+own code (its notebook or .py file) is one of its inputs, so changing a cleaning rule re-runs the
+cleaning step and everything after it, but nothing before it. Stages that do not depend on each other,
+like the same stage for different features, run at the same time in a pool of processes.
+
+Steps that only exist as notebooks (or are done by hand, like step 2.13) cannot be run from here.
+The runner still tracks them. When their inputs change it reports that the notebook has to be run
+again, and the steps after them wait. Once the notebook has been run, record it with mark-done.
+
+The fingerprints are stored in .pipeline_state.json in the data root. A file is only hashed again
+when its size or modification time changes.
+
+Usage:
+    python pipeline_runner.py status --config pipeline_config.json
+    python pipeline_runner.py run --config pipeline_config.json [--stages 2.3 2.7] [--features be done] [--jobs 4] [--profile profile.jsonl]
+    python pipeline_runner.py mark-done --config pipeline_config.json --stages 2.6
+
+The config file is a JSON dictionary. All of its keys are optional, and stages whose keys are missing
+are left alone:
+    data_root                   the folder with the step CSV folders (defaults to the config file's folder)
+    source_audio_path           the folder with the full 16khz CORAAL audio files (step 2.1)
+    clip_paths                  {feature: folder} where the clips of each feature are stored (steps 2.1 and 2.2)
+    snreval_path                the unzipped snreval_MACI64 folder (step 2.2)
+    pronunciation_dictionary    the pronunciation dictionary text file (step 2.3)
+    pronunciation_index         where the compiled pronunciation index is stored (step 2.3)
+    table_root                  the folder where the stages also store the step CSVs they read and write as typed
+                                tables (columnar_storage.py), and read them from, so floats are not parsed again
+                                between the steps. The CSVs are still written for the notebooks and the steps done by hand
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pipeline_profiling
+
+
+FEATURES = ("aint_variations", "be", "done")
+
+STATE_FILENAME = ".pipeline_state.json"
+
+#the folder this file is in, where the notebooks and step .py files are
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+#####################################################################################################
+############################### SECTION 1: FINGERPRINTS #############################################
+#####################################################################################################
+
+def hash_file(filepath, chunk_size=1 << 20):
+    """Takes a filepath and returns the sha256 of its contents."""
+
+    sha = hashlib.sha256()
+
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class FingerprintStore:
+    """
+    The fingerprints of the last successful run of each stage and feature, and a cache of file hashes
+    keyed by size and modification time, saved as JSON.
+    """
+
+    def __init__(self, state_path):
+
+        self.state_path = state_path
+
+        if os.path.exists(state_path):
+            with open(state_path, "r") as state_file:
+                state = json.load(state_file)
+        else:
+            state = {}
+
+        self.tasks = state.get("tasks", {})
+        self.hash_cache = state.get("hash_cache", {})
+
+    def save(self):
+
+        #writes to a temporary file first so a crash never leaves half a state file
+        with open(f"{self.state_path}.tmp", "w") as state_file:
+            json.dump({"tasks": self.tasks, "hash_cache": self.hash_cache}, state_file, indent=1, sort_keys=True)
+
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def fingerprint(self, path):
+        """
+        Takes a file or folder path. Returns the sha256 of a file, a sha256 of the names and hashes of
+        every file in a folder, or None if the path does not exist.
+        """
+
+        if os.path.isdir(path):
+
+            sha = hashlib.sha256()
+
+            for dirpath, dirnames, filenames in os.walk(path):
+
+                dirnames.sort()
+
+                for filename in sorted(filenames):
+                    filepath = os.path.join(dirpath, filename)
+                    sha.update(f"{os.path.relpath(filepath, path)}\0{self.fingerprint(filepath)}\0".encode("utf-8"))
+
+            return sha.hexdigest()
+
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+
+        cached = self.hash_cache.get(key)
+
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        file_hash = hash_file(path)
+
+        self.hash_cache[key] = [stat.st_size, stat.st_mtime_ns, file_hash]
+
+        return file_hash
+
+    def fingerprints(self, paths):
+
+        return {path: self.fingerprint(path) for path in paths}
+
+
+#####################################################################################################
+############################### SECTION 2: STAGES ###################################################
+#####################################################################################################
+
+class Stage:
+    """
+    A step of the pipeline.
+
+    inputs and outputs are functions that take a feature (None for stages that are not per feature)
+    and the config, and return lists of paths. run is a function with the same arguments that writes
+    the outputs, or None for steps that can only be run from their notebook. required_config lists the
+    config keys the stage needs to know its paths or to run.
+    """
+
+    def __init__(self, name, code, inputs, outputs, run=None, per_feature=True, required_config=()):
+
+        self.name = name
+        self.code = code
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.per_feature = per_feature
+        self.required_config = required_config
+
+    def is_configured(self, config):
+
+        return all(key in config for key in self.required_config)
+
+    def get_inputs(self, feature, config):
+
+        #the stage's own code is an input, so editing it runs the stage again
+        return [os.path.join(CODE_ROOT, code_filename) for code_filename in self.code] + self.inputs(feature, config)
+
+    def get_outputs(self, feature, config):
+
+        return self.outputs(feature, config)
+
+
+def _import_step(module_name):
+    """Imports one of the step .py files, whose names have hyphens in them."""
+
+    if CODE_ROOT not in sys.path:
+        sys.path.insert(0, CODE_ROOT)
+
+    return importlib.import_module(module_name)
+
+
+def _path(config, folder, filename):
+
+    return os.path.join(config["data_root"], folder, filename)
+
+
+def _table_path(csv_path, config):
+
+    return os.path.join(config["table_root"], os.path.splitext(os.path.relpath(csv_path, config["data_root"]))[0])
+
+
+def read_step_csv(csv_path, step, feature, config):
+    """
+    Takes a step CSV, the step whose schema it has, the feature and the config. Returns its dataframe.
+    Without a table_root this is pd.read_csv. With one, the dataframe is read from the CSV's table, which is
+    made from the CSV first if it does not exist yet or is older than the CSV (e.g. when a notebook wrote it).
+    """
+
+    import pandas as pd
+
+    if "table_root" not in config:
+        return pd.read_csv(csv_path)
+
+    storage = _import_step("columnar_storage")
+
+    table_path = _table_path(csv_path, config)
+    schema_path = os.path.join(table_path, storage.SCHEMA_FILENAME)
+
+    if not os.path.exists(schema_path) or os.path.getmtime(schema_path) < os.path.getmtime(csv_path):
+        os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        storage.import_csv(csv_path, table_path, step, feature)
+
+    #the counts come back as int64 or float64 columns, the same as pd.read_csv gives, so the step code is not changed
+    return storage.read_table(table_path, nullable=False)
+
+
+def write_step_csv(df, csv_path, step, feature, config):
+    """
+    Takes a dataframe, the step CSV to write it to, the step whose schema it has, the feature and the config.
+    Writes the CSV and, with a table_root, its table, which checks it against the step's schema.
+    """
+
+    df.to_csv(csv_path, index=False)
+
+    if "table_root" in config:
+
+        storage = _import_step("columnar_storage")
+
+        table_path = _table_path(csv_path, config)
+
+        os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        storage.write_table(df, table_path, step, feature)
+
+
+def gold_standard_csv(feature, config):
+    return _path(config, "step2-0_gold_standard_csvs_copied_from_step1-3", f"{feature}_coraal_instances_GoldStandard.csv")
+
+
+def snr_csv(feature, config):
+    return _path(config, "step2-2_speech_to_noise_ratio_csvs", f"{feature}_SNR.csv")
+
+
+def speech_rate_csv(feature, config):
+    return _path(config, "step2-3_speech_rate_csvs", f"{feature}_speechRate.csv")
+
+
+def ASR_csv(feature, config):
+    return _path(config, "step2-4_ASR_transcription_csvs", f"{feature}_ASRtranscripts.csv")
+
+
+def cleaned_csv(feature, config):
+    return _path(config, "step2-5_cleaned_csvs", f"{feature}_cleanedUtterances.csv")
+
+
+def word_count_csv(feature, config):
+    return _path(config, "step2-6_word_count_csvs", f"{feature}_wordCounts.csv")
+
+
+def WER_csv(feature, config):
+    return _path(config, "step2-7_word_error_rate_csvs", f"{feature}_totalWER.csv")
+
+
+def error_count_csv(feature, config):
+    return _path(config, "step2-8_errors_pre_post_feature_csvs", f"{feature}_errorCounts.csv")
+
+
+def pre_post_WER_csv(feature, config):
+    return _path(config, "step2-9_pre_post_WER_csvs", f"{feature}_prePostWER.csv")
+
+
+def check_for_feature_csv(feature, config):
+    return _path(config, "step2-10_checking_if_ASR_output_has_feature_csvs", f"{feature}_checkForFeature.csv")
+
+
+def adjacent_tokens_csv(feature, config):
+    return _path(config, "step2-11_check-adjacent-tokens_csvs", f"{feature}_checkAdjacentTokens.csv")
+
+
+def auto_correctness_csv(feature, config):
+    return _path(config, "step2-12_check_for_correctness_automated_csvs", f"{feature}_autoCorrectness.csv")
+
+
+def binary_check_csv(feature, config):
+    #the step 2.12.5 notebook names the ain't file aint_featureBinaryCheck.csv
+    feature_name = "aint" if feature == "aint_variations" else feature
+    return _path(config, "step2-12.5_habitual_completive_columns_csvs", f"{feature_name}_featureBinaryCheck.csv")
+
+
+def manual_correctness_csv(feature, config):
+    return _path(config, "step2-13_check_for_correctness_manually_csvs", f"{feature}_manualCorrectness.csv")
+
+
+DESCRIPTIVE_STATS_FILENAMES = ["aint_variations_percentCorrect.csv", "nonAint_variations_percentCorrect.csv",
+                               "aint_variations_biasRatio.csv",
+                               "aint_variations_summaryWER.csv", "nonAint_variations_summaryWER.csv",
+                               "habitualBe_percentCorrect.csv", "nonHabitualBe_percentCorrect.csv",
+                               "be_biasRatio.csv",
+                               "habitualBe_summaryWER.csv", "nonHabitualBe_summaryWER.csv",
+                               "completiveDone_percentCorrect.csv", "nonCompletiveDone_percentCorrect.csv",
+                               "done_biasRatio.csv",
+                               "completiveDone_summaryWER.csv", "nonCompletiveDone_summaryWER.csv",
+                               "aint_variations_biasRatio_bootstrapCI.csv", "be_biasRatio_bootstrapCI.csv",
+                               "done_biasRatio_bootstrapCI.csv"]
+
+
+def run_clip_audio(feature, config):
+
+    clipping = _import_step("step2-01_clipping_audio_by_source_file")
+
+    audio_output_path = os.path.join(config["clip_paths"][feature], "")
+    os.makedirs(audio_output_path, exist_ok=True)
+
+    feature_instances_df = read_step_csv(gold_standard_csv(feature, config), "2.0", feature, config)
+
+    return clipping.clip_feature_audio(feature_instances_df, os.path.join(config["source_audio_path"], ""), audio_output_path)
+
+
+def run_snr(feature, config):
+
+    snr = _import_step("step2-02_batched_signal_to_noise_ratio")
+
+    wav_path = config["clip_paths"][feature]
+
+    gs_df = read_step_csv(gold_standard_csv(feature, config), "2.0", feature, config)
+
+    snr.add_wada_snr_column(gs_df, wav_path)
+    gs_df, failed_rows = snr.get_Rigal_df(gs_df, wav_path, config["snreval_path"])
+
+    if failed_rows:
+        print(f"2.2 {feature}: {len(failed_rows)} clips failed: {failed_rows}")
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+    write_step_csv(gs_df, snr_csv(feature, config), "2.2", feature, config)
+
+    return len(gs_df)
+
+
+def run_speech_rate(feature, config):
+
+    speech_rate = _import_step("step2-03_compiled_pronunciation_index")
+
+    index = speech_rate.load_pronunciation_index(config["pronunciation_index"], config["pronunciation_dictionary"])
+
+    #the columns are added to the step 2.2 dataframe, the same as the notebook. the gold standard can have
+    # more than one row with the same File, Line and FeatureCountPerLine, so the rows can't be matched up afterwards
+    gs_df = read_step_csv(snr_csv(feature, config), "2.2", feature, config)
+    gs_df, oov_df = speech_rate.add_speech_rate_columns(gs_df, index)
+
+    if len(oov_df):
+        print(f"2.3 {feature}: {len(oov_df)} words are not in the pronunciation dictionary, "
+              f"the most frequent are {', '.join(oov_df['Word'].head(10))}")
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+    write_step_csv(gs_df, speech_rate_csv(feature, config), "2.3", feature, config)
+
+    return len(gs_df)
+
+
+def run_cleaning(feature, config):
+
+    cleaning = _import_step("step2-05_compiled_utterance_cleaning")
+
+    #the runner already runs the features in parallel, so each one is cleaned in a single process
+    gs_df = cleaning.add_cleaned_columns(read_step_csv(ASR_csv(feature, config), "2.4", feature, config))
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+    write_step_csv(gs_df, cleaned_csv(feature, config), "2.5", feature, config)
+
+    return len(gs_df)
+
+
+def run_WER(feature, config):
+
+    alignment = _import_step("step2-07_shared_word_alignment")
+
+    gs_df = alignment.add_WER_columns(read_step_csv(word_count_csv(feature, config), "2.6", feature, config))
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+    write_step_csv(gs_df, WER_csv(feature, config), "2.7", feature, config)
+
+    return len(gs_df)
+
+
+def run_error_counts(feature, config):
+
+    alignment = _import_step("step2-07_shared_word_alignment")
+
+    #each row of the ain't file is aligned with its own AintVariation
+    gs_df = alignment.add_error_count_columns(read_step_csv(WER_csv(feature, config), "2.7", feature, config),
+                                              None if feature == "aint_variations" else feature)
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+    write_step_csv(gs_df, error_count_csv(feature, config), "2.8", feature, config)
+
+    return len(gs_df)
+
+
+def run_feature_scan(feature, config):
+
+    scanner = _import_step("step2-10_single_pass_feature_scanner")
+
+    gs_df = scanner.scan_features(read_step_csv(pre_post_WER_csv(feature, config), "2.9", feature, config), feature)
+
+    gs_df = gs_df.sort_values(by=['File', 'Line'])
+
+    step_dfs = scanner.get_step_dataframes(gs_df, feature)
+
+    for step_name, output_path in [("2.10", check_for_feature_csv(feature, config)), ("2.11", adjacent_tokens_csv(feature, config)),
+                                   ("2.12", auto_correctness_csv(feature, config)), ("2.12.5", binary_check_csv(feature, config))]:
+        write_step_csv(step_dfs[step_name], output_path, step_name, feature, config)
+
+    return len(gs_df)
+
+
+def run_descriptive_stats(feature, config):
+
+    statistics = _import_step("step2-14_grouped_descriptive_statistics")
+
+    row_count = 0
+
+    for feature_name in FEATURES:
+
+        gs_df = read_step_csv(manual_correctness_csv(feature_name, config), "2.13", feature_name, config)
+        feature_class = statistics.FEATURE_CLASSES[feature_name]
+
+        for filename, step_df in statistics.get_step_dataframes(gs_df, feature_name).items():
+            step_df.to_csv(_path(config, "step2-14_descriptive_stats_csvs", filename))
+
+        bootstrap_df = statistics.bootstrap_bias_ratios(gs_df, feature_class.column)
+        bootstrap_df.to_csv(_path(config, "step2-14_descriptive_stats_csvs", f"{feature_class.bias_ratio_prefix}_biasRatio_bootstrapCI.csv"), index=False)
+
+        row_count += len(gs_df)
+
+    return row_count
+
+
+STAGES = [
+    Stage("2.1", ["step2-01.ipynb", "step2-01_clipping_audio_by_source_file.py"],
+          inputs=lambda feature, config: [gold_standard_csv(feature, config), config["source_audio_path"]],
+          outputs=lambda feature, config: [config["clip_paths"][feature]],
+          run=run_clip_audio, required_config=("source_audio_path", "clip_paths")),
+
+    Stage("2.2", ["step2-02.ipynb", "step2-02_batched_signal_to_noise_ratio.py"],
+          inputs=lambda feature, config: [gold_standard_csv(feature, config), config["clip_paths"][feature]],
+          outputs=lambda feature, config: [snr_csv(feature, config)],
+          run=run_snr, required_config=("clip_paths", "snreval_path")),
+
+    Stage("2.3", ["step2-03.ipynb", "step2-03_compiled_pronunciation_index.py"],
+          inputs=lambda feature, config: [snr_csv(feature, config), config["pronunciation_dictionary"]],
+          outputs=lambda feature, config: [speech_rate_csv(feature, config)],
+          run=run_speech_rate, required_config=("pronunciation_dictionary", "pronunciation_index")),
+
+    Stage("2.4", ["step2-04.ipynb", "step2-04_concurrent_asr_transcription.py"],
+          inputs=lambda feature, config: [speech_rate_csv(feature, config)],
+          outputs=lambda feature, config: [ASR_csv(feature, config)]),
+
+    Stage("2.5", ["step2-05_compiled_utterance_cleaning.py"],
+          inputs=lambda feature, config: [ASR_csv(feature, config)],
+          outputs=lambda feature, config: [cleaned_csv(feature, config)],
+          run=run_cleaning),
+
+    Stage("2.6", ["step2-06.ipynb"],
+          inputs=lambda feature, config: [cleaned_csv(feature, config)],
+          outputs=lambda feature, config: [word_count_csv(feature, config)]),
+
+    Stage("2.7", ["step2-07_shared_word_alignment.py"],
+          inputs=lambda feature, config: [word_count_csv(feature, config)],
+          outputs=lambda feature, config: [WER_csv(feature, config)],
+          run=run_WER),
+
+    Stage("2.8", ["step2-07_shared_word_alignment.py"],
+          inputs=lambda feature, config: [WER_csv(feature, config)],
+          outputs=lambda feature, config: [error_count_csv(feature, config)],
+          run=run_error_counts),
+
+    Stage("2.9", ["step2-09.ipynb"],
+          inputs=lambda feature, config: [error_count_csv(feature, config)],
+          outputs=lambda feature, config: [pre_post_WER_csv(feature, config)]),
+
+    #one pass over the step 2.9 CSV writes the step 2.10, 2.11, 2.12 and 2.12.5 CSVs
+    Stage("2.10-2.12.5", ["step2-10_single_pass_feature_scanner.py"],
+          inputs=lambda feature, config: [pre_post_WER_csv(feature, config)],
+          outputs=lambda feature, config: [check_for_feature_csv(feature, config), adjacent_tokens_csv(feature, config),
+                                           auto_correctness_csv(feature, config), binary_check_csv(feature, config)],
+          run=run_feature_scan),
+
+    #step 2.13 is done by hand following step2-13_manually-check-for-correctness_v2.txt
+    Stage("2.13", ["step2-13_manually-check-for-correctness_v2.txt"],
+          inputs=lambda feature, config: [binary_check_csv(feature, config)],
+          outputs=lambda feature, config: [manual_correctness_csv(feature, config)]),
+
+    Stage("2.14", ["step2-14_grouped_descriptive_statistics.py"],
+          inputs=lambda feature, config: [manual_correctness_csv(feature, config) for feature in FEATURES],
+          outputs=lambda feature, config: [_path(config, "step2-14_descriptive_stats_csvs", filename) for filename in DESCRIPTIVE_STATS_FILENAMES],
+          run=run_descriptive_stats, per_feature=False),
+]
+
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+#####################################################################################################
+############################### SECTION 3: RUNNING ##################################################
+#####################################################################################################
+
+def _run_task(stage_name, feature, config):
+    """
+    Runs one stage for one feature. This is what the worker processes call.
+    If profiling is on, the stage's time, rows and memory are recorded.
+    """
+
+    with pipeline_profiling.profile_stage(stage_name, feature) as record:
+        record["rows"] = STAGES_BY_NAME[stage_name].run(feature, config)
+
+
+def get_task_key(stage, feature):
+
+    return stage.name if feature is None else f"{stage.name}:{feature}"
+
+
+def get_tasks(config, stage_names=None, features=FEATURES):
+    """
+    Returns a list of (stage, feature) tasks in pipeline order, and a dictionary of
+    task key: set of the keys of the tasks that write its inputs.
+    Stages that are not selected or not configured are left out, and their outputs are treated
+    like any other input file.
+    """
+
+    tasks = []
+
+    for stage in STAGES:
+
+        if stage_names is not None and stage.name not in stage_names:
+            continue
+
+        if not stage.is_configured(config):
+            continue
+
+        for feature in (features if stage.per_feature else [None]):
+            tasks.append((stage, feature))
+
+    producers = {}
+
+    for stage, feature in tasks:
+        for output_path in stage.get_outputs(feature, config):
+            producers[os.path.abspath(output_path)] = get_task_key(stage, feature)
+
+    dependencies = {}
+
+    for stage, feature in tasks:
+        dependencies[get_task_key(stage, feature)] = {producers[os.path.abspath(input_path)]
+                                                      for input_path in stage.get_inputs(feature, config)
+                                                      if os.path.abspath(input_path) in producers}
+
+    return tasks, dependencies
+
+
+def is_stale(store, stage, feature, config):
+    """
+    Takes the fingerprint store, a stage, a feature and the config.
+    Returns (whether the stage has to be run for the feature, the current input fingerprints).
+    """
+
+    input_fingerprints = store.fingerprints(stage.get_inputs(feature, config))
+
+    record = store.tasks.get(get_task_key(stage, feature))
+
+    if record is None or record["inputs"] != input_fingerprints:
+        return True, input_fingerprints
+
+    if any(not os.path.exists(output_path) for output_path in stage.get_outputs(feature, config)):
+        return True, input_fingerprints
+
+    return False, input_fingerprints
+
+
+def record_task(store, stage, feature, config, input_fingerprints):
+
+    store.tasks[get_task_key(stage, feature)] = {"inputs": input_fingerprints,
+                                                 "outputs": store.fingerprints(stage.get_outputs(feature, config))}
+
+
+def run_pipeline(config, stage_names=None, features=FEATURES, max_workers=None, force=False, dry_run=False):
+    """
+    Takes the config, the names of the stages to run (defaults to all), the features, the number of
+    worker processes, whether to run stages even if they are up to date, and whether to only report
+    what would run. Runs every stale task once the tasks it depends on are finished.
+    Returns a dictionary of task key: status.
+    """
+
+    store = FingerprintStore(os.path.join(config["data_root"], STATE_FILENAME))
+
+    tasks, dependencies = get_tasks(config, stage_names, features)
+    tasks_by_key = {get_task_key(stage, feature): (stage, feature) for stage, feature in tasks}
+
+    statuses = {}
+    running = {}
+
+    #the fingerprints are recorded when a task is submitted, so changes made while it runs are caught next time
+    submitted_inputs = {}
+
+    def get_ready_tasks():
+        """Returns the tasks that have not started whose dependencies are all decided, with their dependencies' statuses."""
+
+        ready = []
+
+        for key, (stage, feature) in tasks_by_key.items():
+
+            if key in statuses or key in submitted_inputs:
+                continue
+
+            dependency_statuses = [statuses.get(dependency) for dependency in dependencies[key]]
+
+            if all(dependency_status is not None for dependency_status in dependency_statuses):
+                ready.append((key, stage, feature, dependency_statuses))
+
+        return ready
+
+    def start_task(key, stage, feature, dependency_statuses):
+        """Decides whether a ready task has to run and submits it if it does."""
+
+        if any(dependency_status in ("failed", "blocked", "needs notebook run") for dependency_status in dependency_statuses):
+            statuses[key] = "blocked"
+            return
+
+        #in a dry run the stages before it were not really run, so their changes are assumed
+        if dry_run and "would run" in dependency_statuses:
+            stale, input_fingerprints = True, None
+        else:
+            stale, input_fingerprints = is_stale(store, stage, feature, config)
+
+        if not stale and not force:
+            statuses[key] = "up to date"
+
+        elif stage.run is None:
+            statuses[key] = "needs notebook run"
+
+        elif dry_run:
+            statuses[key] = "would run"
+
+        else:
+            submitted_inputs[key] = input_fingerprints
+            running[executor.submit(_run_task, stage.name, feature, config)] = key
+            print(f"running {key}")
+
+    executor = None if dry_run else ProcessPoolExecutor(max_workers=max_workers)
+
+    try:
+        while True:
+
+            #deciding a task can make the tasks after it ready, so this keeps going until nothing else can be decided without waiting
+            ready = get_ready_tasks()
+
+            while ready:
+
+                for key, stage, feature, dependency_statuses in ready:
+                    start_task(key, stage, feature, dependency_statuses)
+
+                ready = get_ready_tasks()
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+
+                key = running.pop(future)
+                stage, feature = tasks_by_key[key]
+
+                try:
+                    future.result()
+
+                except Exception as e:
+                    statuses[key] = "failed"
+                    print(f"{key} failed: {e!r}")
+
+                else:
+                    record_task(store, stage, feature, config, submitted_inputs[key])
+                    store.save()
+                    statuses[key] = "ran"
+                    print(f"{key} finished")
+
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+        store.save()
+
+    return statuses
+
+
+def mark_done(config, stage_names=None, features=FEATURES):
+    """
+    Records the current fingerprints of the selected tasks whose outputs all exist, for steps that were
+    run from their notebook or by hand. Returns the keys of the tasks that were recorded.
+    """
+
+    store = FingerprintStore(os.path.join(config["data_root"], STATE_FILENAME))
+
+    tasks, _ = get_tasks(config, stage_names, features)
+
+    marked = []
+
+    for stage, feature in tasks:
+
+        if all(os.path.exists(output_path) for output_path in stage.get_outputs(feature, config)):
+            record_task(store, stage, feature, config, store.fingerprints(stage.get_inputs(feature, config)))
+            marked.append(get_task_key(stage, feature))
+
+    store.save()
+
+    return marked
+
+
+def load_config(config_path=None):
+    """Reads the JSON config file. The data root defaults to the config file's folder, or the current folder."""
+
+    config = {}
+
+    if config_path is not None:
+        with open(config_path, "r") as config_file:
+            config = json.load(config_file)
+
+    config.setdefault("data_root", os.path.dirname(os.path.abspath(config_path)) if config_path is not None else os.getcwd())
+
+    return config
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Runs the section 2 steps, skipping the ones whose inputs have not changed.")
+
+    parser.add_argument("command", choices=["run", "status", "mark-done"])
+    parser.add_argument("--config", help="the JSON config file")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES_BY_NAME), help="only these stages (defaults to all)")
+    parser.add_argument("--features", nargs="+", choices=FEATURES, default=list(FEATURES), help="only these features (defaults to all)")
+    parser.add_argument("--jobs", type=int, default=None, help="the number of worker processes")
+    parser.add_argument("--force", action="store_true", help="run the stages even if they are up to date")
+    parser.add_argument("--profile", help="a JSON lines file to record the time, rows and memory of each stage in")
+
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+
+    if args.command == "mark-done":
+
+        for key in mark_done(config, args.stages, args.features):
+            print(f"{key} marked as done")
+
+        return 0
+
+    #the worker processes inherit the environment variable
+    if args.profile is not None:
+        os.environ[pipeline_profiling.PROFILE_ENV_VARIABLE] = os.path.abspath(args.profile)
+
+    statuses = run_pipeline(config, args.stages, args.features, args.jobs, args.force, dry_run=args.command == "status")
+
+    for key, status in statuses.items():
+        print(f"{key:<32}{status}")
+
+    return 1 if "failed" in statuses.values() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,506 @@
+"""
+This is a streaming version of get_instances_info_dataframes from the step 1.1 notebook.
+
+The notebook function reads and tokenizes every transcript of a corpus one at a time, and it
+has to be run once per search word, so each corpus is scanned three times for ain't, be and done.
+The code here does the following instead:
+    (1) scans each corpus only once for any number of search words
+    (2) spreads the transcripts out across a pool of worker processes
+    (3) yields each transcript's matched utterances and the corpus' running word and instance counts
+        as soon as the transcript is finished, so nothing has to be built in memory first
+
+The per-file parsers are the same as in the notebook. They are defined at the top level of this file
+(rather than inside a function as in the notebook) so that the worker processes can use them.
+To use this code in a notebook, keep this file in the same folder as the notebook and import it like this:
+    import importlib
+    streaming = importlib.import_module("step1-1_streaming_corpus_ingestion")
+"""
+
+import os
+import re
+import string
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from nltk import word_tokenize
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#the corpus names that can be given, in lowercase
+CORPUS_NAMES = ['coraal', 'switchboard', 'hub5', 'fisher', 'librispeech', 'timit']
+
+
+#####################################################################################################
+############################### SECTION 1: PER-FILE PARSERS #########################################
+#####################################################################################################
+
+def create_coraal_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the CORAAL corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    coraal_df = pd.read_csv(
+        f"{transcript_filepath}{transcript_filename}", sep="\t")
+
+    # creates a 'File' column
+    coraal_df['File'] = transcript_filename[:-4]
+
+    # renames column names for consistency with other corpora dataframes
+    coraal_df = coraal_df.rename(
+        columns={"Spkr": "Speaker", "StTime": "UttStartTime", "EnTime": "UttEndTime"})
+
+    # creates a column with the utterance audio length in seconds
+    #  this will be used later to calculate speech rate
+    coraal_df['UttLength'] = coraal_df['UttEndTime'] - coraal_df['UttStartTime']
+
+    # drops the 'all_info' column from the dataframe
+    coraal_df = coraal_df[['File', 'Line', 'Speaker', 'UttStartTime',
+                           'UttEndTime', 'UttLength', 'Content']]
+
+    # removes all metalinguistic and paralinguistic information except for pauses
+    coraal_df = coraal_df.replace(
+        to_replace=r'\/(\?+|[Uu]nintelligible)\/|\/|\[|\]|\<.*?\>|\((?!pause).*?\)', value='', regex=True)
+
+    #this will remove all White interviewers from the dataframe
+    white_interviewer_ids = ['DCA_int_01', 'DCA_int_02', 'DCA_int_04', 'DCA_int_07', 'DCA_int_08', 'LES_int_01', 'PRV_int_01', 'PRV_int_02']
+
+    coraal_df = coraal_df[~coraal_df['Speaker'].isin(white_interviewer_ids)]
+
+    # returns the dataframe
+    return coraal_df
+
+
+def create_switchboard_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the Switchboard corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    swb_df = pd.read_csv(f"{transcript_filepath}{transcript_filename}",
+                         sep="\t", header=None, names=['all_info'])
+
+    # replaces the first three spaces in each transcript line with tab characters for separation purposes
+    swb_df = pd.DataFrame([row.all_info.replace(" ", "\t", 3)
+                           for row in swb_df.itertuples()], columns=['all_info'])
+
+    # splits each row into multiple columns, breaking on tab characters
+    swb_df = swb_df.join(swb_df['all_info'].str.split('\t', expand=True).rename(
+        columns={0: 'File-Line', 1: 'UttStartTime', 2: 'UttEndTime', 3: 'Content'}))
+
+    # converts the start and end times from a string format to a float format
+    swb_df['UttStartTime'] = swb_df['UttStartTime'].astype(float)
+    swb_df['UttEndTime'] = swb_df['UttEndTime'].astype(float)
+
+    # splits the file-line combination that is built into Switchboard transcript lines
+    # creates a 'File' column
+    swb_df['File'] = swb_df['File-Line'].str.slice(0, 14)
+
+    # creates a 'Line column'
+    swb_df['Line'] = swb_df['File-Line'].str.slice(-4,)
+
+    # gets the speaker id from the filename
+    swb_df['Speaker'] = transcript_filename[6]
+
+    # creates a column with the utterance audio length in seconds
+    swb_df['UttLength'] = swb_df['UttEndTime'] - swb_df['UttStartTime']
+
+    # drops the 'all_info' column from the dataframe
+    swb_df = swb_df[['File', 'Line', 'Speaker', 'UttStartTime',
+                     'UttEndTime', 'UttLength', 'Content']]
+
+    # removes all metalinguistic and paralinguistic information, except for silence markers since those compose half the lines in Switchboard
+    swb_df = swb_df.replace(to_replace=r'\[(?!silence).*?\]|\<.*?\>', value='', regex=True)
+
+    # returns the dataframe
+    return swb_df
+
+
+def create_hub5_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the Hub5 corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    hub5_df = pd.read_csv(f"{transcript_filepath}{transcript_filename}",
+                          sep="\t", header=None, names=['all_info'])
+
+    # replaces the first three spaces in each transcript line with tab characters for separation purposes
+    hub5_df = pd.DataFrame([row.all_info.replace(" ", "\t", 3)
+                            for row in hub5_df.itertuples()], columns=['all_info'])
+
+    # splits each row into multiple columns, breaking on tab characters
+    hub5_df = hub5_df.join(hub5_df['all_info'].str.split('\t', expand=True).rename(
+        columns={0: 'UttStartTime', 1: 'UttEndTime', 2: 'Speaker', 3: 'Content'}))
+
+    # converts the start and end times from a string format to a float format
+    hub5_df['UttStartTime'] = hub5_df['UttStartTime'].astype(float)
+    hub5_df['UttEndTime'] = hub5_df['UttEndTime'].astype(float)
+
+    # creates a 'File' column
+    hub5_df['File'] = transcript_filename[:-4]
+
+    # creates a 'Line column'
+    # NOTE: The Hub5 transcripts DO NOT have line numbers. The numbers added here are based on Pandas row numbers
+    hub5_df['Line'] = np.arange(hub5_df.shape[0])
+    hub5_df['Line'] = hub5_df['Line'] + 1
+
+    #removes the colon from the speaker id
+    hub5_df['Speaker'] = hub5_df['Speaker'].apply(lambda speaker_id: speaker_id.strip(string.punctuation))
+
+    # creates a column with the utterance audio length in seconds
+    hub5_df['UttLength'] = hub5_df['UttEndTime'] - hub5_df['UttStartTime']
+
+    # drops the 'all_info' column from the dataframe
+    hub5_df = hub5_df[['File', 'Line', 'Speaker', 'UttStartTime',
+                       'UttEndTime', 'UttLength', 'Content']]
+
+    # removes all metalinguistic and paralinguistic information
+    hub5_df = hub5_df.replace(
+        to_replace=r'\<.*?\[.*?\]\[.*?\].*?\>|\{.*?\}|\%|\&|\*{2}.*?\*{2}|\[{2}.*?\]{2}|\({2}|\){2}', value='', regex=True)
+    hub5_df = hub5_df.replace(
+        to_replace=r'\<.*?\>|\[.*?\]', value='', regex=True)
+
+    # returns the dataframe
+    return hub5_df
+
+
+def create_fisher_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the Fisher corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    fisher_df = pd.read_csv(f"{transcript_filepath}{transcript_filename}", header=None, names=[
+                            'all_info'], sep="\t", skiprows=2)
+
+    # replaces the first three spaces in each transcript line with tab characters for separation purposes
+    fisher_df = pd.DataFrame([row.all_info.replace(" ", "\t", 3)
+                              for row in fisher_df.itertuples()], columns=['all_info'])
+
+    # splits each row into multiple columns, breaking on tab characters
+    fisher_df = fisher_df.join(fisher_df['all_info'].str.split('\t', expand=True).rename(
+        columns={0: 'UttStartTime', 1: 'UttEndTime', 2: 'Speaker', 3: 'Content'}))
+
+    # converts the start and end times from a string format to a float format
+    fisher_df['UttStartTime'] = fisher_df['UttStartTime'].astype(float)
+    fisher_df['UttEndTime'] = fisher_df['UttEndTime'].astype(float)
+
+    # creates a 'File' column
+    fisher_df['File'] = transcript_filename[:-4]
+
+    # creates a 'Line column'
+    # NOTE: The Fisher transcripts DO NOT have line numbers. The numbers added here are based on Pandas row numbers
+    fisher_df['Line'] = np.arange(fisher_df.shape[0])
+    fisher_df['Line'] = fisher_df['Line'] + 1
+
+    #removes the colon from the speaker id
+    fisher_df['Speaker'] = fisher_df['Speaker'].apply(lambda speaker_id: speaker_id.strip(string.punctuation))
+
+    # creates a column with the utterance audio length in seconds
+    fisher_df['UttLength'] = fisher_df['UttEndTime'] - fisher_df['UttStartTime']
+
+    # drops the 'all_info' column from the dataframe
+    fisher_df = fisher_df[['File', 'Line', 'Speaker', 'UttStartTime',
+                           'UttEndTime', 'UttLength', 'Content']]
+
+    # removes all metalinguistic and paralinguistic information
+    fisher_df = fisher_df.replace(
+        to_replace=r'\_|\({2}|\){2}|\s{2}|\[.*?\]', value='', regex=True)
+
+    # returns the dataframe
+    return fisher_df
+
+
+def create_librispeech_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the LibriSpeech corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    librispeech_df = pd.read_csv(
+        f"{transcript_filepath}{transcript_filename}", sep="\t", header=None, names=['all_info'])
+
+    # replaces the first space in each transcript line with tab characters for separation purposes
+    librispeech_df = pd.DataFrame([row.all_info.replace(
+        " ", "\t", 1) for row in librispeech_df.itertuples()], columns=['all_info'])
+
+    # splits each row into multiple columns, breaking on tab characters
+    librispeech_df = librispeech_df.join(librispeech_df['all_info'].str.split(
+        '\t', expand=True).rename(columns={0: 'File-Line', 1: 'Content'}))
+
+    # creates a 'File' column
+    librispeech_df['File'] = librispeech_df['File-Line'].str.slice(0, 16)
+
+    # creates a 'Line column'
+    librispeech_df['Line'] = librispeech_df['File-Line'].str.slice(-4,)
+
+    # drops the 'all_info' column from the dataframe
+    librispeech_df = librispeech_df[['File', 'Line', 'Content']]
+
+    # lowercases all letters in Content. LibriSpeech transcripts are all uppercase with no punctuation
+    librispeech_df['Content'] = librispeech_df['Content'].str.lower()
+
+    # returns the dataframe
+    return librispeech_df
+
+
+def create_timit_df(transcript_filepath, transcript_filename):
+    """Takes a txt file transcript from the TIMIT corpus and creates a cleaned Pandas dataframe."""
+
+    # reads in csv and creates Pandas dataframe
+    timit_df = pd.read_csv(f"{transcript_filepath}{transcript_filename}",
+                           header=None, sep="\t", names=['all_info'])
+
+    # replaces the first two spaces in each transcript line with tab characters for separation purposes
+    timit_df = pd.DataFrame([row.all_info.replace(" ", "\t", 2)
+                             for row in timit_df.itertuples()], columns=['all_info'])
+
+    # splits each row into multiple columns, breaking on tab characters
+    timit_df = timit_df.join(timit_df['all_info'].str.split('\t', expand=True).rename(
+        columns={0: 'BeginningIntegerSampleNumber', 1: 'EndIntegerSampleNumber', 2: 'Content'}))
+
+    # creates a 'File' column
+    timit_df['File'] = transcript_filename[:-4]
+
+    # drops the 'all_info' column from the dataframe
+    timit_df = timit_df[['File', 'BeginningIntegerSampleNumber',
+                         'EndIntegerSampleNumber', 'Content']]
+
+    # returns the dataframe
+    return timit_df
+
+
+#maps the lowercased corpus names to their parsers
+CORPUS_PARSERS = {'coraal': create_coraal_df,
+                  'switchboard': create_switchboard_df,
+                  'hub5': create_hub5_df,
+                  'fisher': create_fisher_df,
+                  'librispeech': create_librispeech_df,
+                  'timit': create_timit_df}
+
+
+#####################################################################################################
+############################### SECTION 2: PER-FILE SCANNING ########################################
+#####################################################################################################
+
+def get_search_word_regex(search_word_string):
+    """
+    Takes a search word and returns the regular expression used by the step 1.1 notebook to find
+    only whole words. Only the first letter of the search word may be uppercase.
+    """
+
+    return rf"\b[{search_word_string[0].upper()}|{search_word_string[0].lower()}]{search_word_string[1:]}\b"
+
+
+def filter_df_by_word(dataframe, search_word_string):
+    """
+    Takes a word and filters a Pandas dataframe and leaves only rows
+    that contain that search word in its Content.
+    """
+
+    search_word_regex = get_search_word_regex(search_word_string)
+
+    # filters the dataframe by rows whose 'Content' contains the word
+    word_df = dataframe[dataframe['Content'].str.contains(
+        search_word_regex, case=False, flags=re.IGNORECASE, regex=True)].copy()
+
+    #adds a column to the dataframe that has the number of instances per row
+    # the count is case sensitive, the same as in the notebook
+    word_df["InstancesCountPerLine"] = [len(re.findall(search_word_regex, content)) for content in word_df['Content']]
+
+    # returns the dataframe
+    return word_df
+
+
+def get_file_word_count(file_df, corpus_name):
+    """
+    Takes a transcript dataframe and returns its total word count in the same way as the step 1.1 notebook.
+    CORAAL rows composed only of pauses and Switchboard rows composed only of silence are not counted.
+    """
+
+    if corpus_name.lower() == "coraal":
+        skip_prefix = "(pause"
+    elif corpus_name.lower() == "switchboard":
+        skip_prefix = "[silence"
+    else:
+        skip_prefix = None
+
+    file_word_count = 0
+
+    for content in file_df['Content']:
+
+        if skip_prefix is not None and content.startswith(skip_prefix):
+            continue
+
+        #tokenizes words in Content using nltk's word tokenizer and
+        # eliminates tokens which are only punctuation markers
+        file_word_count += sum(1 for word in word_tokenize(content) if word not in string.punctuation)
+
+    return file_word_count
+
+
+def scan_transcript(txt_import_path, txt_filename, corpus_name, search_words):
+    """
+    Takes one transcript file, its corpus name and a list of search words.
+    Parses and tokenizes the file once and returns the file's word count and a dictionary
+    of search word: dataframe of the lines that contain the search word.
+    This is the function that runs in the worker processes.
+    """
+
+    file_df = CORPUS_PARSERS[corpus_name.lower()](txt_import_path, txt_filename)
+
+    instances_dfs = {search_word: filter_df_by_word(file_df, search_word) for search_word in search_words}
+
+    return get_file_word_count(file_df, corpus_name), instances_dfs
+
+
+def get_txt_filenames(txt_import_path):
+    """Takes a corpus filepath and returns the txt filenames in it in the same order as the step 1.1 notebook."""
+
+    txt_filenames = []
+
+    for root, dirs, files in os.walk(txt_import_path):
+
+        for file in files:
+
+            #this is because the 2021 CORAAL files have duplicate versions
+            #  of files that start with ._ and contain nothing
+            if file.startswith("._"):
+                pass
+
+            elif file.endswith(".txt") or file.endswith(".TXT") or file.endswith(".text"):
+                txt_filenames.append(file)
+
+    return txt_filenames
+
+
+#####################################################################################################
+############################### SECTION 3: STREAMING ################################################
+#####################################################################################################
+
+def stream_corpora_instances(corpora_paths, search_words, max_workers=None, txt_filenames=None):
+    """
+    Takes a dictionary of corpus name: corpus filepath, a list of search words, the number of
+    worker processes to use (defaults to the number of CPUs), and optionally a dictionary of
+    corpus name: txt filenames from get_txt_filenames, if they have already been listed.
+    Yields a tuple for each transcript as soon as it has been scanned, in the order they finish:
+        (1) the corpus name
+        (2) the txt filename
+        (3) a dictionary of search word: dataframe of lines in the transcript that contain the search word
+        (4) the corpus' running total word count
+        (5) a dictionary of search word: the corpus' running total number of instances
+    Each corpus is only scanned once no matter how many search words are given, and each transcript's
+    dataframes are let go of once they have been yielded.
+    """
+
+    for corpus_name in corpora_paths:
+        if corpus_name.lower() not in CORPUS_NAMES:
+            raise Exception("""The corpus name you gave is not valid. Please use one of the following: CORAAL, Switchboard, Hub5, Fisher, LibriSpeech, or TIMIT.""")
+
+    #running totals for each corpus
+    word_counts = {corpus_name: 0 for corpus_name in corpora_paths}
+    instances_counts = {corpus_name: {search_word: 0 for search_word in search_words} for corpus_name in corpora_paths}
+
+    if txt_filenames is None:
+        txt_filenames = {corpus_name: get_txt_filenames(txt_import_path) for corpus_name, txt_import_path in corpora_paths.items()}
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    try:
+        #submits every transcript of every corpus to the pool up front
+        # so the workers are never waiting on one corpus to finish
+        futures = {executor.submit(scan_transcript, txt_import_path, txt_filename, corpus_name, search_words): (corpus_name, txt_filename)
+                   for corpus_name, txt_import_path in corpora_paths.items()
+                   for txt_filename in txt_filenames[corpus_name]}
+
+        for future in as_completed(futures):
+
+            #the finished future is removed so its result isn't kept until the whole generator is done
+            corpus_name, txt_filename = futures.pop(future)
+            file_word_count, instances_dfs = future.result()
+
+            word_counts[corpus_name] += file_word_count
+            for search_word, word_df in instances_dfs.items():
+                instances_counts[corpus_name][search_word] += int(word_df["InstancesCountPerLine"].sum())
+
+            yield (corpus_name, txt_filename, instances_dfs,
+                   word_counts[corpus_name], dict(instances_counts[corpus_name]))
+
+    #cancels the transcripts that haven't started if the loop over this generator is stopped early
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def count_instances(instances_info_dataframes):
+    """Returns the number of instance rows in a get_instances_info_dataframes_streaming dictionary, for the profile."""
+
+    return sum(len(instances_df) for corpora in instances_info_dataframes.values() for instances_df, _ in corpora.values())
+
+
+@profiled("1.1", count_result_rows=count_instances)
+def get_instances_info_dataframes_streaming(corpora_paths, search_words, max_workers=None):
+    """
+    Takes a dictionary of corpus name: corpus filepath, a list of search words, and the number of
+    worker processes to use. Returns a dictionary of search word: corpus name: (instances_df, info_df),
+    where the two dataframes are the same as the ones returned by the step 1.1 notebook's
+    get_instances_info_dataframes for that search word and corpus.
+    """
+
+    txt_filenames = {corpus_name: get_txt_filenames(txt_import_path) for corpus_name, txt_import_path in corpora_paths.items()}
+
+    #collects each file's instances as they come in
+    file_instances = {(corpus_name, search_word): {} for corpus_name in corpora_paths for search_word in search_words}
+    total_word_counts = {}
+
+    for corpus_name, txt_filename, instances_dfs, word_count, _ in stream_corpora_instances(corpora_paths, search_words, max_workers, txt_filenames):
+
+        total_word_counts[corpus_name] = word_count
+
+        for search_word, word_df in instances_dfs.items():
+            file_instances[(corpus_name, search_word)][txt_filename] = word_df
+
+    instances_info_dataframes = {search_word: {} for search_word in search_words}
+
+    for (corpus_name, search_word), instances_by_file in file_instances.items():
+
+        # concatenates the instance dataframes in the same file order as the notebook
+        instances_df = pd.concat([instances_by_file[txt_filename] for txt_filename in txt_filenames[corpus_name]]).reset_index(drop=True)
+
+        total_word_count = total_word_counts[corpus_name]
+        total_instances_count = instances_df["InstancesCountPerLine"].sum()
+
+        # calculates the normalized amount of instances of the search word per 100,000
+        normalized_instances_count = total_instances_count / total_word_count * 100000
+
+        info_df = pd.DataFrame({f'{corpus_name}': [total_word_count,
+                                                   total_instances_count,
+                                                   normalized_instances_count,
+                                                   len(txt_filenames[corpus_name])]}, index=['TotalCorpusWordCount',
+                                                                                             'TotalWordInstancesCount',
+                                                                                             'NormalizedWordInstancesCount',
+                                                                                             'TotalFileCount'])
+
+        #Pandas defaults to scientific notation. This will correct that.
+        info_df = info_df.round(2)
+
+        instances_info_dataframes[search_word][corpus_name] = (instances_df, info_df)
+
+    return instances_info_dataframes
+
+
+##This is the file path where you keep all the corpora sub-folders
+## MAKE SURE IT ENDS WITH THE PROPER SLASH
+# corpora_path = "path"
+
+##this scans every corpus once for all three features and gets you the same dataframes as the step 1.1 notebook
+## NOTE: when running this in a notebook, the function must be called from the imported module (see the top of this file)
+# corpora_paths = {"CORAAL": f"{corpora_path}CORAAL/",
+#                  "Fisher": f"{corpora_path}Fisher/",
+#                  "LibriSpeech": f"{corpora_path}LibriSpeech/",
+#                  "Switchboard": f"{corpora_path}SwitchboardHub5/Switchboard/",
+#                  "Hub5": f"{corpora_path}SwitchboardHub5/hub5_noHeader/",
+#                  "TIMIT": f"{corpora_path}TIMIT/"}
+# instances_info_dataframes = get_instances_info_dataframes_streaming(corpora_paths, ["ain't", "be", "done"])
+# be_coraal_instances_df, be_coraal_info_df = instances_info_dataframes["be"]["CORAAL"]
+
+##this streams the matched lines instead, e.g. to write them out as they are found
+# for corpus_name, txt_filename, instances_dfs, word_count, instances_counts in stream_corpora_instances(corpora_paths, ["ain't", "be", "done"]):
+#     print(f"{corpus_name}--{txt_filename}: {word_count} words, {instances_counts}")
@@ -0,0 +1,285 @@
+import string
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#####################################################################################################
+############################### SECTION 1: PRECOMPILED RULES ########################################
+#####################################################################################################
+
+#These are the same word lists used in v6 of this code. The difference is that v6 built
+# every combination of them (several hundred thousand 3-element lists for the L3 collocations)
+# as Python lists inside the function and then checked each 'be' against them with linear
+# 'in' scans. Here the lists are compiled once, when this file is imported, into hashed sets.
+# The L2 and L3 collocations are not expanded at all; instead, a left-context tuple is
+# checked one position at a time against the sets that the collocation would have been
+# built from. The labels produced are identical to v6.
+
+#In English, if 'be' is preceded (or governed in linguistics terms) by a modal or a negated
+# modal, it is non-habitual without exception. L1 means one word to the left of 'be'.
+MODALS_L1 = frozenset(["can", "can't", "cannot", "could", "couldn't", "may", "might", "must", "mustn't", "should",
+                       "shouldn't", "ought", "hafta", "oughta", "will", "won't", "would", "wouldn't", "shall",
+                       "'ll", "'d", "ll", "d", "twill", "wouldst", "would'st", "shalt", "wilt", "twould",
+                       "mayst", "wouldnt", "neednt", "mus", "wud", "shouldst", "to", "ter"])
+                       #'to'/"ter" is not a modal, but it's included here for use with the L2 combo list
+
+#These are other various words that only precede a non-habitual 'be'.
+# L1 means one word to the left of 'be'.
+OTHERS_L1 = frozenset(["had", "tryna", "gonna", "going", "sposta", "supposed", "finna", "gotta", "wanna",
+                       "lemme", "to", "need", "needn't", "rather", "i'm'a", "let's", "lets",
+                       "liketa", "better", "got", "want", "wanna", "please", "na", "ta", "than",
+                       "if", "let", "whether", "letting", "uh", "though", "them", "us", "me", "her", "him",
+                       "best", "ud", "blessed", "praised", "glory", "praise", "ull", "'m", "hadda", "why"])
+
+#Adverbs, often adverbs of frequency, (and other words) that can intervene between a modal and 'be'
+ADVERBS_AND_OTHERS = frozenset(['again', 'all', 'almost', 'also', 'always', 'actually', 'annually', 'constantly', 'daily',
+                                'eventually', 'even', 'ever', 'frequently', 'generally', 'hourly', 'infrequently',
+                                'just', 'later', 'like', 'monthly', 'never', 'next', 'nightly', 'normally', 'not',
+                                'now', 'occasionally', 'often', 'only', 'periodically', 'possibly', 'probably', 'quarterly',
+                                'rarely', 'really', 'regularly', 'seldomly', 'sometimes', 'sometime', 'soon', 'still', 'then',
+                                'today', 'tonight', 'very', 'weekly', 'well', 'yearly', 'yesterday', 'yet', 'that'])
+
+#the combined set of the three previous sets
+FULL_L1 = MODALS_L1 | OTHERS_L1 | ADVERBS_AND_OTHERS
+
+#If these punctuation markers occur immediately to the left of 'be', then it is non-habitual.
+# NOTE: v6 checks the L1 token with 'in' against this string, which is a substring check
+# (e.g., ",." also matches), so it is kept as a string here to give the same labels
+PUNCTUATION_L1 = ",.!?"
+
+#coordinating conjunctions that make 'be' non-habitual when they are the first word token in the utterance
+COORDINATING_CONJUNCTIONS = frozenset(['and', 'but', 'so', 'for', 'yet', 'or', 'nor'])
+
+#pronouns used in collocations with modals for questions (i.e., interrogative) structures
+# NOTE: "I" is uppercase while the tokens are lowercased, so it never matches. This is kept
+# as is so the labels are identical to v6
+PRONOUNS = frozenset(["I", "you", "he", "she", "it", "you", "we", "they", "thou"])
+
+#other various two-word combinations (collocations) that could occur before a non-habitual 'be'
+OTHERS_L2 = frozenset([("gon", "na"), ("got", "ta"), ("had", "better"), ("'m", "a"), ("wan", "na"), ("can", "n't"), ("can", "not"),
+                       ("could", "n't"), ("must", "n't"), ("should", "n't"), ("wo", "n't"), ("would", "n't"), ("'", "a"), ("let", "'s"), ("i", "'m")])
+
+#words that occur two or three words to the left of 'be' that will make it non-habitual regardless of what intervenes
+OTHER_L2_L3_SINGLE = frozenset(["if", "whether", "let", "letting"])
+FULL_L2_SINGLE = OTHER_L2_L3_SINGLE | MODALS_L1
+
+
+def is_L2_collocation(left_context):
+    """
+    Takes a tuple of the two word tokens to the left of 'be' and returns True if it is
+    one of v6's full_L2_collocations, i.e., an L1 followed by an adverb, a modal followed
+    by a pronoun, or one of the other L2 collocations.
+    """
+
+    if len(left_context) != 2:
+        return False
+
+    L2, L1 = left_context
+
+    return ((L2 in FULL_L1 and L1 in ADVERBS_AND_OTHERS) or
+            (L2 in MODALS_L1 and L1 in PRONOUNS) or
+            left_context in OTHERS_L2)
+
+
+def is_L3_collocation(left_context):
+    """
+    Takes a tuple of the three word tokens to the left of 'be' and returns True if it is
+    one of v6's full_L3_collocations, i.e., a modal followed by a pronoun and an adverb or
+    an L1 followed by two adverbs.
+    """
+
+    if len(left_context) != 3:
+        return False
+
+    L3, L2, L1 = left_context
+
+    return (L1 in ADVERBS_AND_OTHERS and
+            ((L3 in MODALS_L1 and L2 in PRONOUNS) or
+             (L3 in FULL_L1 and L2 in ADVERBS_AND_OTHERS)))
+
+
+#####################################################################################################
+############################### SECTION 2: CLASSIFYING 'BE' #########################################
+#####################################################################################################
+
+def classify_be_token(tokens, be_index):
+    """
+    Takes a tuple of lowercased word tokens and the index of a 'be' in it and returns 0 if
+    the 'be' is non-habitual or 1 if it is potentially habitual and must be inspected manually.
+    This applies the rules that v6 applies to every 'be' after the first word token checks.
+    """
+
+    #if 'be' is the second word token in the utterance, and a coordinating conjunction is the first,
+    # it is labeled non-habitual as this analysis does not take into consideration larger context of speaker turn
+    if be_index == 1 and tokens[0] in COORDINATING_CONJUNCTIONS:
+        return 0
+
+    #if 'be' is the third word token in the utterance, an adverb is the second, and
+    # a coordinating conjunction is the first, it is labeled non-habitual
+    if be_index == 2 and tokens[0] in COORDINATING_CONJUNCTIONS and tokens[1] in ADVERBS_AND_OTHERS:
+        return 0
+
+    #habitual 'be' can be preceded by "don't", but not any other negated contraction,
+    # unless "don't" is the first word in the utterance (imperative mood)
+    # NOTE: negative indices wrap around to the end of the utterance exactly as they do in v6
+    if tokens[be_index-1] == "n't":
+        if tokens[be_index-2] == "do" and be_index-2 != 0:
+            return 1
+        return 0
+
+    #checks the L2 to see if it's a contracted negative in the same way
+    if tokens[be_index-2] == "n't":
+        if tokens[be_index-3] == "do" and be_index-3 != 0:
+            return 1
+        return 0
+
+    #checks the L1, L2 and L3 context of 'be' against the precompiled rules
+    # if words have punctuation attached, it checks a version where punctuation is stripped
+    # on either side of the word
+    L1 = tokens[be_index-1]
+    L2_context = tokens[be_index-2:be_index]
+    L3_context = tokens[be_index-3:be_index]
+
+    if (L1 in FULL_L1 or
+        L1.strip(string.punctuation) in FULL_L1 or
+        L1 in PUNCTUATION_L1 or
+        is_L2_collocation(L2_context) or
+        is_L2_collocation(tuple(word.strip(string.punctuation) for word in L2_context)) or
+        tokens[be_index-2] in FULL_L2_SINGLE or
+        tokens[be_index-2].strip(string.punctuation) in FULL_L2_SINGLE or
+        is_L3_collocation(L3_context) or
+        is_L3_collocation(tuple(word.strip(string.punctuation) for word in L3_context)) or
+        tokens[be_index-3] in OTHER_L2_L3_SINGLE or
+        tokens[be_index-3] in MODALS_L1):
+        return 0
+
+    #any other case is a catch-all to be manually inspected
+    return 1
+
+
+#instances of 'be' with punctuation attached, mainly "be-", are non-habitual
+BE_WITH_PUNCTUATION = frozenset([f"be{punct}" for punct in string.punctuation] +
+                                [f"{punct}be" for punct in string.punctuation])
+
+
+def get_feature_count(tokens, instances_count):
+    """
+    Takes a tuple of lowercased word tokens and the row's InstancesCountPerLine and returns
+    the row's FeatureCountPerLine value, following the same code key as v6.
+    """
+
+    #if the number of 'be' is 1, the label of the last 'be' token (or 'be' token with
+    # punctuation attached) decides the row, which is what v6's repeated .loc writes do
+    if instances_count == 1:
+
+        feature_count = float("nan")
+
+        #v6 always gets the index of the first 'be', even if the tokenizer finds more than one
+        first_be_index = None
+
+        for content_word in tokens:
+
+            if content_word == "be":
+
+                if first_be_index is None:
+                    first_be_index = tokens.index("be")
+
+                    #'be' as the first or the last word token in the utterance is non-habitual
+                    if first_be_index == 0 or tokens[-1] == "be":
+                        be_label = 0
+                    else:
+                        be_label = classify_be_token(tokens, first_be_index)
+
+                feature_count = be_label
+
+            elif content_word in BE_WITH_PUNCTUATION:
+                feature_count = 0
+
+        return feature_count
+
+    #if the number of 'be' is more than one, counts the potentially habitual 'be's.
+    # 'be' as the first word token is skipped, but the last word token is not (same as v6)
+    elif instances_count > 1:
+
+        return sum(classify_be_token(tokens, be_index)
+                   for be_index, content_word in enumerate(tokens)
+                   if content_word == "be" and be_index != 0)
+
+    else:
+        return 1
+
+
+@profiled("1.2")
+def determine_be_habituality(be_instances_df):
+
+    """
+    This code is only for the AAL morphosyntactic (grammatical) feature
+    habitual 'be' (also known as aspectual 'be' and invariant 'be')
+    see this link for info about habitual 'be': https://ygdp.yale.edu/phenomena/invariant-be
+
+    This is a drop-in replacement for v6 of this function and produces identical labels.
+    It takes the instances dataframes from step 1.1 and produces a dataframe that
+    automatically determines whether the 'be' in the row's Content is non-habitual.
+    Those that are not labeled as non-habitual either (1) contain more than one instance
+    of 'be', (2) occur at the beginning of the utterance with no preceding word tokens,
+    (3) are habitual 'be', (4) aren't captured by the non-habitual rules for some other reason.
+    The produced dataframe will need to be manually inspected and corrected
+    for habitual 'be's. The non-habitual labels should not need inspecting.
+
+    Unlike v6, the rules are precompiled into hashed sets when this file is imported,
+    the whole Content column is tokenized and classified in one pass, and the
+    FeatureCountPerLine column is assigned once instead of through a .loc write per row.
+    """
+
+    import numpy as np
+    from nltk import word_tokenize
+
+    # tokenizes the words in the Content using nltk's word_tokenizer and lowercases the words
+    # only rows with at least one 'be' are tokenized since the rest are labeled 1 without looking at Content
+    feature_counts = [get_feature_count(tuple(word.lower() for word in word_tokenize(content))
+                                        if instances_count >= 1 else (), instances_count)
+                      for content, instances_count in zip(be_instances_df["Content"],
+                                                          be_instances_df["InstancesCountPerLine"])]
+
+    #here is the key for the numbers:
+    # 0 = no habitual 'be' present in the line
+    # 1 or more = the count of potential habitual 'be' present in the line, this may not be correct and must be inspected manually
+    # the column is a float column, as it is in v6, so the csv files are identical
+    be_instances_df["FeatureCountPerLine"] = np.array(feature_counts, dtype=float)
+
+    #returns the dataframe
+    return be_instances_df
+
+
+##the directory you want your dataframes to go to
+## MAKE SURE IT ENDS WITH THE PROPER SLASH
+# df_output_path = "path"
+
+
+##this will run the code and get you the habituality dataframes for each corpus
+# coraal_habituality_df = determine_be_habituality(coraal_instances_df)
+# switchboardHub5_habituality_df = determine_be_habituality(switchboardHub5_instances_df)
+# fisher_habituality_df = determine_be_habituality(fisher_instances_df)
+# librispeech_habituality_df = determine_be_habituality(librispeech_instances_df)
+# timit_habituality_df = determine_be_habituality(timit_instances_df)
+
+##this will change the order of the columns for each dataframe so they're
+## more readable when you do the manual correction
+# coraal_habituality_df = coraal_habituality_df[["File", "Line", "Speaker", "UttStartTime", "UttEndTime", "InstancesCountPerLine", "FeatureCountPerLine", "Content"]]
+# switchboardHub5_habituality_df = switchboardHub5_habituality_df[["File", "Line", "Speaker", "UttStartTime", "UttEndTime", "InstancesCountPerLine", "FeatureCountPerLine", "Content"]]
+# fisher_habituality_df = fisher_habituality_df[["File", "Line", "Speaker", "UttStartTime", "UttEndTime", "InstancesCountPerLine", "FeatureCountPerLine", "Content"]]
+# librispeech_habituality_df = librispeech_habituality_df[["File", "Line", "InstancesCountPerLine", "FeatureCountPerLine", "Content"]]
+# timit_habituality_df = timit_habituality_df[["File", "BeginningIntegerSampleNumber", "EndIntegerSampleNumber", "InstancesCountPerLine", "FeatureCountPerLine", "Content"]]
+
+
+##this will export the dataframes to csvs for you for manual correction
+# coraal_habituality_df.to_csv(f"{df_output_path}coraal_habituality_df.csv")
+# fisher_habituality_df.to_csv(f"{df_output_path}fisher_habituality_df.csv")
+# switchboardHub5_habituality_df.to_csv(f"{df_output_path}switchboardHub5_habituality_df.csv")
+# librispeech_habituality_df.to_csv(f"{df_output_path}librispeech_habituality_df.csv")
+# timit_habituality_df.to_csv(f"{df_output_path}timit_habituality_df.csv")
@@ -0,0 +1,347 @@
+"""
+This is a compact version of create_split_content_dataframe from the step 1.4 notebook.
+
+The notebook splits the Content before and after each instance of the feature into one object column per word,
+right-aligns the words before it with the justify function, which makes a full copy of the words and a sorted mask
+of the same size, and copies the whole row for every instance in a line with more than one instance. The memory it
+needs grows with the number of rows times the length of the longest utterance, and most of the cells are empty.
+The code here does the following instead:
+    (1) stores the tokens of every line as integer codes in one array, with where each line starts and ends
+    (2) stores each instance of the search word as its line, the position of the token it is in, and the codes of
+        the text the notebook puts in ContentFeature and of the parts of that token before and after it
+    (3) only makes the wide L.../ContentFeature/R... columns for the step 1.5 annotation CSVs, a chunk of
+        rows at a time, so the whole split content of a corpus never has to be in memory at once
+
+The table can be built from any dataframe with a Content column, so it works for all of the lines of a corpus
+from step 1.1 as well as for the step 1.3 gold standard subset. For a gold standard dataframe, the exported rows
+are the same as the notebook's: lines with a FeatureCountPerLine of 1 get the last instance in the line, lines
+with a FeatureCountPerLine above 1 get a row for every instance, and the rows are sorted by File, Line and
+the number of the instance.
+"""
+
+import re
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#the columns the notebook adds, to be filled in by hand in step 1.5
+ANNOTATION_COLUMNS = ["SubjectWordToken", "PredicateWordToken", "WordPattern",
+                      "SubjectPOS", "PredicatePOS", "POSPattern"]
+
+#the columns of the dataframe the notebook returns when there are no instances of the feature
+EMPTY_SPLIT_CONTENT_COLUMNS = ["File", "Line", "Speaker", "UttStartTime", "UttEndTime", "UttLength",
+                               "InstancesCountPerLine", "FeatureCountPerLine", "Content"] + ANNOTATION_COLUMNS
+
+#the notebook's words are the ones str.split() gives, and this finds where each of them starts and ends
+TOKEN_REGEX = re.compile(r"\S+")
+
+#the code stored when an instance's token has no text before or after the instance
+NO_PIECE = -1
+
+
+def get_search_word_regex(search_word_string):
+    """Takes the search word and returns the notebook's regular expression for it, which only matches whole words."""
+
+    return re.compile(f"\\b[{search_word_string[0].upper()}|{search_word_string[0].lower()}]{search_word_string[1:]}\\b")
+
+
+#####################################################################################################
+############################### SECTION 1: BUILDING THE TOKEN TABLE #################################
+#####################################################################################################
+
+@profiled("1.4")
+def build_token_table(lines_df, search_word_string):
+    """
+    Takes a dataframe with a Content column (a step 1.3 gold standard dataframe, or the lines of a whole
+    corpus from step 1.1) and the search word. Returns a TokenTable of the tokens of every line and of every
+    match of the search word in them.
+    """
+
+    search_word_regex = get_search_word_regex(search_word_string)
+
+    tokens = []
+    line_lengths = np.zeros(len(lines_df), dtype=np.int64)
+
+    #the feature texts and the parts of tokens are coded together with the tokens. these are their positions in extra_strings
+    extra_strings = []
+    instance_lines, instance_positions, instance_iterations = [], [], []
+    instance_features, instance_befores, instance_afters = [], [], []
+
+    for line_number, content in enumerate(lines_df["Content"].tolist()):
+
+        #the notebook searches str(Content), so a missing Content is searched as "nan"
+        content = str(content)
+
+        line_tokens = content.split()
+        line_lengths[line_number] = len(line_tokens)
+        tokens.extend(line_tokens)
+
+        matches = list(search_word_regex.finditer(content))
+
+        if not matches:
+            continue
+
+        token_spans = [(token_match.start(), token_match.end()) for token_match in TOKEN_REGEX.finditer(content)]
+        token_starts = [token_start for token_start, _ in token_spans]
+
+        for iteration_number, match in enumerate(matches, 1):
+
+            position = bisect_right(token_starts, match.start()) - 1
+            token_start, token_end = token_spans[position]
+
+            #the notebook's ContentFeature is the match and the one character after it
+            feature_end = match.end() + 1
+
+            instance_lines.append(line_number)
+            instance_positions.append(position)
+            instance_iterations.append(iteration_number)
+
+            instance_features.append(len(extra_strings))
+            extra_strings.append(content[match.start():feature_end])
+
+            #a match inside a token, like "(be" or "be...", splits the token into more than one word
+            if match.start() > token_start:
+                instance_befores.append(len(extra_strings))
+                extra_strings.append(content[token_start:match.start()])
+            else:
+                instance_befores.append(NO_PIECE)
+
+            if feature_end < token_end:
+                instance_afters.append(len(extra_strings))
+                extra_strings.append(content[feature_end:token_end])
+            else:
+                instance_afters.append(NO_PIECE)
+
+    codes, strings = pd.factorize(pd.Series(tokens + extra_strings, dtype=object))
+
+    token_codes = codes[:len(tokens)].astype(np.int32)
+
+    #NO_PIECE (-1) is added at the end, so the positions that are NO_PIECE stay NO_PIECE
+    extra_codes = np.append(codes[len(tokens):], NO_PIECE).astype(np.int32)
+
+    return TokenTable(lines_df=lines_df,
+                      strings=np.asarray(strings, dtype=object),
+                      token_codes=token_codes,
+                      line_offsets=np.concatenate(([0], np.cumsum(line_lengths))).astype(np.int64),
+                      instance_lines=np.array(instance_lines, dtype=np.int64),
+                      instance_positions=np.array(instance_positions, dtype=np.int32),
+                      instance_iterations=np.array(instance_iterations, dtype=np.int32),
+                      instance_feature_codes=extra_codes[np.array(instance_features, dtype=np.int64)],
+                      instance_before_codes=extra_codes[np.array(instance_befores, dtype=np.int64)],
+                      instance_after_codes=extra_codes[np.array(instance_afters, dtype=np.int64)])
+
+
+#####################################################################################################
+############################### SECTION 2: THE TOKEN TABLE ##########################################
+#####################################################################################################
+
+class TokenTable:
+    """
+    The tokens of the lines of a dataframe and every instance of the search word in them:
+        lines_df                    the dataframe the table was built from
+        strings                     the text of each code
+        token_codes                 the code of every token, one line after the other
+        line_offsets                where each line starts and ends in token_codes
+        instance_lines              the line (row number in lines_df) of each instance
+        instance_positions          the position in its line of the token each instance is in
+        instance_iterations         which match in its line each instance is, starting from 1
+        instance_feature_codes      the code of each instance's ContentFeature text
+        instance_before_codes       the code of the part of the token before each instance, or -1 if there is none
+        instance_after_codes        the code of the part of the token after each ContentFeature, or -1 if there is none
+    """
+
+    def __init__(self, lines_df, strings, token_codes, line_offsets, instance_lines, instance_positions,
+                 instance_iterations, instance_feature_codes, instance_before_codes, instance_after_codes):
+
+        self.lines_df = lines_df
+        self.strings = strings
+        self.token_codes = token_codes
+        self.line_offsets = line_offsets
+        self.instance_lines = instance_lines
+        self.instance_positions = instance_positions
+        self.instance_iterations = instance_iterations
+        self.instance_feature_codes = instance_feature_codes
+        self.instance_before_codes = instance_before_codes
+        self.instance_after_codes = instance_after_codes
+
+    def __len__(self):
+        """Returns the number of instances."""
+
+        return len(self.instance_lines)
+
+    def get_line_tokens(self, line_number):
+        """Takes a row number in lines_df and returns the tokens of its Content."""
+
+        return self.strings[self.token_codes[self.line_offsets[line_number]:self.line_offsets[line_number + 1]]].tolist()
+
+    def get_context(self, instance_number):
+        """
+        Takes an instance number and returns (the words before it, its ContentFeature text, the words after it),
+        the same as splitting the notebook's ContentBeforeFeature, ContentFeature and ContentAfterFeature.
+        """
+
+        token_position = self.line_offsets[self.instance_lines[instance_number]] + self.instance_positions[instance_number]
+        line_end = self.line_offsets[self.instance_lines[instance_number] + 1]
+
+        before = self.strings[self.token_codes[self.line_offsets[self.instance_lines[instance_number]]:token_position]].tolist()
+        after = self.strings[self.token_codes[token_position + 1:line_end]].tolist()
+
+        if self.instance_before_codes[instance_number] != NO_PIECE:
+            before.append(self.strings[self.instance_before_codes[instance_number]])
+
+        if self.instance_after_codes[instance_number] != NO_PIECE:
+            after.insert(0, self.strings[self.instance_after_codes[instance_number]])
+
+        return before, self.strings[self.instance_feature_codes[instance_number]], after
+
+    def get_context_lengths(self, instance_numbers):
+        """Takes an array of instance numbers and returns (the number of words before each, the number of words after each)."""
+
+        line_lengths = np.diff(self.line_offsets)[self.instance_lines[instance_numbers]]
+        positions = self.instance_positions[instance_numbers]
+
+        return (positions + (self.instance_before_codes[instance_numbers] != NO_PIECE),
+                line_lengths - positions - 1 + (self.instance_after_codes[instance_numbers] != NO_PIECE))
+
+    def select_split_content_instances(self):
+        """
+        Returns the instance numbers of the rows of the notebook's split content dataframe, in its order.
+        Without a FeatureCountPerLine column (e.g. for all of the lines of a corpus), every instance is used.
+        """
+
+        iteration_numbers = self.instance_iterations
+
+        if "FeatureCountPerLine" in self.lines_df.columns:
+
+            feature_counts = pd.to_numeric(self.lines_df["FeatureCountPerLine"]).to_numpy(dtype=float)[self.instance_lines]
+            instances_per_line = np.bincount(self.instance_lines, minlength=len(self.lines_df))
+
+            #with one feature in the line, the notebook writes each match over the one before, so the last match is kept
+            is_last_match = self.instance_iterations == instances_per_line[self.instance_lines]
+
+            selected = (feature_counts > 1) | ((feature_counts == 1) & is_last_match)
+            iteration_numbers = np.where(feature_counts == 1, 1, self.instance_iterations)
+
+        else:
+            selected = np.ones(len(self), dtype=bool)
+
+        instance_numbers = np.flatnonzero(selected)
+
+        sort_df = pd.DataFrame({column: self.lines_df[column].to_numpy()[self.instance_lines[instance_numbers]]
+                                for column in ["File", "Line"] if column in self.lines_df.columns})
+        sort_df["IterationNumber"] = iteration_numbers[instance_numbers]
+
+        return instance_numbers[sort_df.sort_values(list(sort_df.columns), kind="stable").index.to_numpy()]
+
+
+    def _get_split_content_chunk(self, instance_numbers, before_width, after_width):
+        """Takes an array of instance numbers and the number of L and R columns. Returns their wide split content dataframe."""
+
+        chunk_df = self.lines_df.iloc[self.instance_lines[instance_numbers]].reset_index(drop=True)
+
+        for column_name in ANNOTATION_COLUMNS:
+            chunk_df[column_name] = np.nan
+
+        before_cells = np.full((len(instance_numbers), before_width), None, dtype=object)
+        after_cells = np.full((len(instance_numbers), after_width), None, dtype=object)
+        features = []
+
+        for row_number, instance_number in enumerate(instance_numbers.tolist()):
+
+            before, feature, after = self.get_context(instance_number)
+
+            #the words before the feature are aligned to the right, so L1 is always the word right before it
+            before_cells[row_number, before_width - len(before):] = before
+            after_cells[row_number, :len(after)] = after
+            features.append(feature)
+
+        return pd.concat([chunk_df,
+                          pd.DataFrame(before_cells, columns=[f"L{number}" for number in range(before_width, 0, -1)]),
+                          pd.Series(features, name="ContentFeature", dtype=object),
+                          pd.DataFrame(after_cells, columns=[f"R{number}" for number in range(1, after_width + 1)])], axis=1)
+
+    def iter_split_content_dataframes(self, chunk_size=10000):
+        """
+        Yields the notebook's split content dataframe chunk_size rows at a time. Every chunk has the same
+        columns, with as many L and R columns as the longest context of all of the rows.
+        """
+
+        instance_numbers = self.select_split_content_instances()
+
+        before_lengths, after_lengths = self.get_context_lengths(instance_numbers)
+        before_width = int(before_lengths.max()) if len(instance_numbers) else 0
+        after_width = int(after_lengths.max()) if len(instance_numbers) else 0
+
+        for start in range(0, len(instance_numbers), chunk_size):
+            yield self._get_split_content_chunk(instance_numbers[start:start + chunk_size], before_width, after_width)
+
+    def has_no_features(self):
+        """Returns True when the notebook would return its empty dataframe: there are no lines, or no line has the feature."""
+
+        return (len(self.lines_df) == 0
+                or ("FeatureCountPerLine" in self.lines_df.columns and self.lines_df["FeatureCountPerLine"].max() == 0))
+
+    def get_split_content_dataframe(self):
+        """Returns the whole split content dataframe, the same as the notebook's create_split_content_dataframe."""
+
+        if self.has_no_features():
+            return pd.DataFrame(columns=EMPTY_SPLIT_CONTENT_COLUMNS)
+
+        chunk_dfs = list(self.iter_split_content_dataframes())
+
+        if not chunk_dfs:
+            return pd.DataFrame(columns=list(self.lines_df.columns) + ANNOTATION_COLUMNS + ["ContentFeature"])
+
+        return pd.concat(chunk_dfs, ignore_index=True)
+
+    def export_split_content_csv(self, csv_path, chunk_size=10000):
+        """Writes the split content dataframe to csv_path, chunk_size rows at a time. Returns the number of rows written."""
+
+        if self.has_no_features():
+            pd.DataFrame(columns=EMPTY_SPLIT_CONTENT_COLUMNS).to_csv(csv_path, index=False)
+            return 0
+
+        row_count = 0
+
+        for chunk_df in self.iter_split_content_dataframes(chunk_size):
+            chunk_df.to_csv(csv_path, index=False, mode="w" if row_count == 0 else "a", header=row_count == 0)
+            row_count += len(chunk_df)
+
+        if row_count == 0:
+            pd.DataFrame(columns=list(self.lines_df.columns) + ANNOTATION_COLUMNS + ["ContentFeature"]).to_csv(csv_path, index=False)
+
+        return row_count
+
+
+#####################################################################################################
+############################### SECTION 3: THE NOTEBOOK FUNCTION ####################################
+#####################################################################################################
+
+def create_split_content_dataframe(csv_input_path, search_word_string):
+    """Takes a gold standard CSV and the search word, and returns the same dataframe as the notebook's function."""
+
+    return build_token_table(pd.read_csv(csv_input_path), search_word_string).get_split_content_dataframe()
+
+
+## Designate the input path where the gold standard CSVs are stored and the output path for the split content CSVs
+# csv_input_path = "path"
+# csv_output_path = "path"
+
+##this will create the split content CSVs for the three features. the file names are the same as the notebook's
+# import os
+# for filename_start, search_word_string in [("aint", "ain't"), ("be", "be"), ("done", "done")]:
+#     csv_filenames = [file for file in os.listdir(csv_input_path)
+#                      if file.endswith(".csv") and file.startswith(filename_start) and "info" not in file]
+#     for filename in csv_filenames:
+#         stripped_filename = "_".join(filename.split("_")[:2])
+#         token_table = build_token_table(pd.read_csv(f"{csv_input_path}/{filename}"), search_word_string)
+#         token_table.export_split_content_csv(f"{csv_output_path}{stripped_filename}_splitContent.csv")
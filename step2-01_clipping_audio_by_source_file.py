@@ -0,0 +1,206 @@
+"""
+This is a faster version of the audio parsing loops in the step 2.1 notebook.
+
+The notebook creates a new parselmouth.Sound for every row of the gold standard CSV, so a CORAAL
+interview with dozens of feature utterances is read from disk and decoded dozens of times.
+The code here does the following instead:
+    (1) groups the rows by File so each source recording is only opened once
+    (2) memory-maps the recording and slices each utterance's samples straight out of it
+        without decoding them (the clips are 16-bit PCM, the same as the source)
+    (3) writes the clips of different source recordings at the same time in a pool of threads
+
+The clips contain the same samples that Praat's extract_part (with preserve_times=False and the
+default rectangular window) would give, including the zeros it pads an utterance with where it runs
+past the start or end of the recording, and they keep the notebook's filenames:
+    16khz_{File}_Line{Line}_FeatCount{FeatureCountPerLine}.wav
+"""
+
+import math
+import mmap
+import struct
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#####################################################################################################
+############################### SECTION 1: READING THE SOURCE RECORDING #############################
+#####################################################################################################
+
+def read_wav_header(wav_file):
+    """
+    Takes an open binary wav file and returns a tuple of
+    (number of channels, sample rate, sample width in bytes, data offset, data length in bytes).
+    Only 16-bit PCM wav files are accepted, which is what the sox command in the step 2.1 notebook produces.
+    """
+
+    riff, _, wave_id = struct.unpack("<4sI4s", wav_file.read(12))
+
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        raise Exception(f"{wav_file.name} is not a wav file.")
+
+    fmt = None
+
+    #loops through the chunks in the file until it finds the 'data' chunk
+    while True:
+
+        chunk_header = wav_file.read(8)
+
+        if len(chunk_header) < 8:
+            raise Exception(f"{wav_file.name} does not have a data chunk.")
+
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", wav_file.read(16))
+            wav_file.seek(chunk_size - 16 + (chunk_size % 2), 1)
+
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise Exception(f"{wav_file.name} does not have a fmt chunk before its data chunk.")
+
+            format_tag, n_channels, sample_rate, _, _, bits_per_sample = fmt
+
+            #1 is PCM and 0xFFFE is WAVE_FORMAT_EXTENSIBLE
+            if format_tag not in (1, 0xFFFE) or bits_per_sample != 16:
+                raise Exception(f"{wav_file.name} is not 16-bit PCM. Convert it with sox as described in the step 2.1 notebook.")
+
+            return n_channels, sample_rate, 2, wav_file.tell(), chunk_size
+
+        else:
+            #chunks are padded to an even number of bytes
+            wav_file.seek(chunk_size + (chunk_size % 2), 1)
+
+
+def get_window_samples(from_time, to_time, sample_rate):
+    """
+    Takes an utterance start and end time in seconds and the sample rate. Returns the zero-based
+    (start, stop) frames of the samples whose centers lie between the two times, which is how Praat's
+    extract_part chooses its samples. The window is not cut to the length of the recording, since
+    extract_part takes the samples outside the recording to be zero. Returns None if there are no samples.
+    """
+
+    #Praat puts the center of the first sample half a sample after 0 seconds
+    dx = 1.0 / sample_rate
+    x1 = 0.5 * dx
+
+    ix_min = 1 + math.ceil((from_time - x1) / dx)
+    ix_max = 1 + math.floor((to_time - x1) / dx)
+
+    if ix_min > ix_max:
+        return None
+
+    return ix_min - 1, ix_max
+
+
+#####################################################################################################
+############################### SECTION 2: CLIPPING #################################################
+#####################################################################################################
+
+def clip_source_file(sound_filepath, clips, audio_output_path):
+    """
+    Takes the filepath of a source recording and a list of (output filename, start time, end time)
+    tuples. Opens the recording once and writes every clip to the output path.
+    Returns the number of clips written.
+    """
+
+    with open(sound_filepath, "rb") as wav_file:
+
+        n_channels, sample_rate, sample_width, data_offset, data_length = read_wav_header(wav_file)
+
+        frame_width = n_channels * sample_width
+        n_frames = data_length // frame_width
+
+        #maps the recording into memory. Nothing is read from disk until a clip's samples are written
+        with mmap.mmap(wav_file.fileno(), 0, access=mmap.ACCESS_READ) as sound_map:
+
+            samples = memoryview(sound_map)[data_offset:data_offset + n_frames * frame_width]
+
+            try:
+                for clip_filename, utt_start_time, utt_end_time in clips:
+
+                    window = get_window_samples(utt_start_time, utt_end_time, sample_rate)
+
+                    if window is None:
+                        raise Exception(f"The clip {clip_filename} would contain no samples.")
+
+                    start_frame, stop_frame = window
+
+                    #the part of the window that is inside the recording
+                    inside_start = max(start_frame, 0)
+                    inside_stop = min(stop_frame, n_frames)
+
+                    #saves the section as a wav file, with silence for the part of the window
+                    # before the start or after the end of the recording, the same as extract_part.
+                    # a window that is completely outside of the recording is all silence
+                    with wave.open(f"{audio_output_path}{clip_filename}", "wb") as clip:
+                        clip.setnchannels(n_channels)
+                        clip.setsampwidth(sample_width)
+                        clip.setframerate(sample_rate)
+
+                        if inside_start >= inside_stop:
+                            clip.writeframes(bytes((stop_frame - start_frame) * frame_width))
+                        else:
+                            clip.writeframes(bytes(max(0, inside_start - start_frame) * frame_width))
+                            clip.writeframes(samples[inside_start * frame_width:inside_stop * frame_width])
+                            clip.writeframes(bytes(max(0, stop_frame - inside_stop) * frame_width))
+
+            #the memoryview has to be released before the map can be closed
+            finally:
+                samples.release()
+
+    return len(clips)
+
+
+@profiled("2.1")
+def clip_feature_audio(feature_instances_df, audio_input_path, audio_output_path, max_workers=None):
+    """
+    Takes a gold standard dataframe, the input path where the full (16khz) audio files are stored,
+    the output path where the clips will be stored, and the number of threads to use
+    (defaults to the Python default). Writes a clip of every row's utterance and returns the number
+    of clips written. Each source recording is only opened once.
+    """
+
+    #groups the rows by their source recording
+    # the filenames are made from itertuples values so they are the same as the notebook's
+    clips_by_file = {}
+
+    for row in feature_instances_df.itertuples():
+
+        #stores the file ID of the audio file (string type)
+        sound_filename = f"16khz_{row.File}.wav"
+
+        clips_by_file.setdefault(sound_filename, []).append(
+            (f"{sound_filename[:-4]}_Line{row.Line}_FeatCount{row.FeatureCountPerLine}.wav",
+             row.UttStartTime, row.UttEndTime))
+
+    #writes the clips of different source recordings at the same time
+    # threads are enough since the work is reading and writing files
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        clip_counts = executor.map(lambda file_clips: clip_source_file(f"{audio_input_path}{file_clips[0]}", file_clips[1], audio_output_path),
+                                   clips_by_file.items())
+
+        return sum(clip_counts)
+
+
+## Designate the input path where the gold standard CSVs are stored
+# csv_input_path = "path"
+
+## Designate the input path where the full audio files are stored
+# audio_input_path = "path"
+
+##this will produce the sound clips for all three features
+## the output paths must already exist and end with the proper slash
+# import pandas as pd
+# for csv_filename, audio_output_path in [("aint_variations_coraal_instances_GoldStandard.csv", "path"),
+#                                         ("be_coraal_instances_GoldStandard.csv", "path"),
+#                                         ("done_coraal_instances_GoldStandard.csv", "path")]:
+#     feature_instances_df = pd.read_csv(f"{csv_input_path}{csv_filename}")
+#     clip_feature_audio(feature_instances_df, audio_input_path, audio_output_path)
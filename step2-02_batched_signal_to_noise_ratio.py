@@ -0,0 +1,287 @@
+"""
+This is a faster version of both options in the step 2.2 notebook.
+
+Option 1 (wada_snr by John Meade) is computed for many clips at once with numpy instead of one clip at a time,
+and the g_vals/db_vals lookup table is only built once when this file is imported.
+
+Option 2 (snreval by Rémi Rigal) takes around 4 seconds to start the MATLAB runtime and ~0.1 seconds per file,
+so the notebook's get_Rigal_df spends almost all of its time starting the runtime over and over again for every row.
+The code here gives snreval a list of clips at a time instead, and runs several of these lists at once in a pool
+of threads that is set up once (the work itself happens in the snreval processes). A list that takes too long is
+killed with snreval's own timeout, which kills the whole MATLAB process, and the clips it did not finish are put
+in a retry queue in smaller lists with longer timeouts. Clips that still fail are reported rather than silently
+left as NaN.
+
+See the step 2.2 notebook for the references and installation directions for both options.
+"""
+
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import soundfile as sf
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#####################################################################################################
+############################### SECTION 1: OPTION 1, WADA SNR #######################################
+#####################################################################################################
+
+# next 2 lines define a fancy curve derived from a gamma distribution -- see paper
+DB_VALS = np.arange(-20, 101)
+
+G_VALS = np.array([0.40974774, 0.40986926, 0.40998566, 0.40969089, 0.40986186, 0.40999006, 0.41027138, 0.41052627, 0.41101024, 0.41143264, 0.41231718, 0.41337272, 0.41526426, 0.4178192 , 0.42077252, 0.42452799, 0.42918886, 0.43510373, 0.44234195, 0.45161485, 0.46221153, 0.47491647, 0.48883809, 0.50509236, 0.52353709, 0.54372088, 0.56532427, 0.58847532, 0.61346212, 0.63954496, 0.66750818, 0.69583724, 0.72454762, 0.75414799, 0.78323148, 0.81240985, 0.84219775, 0.87166406, 0.90030504, 0.92880418, 0.95655449, 0.9835349 , 1.01047155, 1.0362095 , 1.06136425, 1.08579312, 1.1094819 , 1.13277995, 1.15472826, 1.17627308, 1.19703503, 1.21671694, 1.23535898, 1.25364313, 1.27103891, 1.28718029, 1.30302865, 1.31839527, 1.33294817, 1.34700935, 1.3605727 , 1.37345513, 1.38577122, 1.39733504, 1.40856397, 1.41959619, 1.42983624, 1.43958467, 1.44902176, 1.45804831, 1.46669568, 1.47486938, 1.48269965, 1.49034339, 1.49748214, 1.50435106, 1.51076426, 1.51698915, 1.5229097 , 1.528578  , 1.53389835, 1.5391211 , 1.5439065 , 1.54858517, 1.55310776, 1.55744391, 1.56164927, 1.56566348, 1.56938671, 1.57307767, 1.57654764, 1.57980083, 1.58304129, 1.58602496, 1.58880681, 1.59162477, 1.5941969 , 1.59693155, 1.599446  , 1.60185011, 1.60408668, 1.60627134, 1.60826199, 1.61004547, 1.61192472, 1.61369656, 1.61534074, 1.61688905, 1.61838916, 1.61985374, 1.62135878, 1.62268119, 1.62390423, 1.62513143, 1.62632463, 1.6274027 , 1.62842767, 1.62945532, 1.6303307 , 1.63128026, 1.63204102])
+
+EPS = 1e-10
+
+
+def wada_snr_batch(wavs):
+    # Direct blind estimation of the SNR of a speech signal.
+    #
+    # Paper on WADA SNR:
+    #   http://www.cs.cmu.edu/~robust/Papers/KimSternIS08.pdf
+    #
+    # This function was adapted from John Meade's wada_snr in the step 2.2 notebook
+    # (MIT license, John Meade, 2020)
+
+    """
+    Takes a list of numpy arrays (one per clip) and returns a numpy array of their WADA SNRs.
+    The results are the same as calling the step 2.2 notebook's wada_snr on each clip
+    (up to floating point rounding). All of the clips are processed together.
+    Stereo (frames x channels) clips are mixed down to mono first.
+    """
+
+    if len(wavs) == 0:
+        return np.array([], dtype=float)
+
+    # sf.read returns a frames x channels array for stereo clips, which are mixed down to mono
+    wavs = [np.asarray(wav, dtype=float) for wav in wavs]
+    wavs = [wav.mean(axis=1) if wav.ndim == 2 else np.ravel(wav) for wav in wavs]
+
+    lengths = np.array([len(wav) for wav in wavs])
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # puts every clip into one long array so the statistics can be computed
+    # for all of them at once with np.*.reduceat
+    abs_wavs = np.abs(np.concatenate(wavs))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        # peak normalize, get magnitude, clip lower bound
+        peaks = np.maximum.reduceat(abs_wavs, offsets)
+        abs_wavs /= np.repeat(peaks, lengths)
+        abs_wavs[abs_wavs < EPS] = EPS
+
+        # calcuate statistics
+        # E[|z|]
+        v1 = np.maximum(EPS, np.add.reduceat(abs_wavs, offsets) / lengths)
+
+        # E[log|z|]
+        v2 = np.add.reduceat(np.log(abs_wavs), offsets) / lengths
+
+        # log(E[|z|]) - E[log(|z|)]
+        v3 = np.log(v1) - v2
+
+        # table interpolation
+        # the curve is not strictly increasing at the start, so this finds the last index
+        # where g_vals < v3 (as the notebook does) rather than using a binary search
+        below = G_VALS[np.newaxis, :] < v3[:, np.newaxis]
+        has_idx = below.any(axis=1)
+        wav_snr_idx = len(G_VALS) - 1 - np.argmax(below[:, ::-1], axis=1)
+
+        # handle edge cases or interpolate
+        next_idx = np.minimum(wav_snr_idx + 1, len(G_VALS) - 1)
+        interpolated = DB_VALS[wav_snr_idx] + \
+            (v3 - G_VALS[wav_snr_idx]) / (G_VALS[next_idx] - G_VALS[wav_snr_idx]) * (DB_VALS[next_idx] - DB_VALS[wav_snr_idx])
+
+        wav_snr = np.where(~has_idx, DB_VALS[0],
+                           np.where(wav_snr_idx == len(DB_VALS) - 1, DB_VALS[-1], interpolated))
+
+        # Calculate SNR
+        # clips that are only silence are NaN, the same as in the notebook
+        dEng = np.add.reduceat(abs_wavs**2, offsets)
+
+        dFactor = 10**(wav_snr / 10)
+
+        dNoiseEng = dEng / (1 + dFactor) # Noise energy
+
+        dSigEng = dEng * dFactor / (1 + dFactor) # Signal energy
+
+        return 10 * np.log10(dSigEng / dNoiseEng)
+
+
+def wada_snr(wav):
+    """
+    Reads in a numpy arrary and produces the WADA SNR
+    """
+
+    return float(wada_snr_batch([wav])[0])
+
+
+def get_clip_filepaths(gs_df, wav_path):
+    """Takes a gold standard dataframe and the path where its clips are stored and returns the clip filepaths in row order."""
+
+    return [f"{wav_path}/16khz_{file_row.File}_Line{file_row.Line}_FeatCount{file_row.FeatureCountPerLine}.wav"
+            for file_row in gs_df.itertuples()]
+
+
+@profiled("2.2")
+def add_wada_snr_column(gs_df, wav_path, batch_size=1000):
+    """
+    Takes a gold standard dataframe and the path where its clips are stored.
+    Adds the WadaSNRMeade column, computing the SNR of batch_size clips at a time,
+    and returns the dataframe.
+    """
+
+    clip_filepaths = get_clip_filepaths(gs_df, wav_path)
+
+    wada_snrs = []
+
+    for batch_start in range(0, len(clip_filepaths), batch_size):
+
+        #this will convert the .wav audio files to numpy arrays
+        wavs = [sf.read(clip_filepath)[0] for clip_filepath in clip_filepaths[batch_start:batch_start + batch_size]]
+
+        wada_snrs.extend(wada_snr_batch(wavs))
+
+    gs_df["WadaSNRMeade"] = np.array(wada_snrs, dtype=float)
+
+    return gs_df
+
+
+#####################################################################################################
+############################### SECTION 2: OPTION 2, SNREVAL ########################################
+#####################################################################################################
+
+def eval_clip_list(snr_eval, clip_filepaths, timeout):
+    """
+    Takes an SNREval object, a list of clip filepaths and a timeout in seconds.
+    Runs snreval once on all of the clips and returns a dictionary of clip filepath: (WADA SNR, NIST STNR)
+    for the clips it finished. If the timeout runs out, snreval kills the MATLAB process and the
+    clips it did not get to are left out of the dictionary.
+    """
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        list_file.write("\n".join(clip_filepaths) + "\n")
+
+    try:
+        snr_df = snr_eval.eval(list_file.name, timeout=timeout)
+    finally:
+        os.remove(list_file.name)
+
+    #snreval reports the clips by filepath. the basenames are used to match them up
+    # since the clip filenames are unique
+    results_by_basename = {os.path.basename(row.file): (float(row.SNR), float(row.STNR)) for row in snr_df.itertuples()}
+
+    return {clip_filepath: results_by_basename[os.path.basename(clip_filepath)]
+            for clip_filepath in clip_filepaths if os.path.basename(clip_filepath) in results_by_basename}
+
+
+def get_rigal_snrs(clip_filepaths, snreval_path, batch_size=50, max_workers=4, timeout=10, timeout_per_clip=1, max_retries=2):
+    """
+    Takes a list of clip filepaths and the path to the unzipped snreval_MACI64 folder.
+    Returns (1) a dictionary of clip filepath: (WADA SNR, NIST STNR) and (2) a list of the clips that failed.
+
+    The clips are given to snreval batch_size at a time in max_workers threads.
+    Each list has a timeout of timeout + timeout_per_clip seconds for every clip after the first
+    (the notebook used 10 seconds for one clip). When a list does not finish, the clips that are missing are
+    put back in the queue in two halves, and a single clip that does not finish is retried with twice the
+    timeout up to max_retries times before it is reported as failed.
+    """
+
+    #the following assumes you have installed snreval as laid out in the step 2.2 notebook
+    from snreval import SNREval
+
+    #this will create the SNREval object once for every thread to use
+    snr_eval = SNREval(f"{snreval_path}")
+
+    #the queue holds tuples of (list of clip filepaths, retry number)
+    retry_queue = deque((clip_filepaths[batch_start:batch_start + batch_size], 0)
+                        for batch_start in range(0, len(clip_filepaths), batch_size))
+
+    rigal_snrs = {}
+    failed_clips = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        running = {}
+
+        while retry_queue or running:
+
+            #keeps every thread busy
+            while retry_queue and len(running) < max_workers:
+                batch, retry_number = retry_queue.popleft()
+                batch_timeout = (timeout + timeout_per_clip * (len(batch) - 1)) * 2**retry_number
+                running[executor.submit(eval_clip_list, snr_eval, batch, batch_timeout)] = (batch, retry_number)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                batch, retry_number = running.pop(future)
+
+                try:
+                    batch_snrs = future.result()
+                except Exception as error:
+                    print(f"snreval failed on a list of {len(batch)} clips: {error}")
+                    batch_snrs = {}
+
+                rigal_snrs.update(batch_snrs)
+
+                missing = [clip_filepath for clip_filepath in batch if clip_filepath not in batch_snrs]
+
+                #splits the unfinished clips in half so the one that got stuck is separated from the rest
+                if len(missing) > 1:
+                    half = len(missing) // 2
+                    retry_queue.append((missing[:half], retry_number))
+                    retry_queue.append((missing[half:], retry_number))
+
+                elif len(missing) == 1 and retry_number < max_retries:
+                    retry_queue.append((missing, retry_number + 1))
+
+                elif len(missing) == 1:
+                    #prints a flag in case you want to see exactly where things are getting stuck
+                    print(f"{missing[0]} got stuck {max_retries + 1} times and has been skipped.")
+                    failed_clips.extend(missing)
+
+    return rigal_snrs, failed_clips
+
+
+@profiled("2.2")
+def get_Rigal_df(gs_df, wav_path, snreval_path, **kwargs):
+    """
+    Takes a gold standard dataframe, the path where its clips are stored and the path to the unzipped
+    snreval_MACI64 folder. Adds the WadaSNRRigal and NistSNRRigal columns and returns the dataframe and
+    a list of the rows (File, Line) that failed. The keyword arguments are passed on to get_rigal_snrs.
+    """
+
+    clip_filepaths = get_clip_filepaths(gs_df, wav_path)
+
+    rigal_snrs, failed_clips = get_rigal_snrs(clip_filepaths, snreval_path, **kwargs)
+
+    gs_df["WadaSNRRigal"] = [rigal_snrs.get(clip_filepath, (np.nan, np.nan))[0] for clip_filepath in clip_filepaths]
+    gs_df["NistSNRRigal"] = [rigal_snrs.get(clip_filepath, (np.nan, np.nan))[1] for clip_filepath in clip_filepaths]
+
+    failed_clips = set(failed_clips)
+    failed_rows = [(file_row.File, file_row.Line) for file_row, clip_filepath in zip(gs_df.itertuples(), clip_filepaths)
+                   if clip_filepath in failed_clips]
+
+    return gs_df, failed_rows
+
+
+##this is the path to the unzipped snreval_MACI64 folder
+# snreval_path = "path"
+
+##this will add all three SNR columns to the gold standard dataframes from the step 2.2 notebook's initial set-up
+# for gs_df, wav_path in [(aint_gs_df, aint_wav_path), (be_gs_df, be_wav_path), (done_gs_df, done_wav_path)]:
+#     add_wada_snr_column(gs_df, wav_path)
+#     gs_df, failed_rows = get_Rigal_df(gs_df, wav_path, snreval_path)
+#     print(f"{len(failed_rows)} clips failed: {failed_rows}")
@@ -0,0 +1,253 @@
+"""
+This is a faster version of the speech rate code in the step 2.3 notebook.
+
+The notebook reads and sorts the whole pronunciation dictionary every time it runs, and getSyllCount
+rebuilds the vowel list and looks through the phonemes of every word of every row.
+The code here does the following instead:
+    (1) compiles the dictionary once into an index file that stores each word with its syllable count
+        (the number of vowel phonemes in its first pronunciation, the same one the notebook uses)
+    (2) looks up the words of a whole column at once with numpy
+    (3) reports the words that are not in the dictionary, which the notebook silently counts as zero syllables
+
+The index file is a numpy .npz file with a sorted array of words and an array of syllable counts.
+It is rebuilt automatically when the dictionary file is newer than it.
+"""
+
+import os
+import re
+from string import punctuation
+
+import numpy as np
+import pandas as pd
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+# the vowel phonemes from the ARPABET system (which the pronunciation dict of MFA is based on)
+# see here: http://www.speech.cs.cmu.edu/cgi-bin/cmudict
+# the numbers are for stress. number of vowels = number of syllables
+VOWEL_PHONEMES = frozenset(f"{v}{n}" for v in ['AA', 'AE', 'AH', 'AO', 'AW', 'AY', 'EH', 'ER', 'EY', 'IH', 'IY', 'OW', 'OY', 'UH', 'UW']
+                           for n in [0, 1, 2])
+
+# for some reason, 'be' is messed up in the dictionary, so the notebook fixes it by hand
+PRONUNCIATION_FIXES = {'BE': ['B', 'EY1']}
+
+
+#####################################################################################################
+############################### SECTION 1: COMPILING THE DICTIONARY #################################
+#####################################################################################################
+
+def read_pronunciation_dictionary(dictionary_path):
+    """
+    Takes the path of the pronunciation dictionary text file. Returns a dictionary of
+    {word: list of phonemes} with the first pronunciation of each word after the lines are sorted,
+    the same as pronunciationDict in the step 2.3 notebook.
+    """
+
+    with open(dictionary_path, "r") as i:
+        dict_lines = [re.sub(r"\t", " ", x) for x in i.readlines()]
+
+    pronunciationDict = {}
+
+    for line in sorted(dict_lines):
+
+        # the first space divides the word and its phonemes
+        space_index = line.find(" ")
+
+        word = line[:space_index]
+
+        # only the first pronunciation is kept for words with multiple entries
+        if word not in pronunciationDict:
+            pronunciationDict[word] = line[space_index:].strip().split()
+
+    pronunciationDict.update(PRONUNCIATION_FIXES)
+
+    return pronunciationDict
+
+
+def count_syllables(phonemes):
+    """
+    Takes a list of phonemes and returns the number of vowels in it.
+    """
+
+    return sum(phon in VOWEL_PHONEMES for phon in phonemes)
+
+
+class PronunciationIndex:
+    """
+    A sorted array of the dictionary's words, encoded as UTF-8, with the syllable count of each word.
+    """
+
+    def __init__(self, words, syllable_counts):
+
+        self.words = words
+        self.syllable_counts = syllable_counts
+
+    def __len__(self):
+
+        return len(self.words)
+
+    @classmethod
+    def from_dictionary(cls, dictionary_path):
+        """
+        Compiles the index from the pronunciation dictionary text file.
+        """
+
+        pronunciationDict = read_pronunciation_dictionary(dictionary_path)
+
+        words = np.array([word.encode("utf-8") for word in pronunciationDict])
+        syllable_counts = np.array([count_syllables(phonemes) for phonemes in pronunciationDict.values()], dtype=np.uint8)
+
+        #the words are sorted by their bytes so they can be found with a binary search
+        order = np.argsort(words, kind="stable")
+
+        return cls(words[order], syllable_counts[order])
+
+    def save(self, index_path):
+        """
+        Saves the index to an uncompressed .npz file.
+        """
+
+        #np.savez adds .npz to the filename if it is missing, so the file is opened here instead
+        with open(index_path, "wb") as index_file:
+            np.savez(index_file, words=self.words, syllable_counts=self.syllable_counts)
+
+    @classmethod
+    def load(cls, index_path):
+        """
+        Loads an index saved with save().
+        """
+
+        with np.load(index_path, allow_pickle=False) as index_file:
+            return cls(index_file["words"], index_file["syllable_counts"])
+
+    def lookup(self, words):
+        """
+        Takes a list of words already stripped and uppercased. Returns (syllable counts, found),
+        where found marks the words that are in the dictionary and the counts of the others are 0.
+        """
+
+        if len(words) == 0 or len(self.words) == 0:
+            return np.zeros(len(words), dtype=np.int64), np.zeros(len(words), dtype=bool)
+
+        encoded_words = np.array([word.encode("utf-8") for word in words])
+
+        positions = np.searchsorted(self.words, encoded_words)
+        positions[positions == len(self.words)] = 0
+
+        found = self.words[positions] == encoded_words
+
+        return np.where(found, self.syllable_counts[positions], 0).astype(np.int64), found
+
+
+def load_pronunciation_index(index_path, dictionary_path=None):
+    """
+    Takes the path of the index file and, optionally, of the pronunciation dictionary text file.
+    Loads the index, compiling and saving it first if it does not exist or is older than the dictionary.
+    """
+
+    if dictionary_path is not None:
+
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(dictionary_path):
+
+            index = PronunciationIndex.from_dictionary(dictionary_path)
+            index.save(index_path)
+
+            return index
+
+    return PronunciationIndex.load(index_path)
+
+
+#####################################################################################################
+############################### SECTION 2: COUNTING SYLLABLES #######################################
+#####################################################################################################
+
+def get_syllable_counts(contents, index):
+    """
+    Takes an iterable of utterance contents and a PronunciationIndex.
+    Returns (syllable counts, OOV dataframe). The counts are the same as getSyllCount in the step 2.3
+    notebook, a float array with NaN where the content is not a string. The OOV dataframe has one row
+    per word that is not in the dictionary, with the number of times it occurs and the number of
+    utterances it occurs in, most frequent first.
+    """
+
+    contents = list(contents)
+
+    #splits every utterance into one flat list of words, keeping where each utterance starts
+    words = []
+    row_lengths = np.zeros(len(contents), dtype=np.int64)
+    is_string = np.zeros(len(contents), dtype=bool)
+
+    for row_number, content in enumerate(contents):
+
+        if type(content) == str:
+
+            row_words = [word.strip(punctuation).upper() for word in content.split()]
+
+            words.extend(row_words)
+            row_lengths[row_number] = len(row_words)
+            is_string[row_number] = True
+
+    word_counts, found = index.lookup(words)
+
+    #sums the syllables of each utterance
+    row_ends = np.cumsum(row_lengths)
+    word_count_sums = np.concatenate(([0], np.cumsum(word_counts)))
+
+    syllable_counts = (word_count_sums[row_ends] - word_count_sums[row_ends - row_lengths]).astype(float)
+    syllable_counts[~is_string] = np.nan
+
+    #words that are only punctuation strip down to empty strings, so they are not reported
+    oov_df = pd.DataFrame({"Word": words,
+                           "RowNumber": np.repeat(np.arange(len(contents)), row_lengths)})
+
+    oov_df = oov_df[~found & (oov_df["Word"] != "")]
+
+    oov_df = (oov_df.groupby("Word")
+              .agg(Occurrences=("RowNumber", "size"), Utterances=("RowNumber", "nunique"))
+              .sort_values(by=["Occurrences", "Word"], ascending=[False, True])
+              .reset_index())
+
+    return syllable_counts, oov_df
+
+
+@profiled("2.3")
+def add_speech_rate_columns(gs_df, index, content_column="Content"):
+    """
+    Takes a gold standard dataframe and a PronunciationIndex, and adds the SyllableCount and
+    SpeechRate columns the same way as the step 2.3 notebook (the speech rate is the syllable count
+    divided by UttLength, and 0 when there are no syllables). Returns (gs_df, OOV dataframe).
+    """
+
+    syllable_counts, oov_df = get_syllable_counts(gs_df[content_column], index)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speech_rates = np.where(syllable_counts == 0, 0.0, syllable_counts / gs_df["UttLength"].to_numpy(dtype=float))
+
+    gs_df["SyllableCount"] = syllable_counts
+    gs_df["SpeechRate"] = speech_rates
+
+    return gs_df, oov_df
+
+
+## path to the pronunciation dictionary and to the compiled index, which is created the first time
+# dictionary_path = "path"
+# index_path = "path"
+
+## Designate the input path where the step 2.2 CSVs are stored and the output path for the step 2.3 CSVs
+# csv_input_path = "path"
+# csv_output_path = "path"
+
+##this will add the speech rate columns for all three features and print the words that are not in the dictionary
+# index = load_pronunciation_index(index_path, dictionary_path)
+# for feature_name in ["aint_variations", "be", "done"]:
+#     gs_df = pd.read_csv(f"{csv_input_path}{feature_name}_SNR.csv")
+#     gs_df, oov_df = add_speech_rate_columns(gs_df, index)
+#     print(feature_name, oov_df.head(20))
+#     gs_df = gs_df.sort_values(by=['File', 'Line'])
+#     gs_df.to_csv(f"{csv_output_path}{feature_name}_speechRate.csv", index=False)
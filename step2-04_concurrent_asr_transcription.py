@@ -0,0 +1,436 @@
+"""
+This is a concurrent and resumable version of the transcription loops in the step 2.4 notebook.
+
+The notebook sends one clip at a time to each ASR service and waits for it to finish, so most of the hours
+it takes to fill the transcription columns are spent waiting. The code here does the following instead:
+    (1) sends many clips to every service at the same time with asyncio, with a limit on how many
+        requests each service gets at once and how many it gets per second
+    (2) saves every transcription to a cache file on disk as soon as it comes back. The cache is keyed by
+        a hash of the audio and the service's name, so if a run crashes, running it again only sends the
+        clips that are missing and nothing is paid for twice
+    (3) defines each service as a backend with the same interface, including a mock backend which
+        works offline for testing
+
+The backends call the services in the same way as the notebook and fill the same columns.
+See the step 2.4 notebook for how to set up each service.
+
+In a notebook, the event loop is already running, so await the function directly:
+    asr = importlib.import_module("step2-04_concurrent_asr_transcription")
+    be_gs_df, failed_rows = await asr.transcribe_dataframe(be_gs_df, be_audio_file_path, backends, "be_ASRcache.jsonl")
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import urllib.request
+
+import numpy as np
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#####################################################################################################
+############################### SECTION 1: RESULT CACHE AND RATE LIMITING ###########################
+#####################################################################################################
+
+def get_audio_hash(audio_path):
+    """Takes the path to an audio file and returns the sha256 hash of its contents."""
+
+    with open(audio_path, "rb") as audio_file:
+        return hashlib.sha256(audio_file.read()).hexdigest()
+
+
+class TranscriptionCache:
+    """
+    An on-disk cache of transcriptions keyed by audio hash and backend name.
+    Each result is appended to the cache file as one line of json as soon as it is saved,
+    so the results of a run that crashes are kept. A last line that was only partly written is skipped.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.results = {}
+
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as cache_file:
+                for line in cache_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[(entry["audio_hash"], entry["backend"])] = (entry["transcription"], entry["confidence"])
+
+    def get(self, audio_hash, backend_name):
+        return self.results.get((audio_hash, backend_name))
+
+    def put(self, audio_hash, backend_name, transcription, confidence):
+        self.results[(audio_hash, backend_name)] = (transcription, confidence)
+
+        with open(self.cache_path, "a", encoding="utf-8") as cache_file:
+            cache_file.write(json.dumps({"audio_hash": audio_hash, "backend": backend_name,
+                                         "transcription": transcription, "confidence": confidence}) + "\n")
+
+
+class RateLimiter:
+    """Spaces out the requests to a service so it gets no more than requests_per_second."""
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_time = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+
+        async with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+
+#####################################################################################################
+############################### SECTION 2: BACKENDS #################################################
+#####################################################################################################
+
+def pick_most_confident(results):
+    """
+    Takes a list of (transcript, confidence) results and returns the one with the highest confidence,
+    the same way the notebook does for Google and IBM Watson. Returns ("", 0) if there are no results.
+    """
+
+    if len(results) == 0:
+        return "", 0
+
+    #takes the maximum of (confidence, index) tuples, so ties go to the later result as in the notebook
+    _, best_index = max((confidence, index) for index, (_, confidence) in enumerate(results))
+
+    return results[best_index]
+
+
+class TranscriptionBackend:
+    """
+    The interface every ASR service follows.
+    name is used for the cache, transcription_column and confidence_column are the dataframe columns
+    (confidence_column is None if the service doesn't give one), max_concurrency is how many clips can be
+    sent at once, and requests_per_second limits how fast they are sent.
+    """
+
+    name = None
+    transcription_column = None
+    confidence_column = None
+    max_concurrency = 4
+    requests_per_second = None
+
+    async def transcribe(self, audio_path, audio_filename):
+        """Takes the local path and filename of a clip and returns (transcription, confidence)."""
+        raise NotImplementedError
+
+
+class AmazonBackend(TranscriptionBackend):
+    """Amazon Transcribe. The clips must already be uploaded to the S3 bucket (see 1.0 in the notebook)."""
+
+    name = "amazon"
+    transcription_column = "amazon_transcription"
+    max_concurrency = 20
+    requests_per_second = 5
+
+    def __init__(self, transcribe, s3_bucket_path, poll_interval=5, max_poll_interval=30):
+        #transcribe is the boto3 client from 1.1 in the notebook
+        self.transcribe_client = transcribe
+        self.s3_bucket_path = s3_bucket_path
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    def delete_job_if_exists(self, job_name):
+        """
+        Deletes the transcription job if one with this name exists.
+        Unlike check_job_name in the notebook, this only looks up the one job instead of listing every job.
+        """
+
+        try:
+            self.transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
+        except self.transcribe_client.exceptions.BadRequestException:
+            return
+
+        self.transcribe_client.delete_transcription_job(TranscriptionJobName=job_name)
+
+    async def transcribe(self, audio_path, audio_filename):
+
+        job_name = (audio_filename.split('.')[0]).replace(" ", "")
+
+        await asyncio.to_thread(self.delete_job_if_exists, job_name)
+
+        await asyncio.to_thread(self.transcribe_client.start_transcription_job,
+                                TranscriptionJobName=job_name,
+                                Media={'MediaFileUri': self.s3_bucket_path + audio_filename},
+                                MediaFormat=audio_filename.split('.')[1],
+                                LanguageCode='en-US')
+
+        #checks the status of the job, waiting a little longer each time
+        # the other clips keep going while this one waits
+        poll_interval = self.poll_interval
+
+        while True:
+            result = await asyncio.to_thread(self.transcribe_client.get_transcription_job, TranscriptionJobName=job_name)
+
+            if result['TranscriptionJob']['TranscriptionJobStatus'] in ['COMPLETED', 'FAILED']:
+                break
+
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, self.max_poll_interval)
+
+        #if the result is failed rather than completed, returns an empty string
+        if result['TranscriptionJob']['TranscriptionJobStatus'] == 'FAILED':
+            return "", None
+
+        def get_transcript():
+            response = urllib.request.urlopen(result['TranscriptionJob']['Transcript']['TranscriptFileUri'])
+            return json.loads(response.read())['results']['transcripts'][0]['transcript']
+
+        return await asyncio.to_thread(get_transcript), None
+
+
+class DeepSpeechBackend(TranscriptionBackend):
+    """DeepSpeech, which runs locally. The clips must be 16khz (see step 2.1)."""
+
+    name = "deepspeech"
+    transcription_column = "deepspeech_transcription"
+    confidence_column = "deepspeech_ConfidenceLevel"
+    #the model is not shared between threads
+    max_concurrency = 1
+
+    def __init__(self, model_file_path="deepspeech-0.9.3-models.pbmm", lm_file_path="deepspeech-0.9.3-models.scorer"):
+        from deepspeech import Model
+
+        self.model = Model(model_file_path)
+        self.model.enableExternalScorer(lm_file_path)
+
+    def transcribe_clip(self, audio_path):
+        import wave
+
+        with wave.open(audio_path, 'rb') as w:
+            data16 = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+
+        return self.model.stt(data16), self.model.sttWithMetadata(data16).transcripts[0].confidence
+
+    async def transcribe(self, audio_path, audio_filename):
+        return await asyncio.to_thread(self.transcribe_clip, audio_path)
+
+
+class GoogleBackend(TranscriptionBackend):
+    """Google Cloud Speech-to-Text. The clips must already be uploaded to Google Cloud Storage (see 3.0 in the notebook)."""
+
+    name = "google"
+    transcription_column = "google_transcription"
+    confidence_column = "google_ConfidenceLevel"
+    max_concurrency = 10
+
+    def __init__(self, gcs_uri_path, credential_path):
+        from google.cloud import speech
+
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credential_path
+
+        self.speech = speech
+        self.gcs_uri_path = gcs_uri_path
+        #the client is created once instead of for every clip
+        self.client = speech.SpeechClient()
+
+    def transcribe_clip(self, audio_filename):
+        audio = self.speech.RecognitionAudio(uri=self.gcs_uri_path + audio_filename)
+
+        config = self.speech.RecognitionConfig(
+            encoding=self.speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            language_code="en-US",
+            enable_automatic_punctuation=True,
+        )
+
+        response = self.client.long_running_recognize(config=config, audio=audio).result(timeout=90)
+
+        return pick_most_confident([(result.alternatives[0].transcript, result.alternatives[0].confidence)
+                                    for result in response.results])
+
+    async def transcribe(self, audio_path, audio_filename):
+        return await asyncio.to_thread(self.transcribe_clip, audio_filename)
+
+
+class IBMWatsonBackend(TranscriptionBackend):
+    """IBM Watson Speech-to-Text. stt is the SpeechToTextV1 service from 4.1 in the notebook."""
+
+    name = "IBMWatson"
+    transcription_column = "IBMWatson_transcription"
+    confidence_column = "IBMWatson_ConfidenceLevel"
+    max_concurrency = 5
+
+    def __init__(self, stt):
+        self.stt = stt
+
+    def transcribe_clip(self, audio_path):
+        with open(audio_path, 'rb') as f:
+            res = self.stt.recognize(audio=f, content_type='audio/wav', model='en-US_NarrowbandModel', continuous=True).get_result()
+
+        return pick_most_confident([(result['alternatives'][0]['transcript'], result['alternatives'][0]['confidence'])
+                                    for result in res['results']])
+
+    async def transcribe(self, audio_path, audio_filename):
+        return await asyncio.to_thread(self.transcribe_clip, audio_path)
+
+
+class MicrosoftBackend(TranscriptionBackend):
+    """Microsoft Azure Cognitive Services Speech-to-Text."""
+
+    name = "microsoft"
+    transcription_column = "microsoft_transcription"
+    max_concurrency = 10
+
+    def __init__(self, speech_key, speech_location):
+        import azure.cognitiveservices.speech as speechsdk
+
+        self.speechsdk = speechsdk
+        #the speech configuration is created once instead of for every clip
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_location)
+
+    def transcribe_clip(self, audio_path):
+        audio_input = self.speechsdk.AudioConfig(filename=audio_path)
+        speech_recognizer = self.speechsdk.SpeechRecognizer(speech_config=self.speech_config, audio_config=audio_input)
+
+        return speech_recognizer.recognize_once_async().get().text, None
+
+    async def transcribe(self, audio_path, audio_filename):
+        return await asyncio.to_thread(self.transcribe_clip, audio_path)
+
+
+class MockBackend(TranscriptionBackend):
+    """
+    A stand-in service for testing offline. Returns the transcriptions given in a dictionary of
+    audio filename: transcription (or "" for clips not in it) with a confidence of 1 after a delay in seconds.
+    """
+
+    def __init__(self, transcriptions=None, delay=0, name="mock", transcription_column="mock_transcription",
+                 confidence_column="mock_ConfidenceLevel", max_concurrency=4):
+        self.transcriptions = transcriptions or {}
+        self.delay = delay
+        self.name = name
+        self.transcription_column = transcription_column
+        self.confidence_column = confidence_column
+        self.max_concurrency = max_concurrency
+
+    async def transcribe(self, audio_path, audio_filename):
+        await asyncio.sleep(self.delay)
+        return self.transcriptions.get(audio_filename, ""), 1
+
+
+#####################################################################################################
+############################### SECTION 3: SCHEDULER ################################################
+#####################################################################################################
+
+async def transcribe_dataframe(gs_df, audio_file_path, backends, cache_path, max_retries=3, retry_delay=5):
+    """
+    Takes a gold standard dataframe, the path where its clips are stored, a list of backends and the path
+    to the cache file. Transcribes every clip with every backend at the same time, within each backend's limits,
+    and skips the ones already in the cache. A clip that raises an error is retried max_retries times,
+    waiting retry_delay seconds (doubled each time) in between.
+    Returns the dataframe with each backend's columns filled in and a list of (File, Line, backend name)
+    for the clips that failed, which are left as NaN and not cached so the next run tries them again.
+    """
+
+    cache = TranscriptionCache(cache_path)
+
+    audio_filenames = [f"16khz_{file_row.File}_Line{file_row.Line}_FeatCount{file_row.FeatureCountPerLine}.wav"
+                       for file_row in gs_df.itertuples()]
+
+    #hashes each clip once for all of the backends
+    audio_hashes = await asyncio.gather(*[asyncio.to_thread(get_audio_hash, f"{audio_file_path}{audio_filename}")
+                                          for audio_filename in audio_filenames])
+
+    semaphores = {backend.name: asyncio.Semaphore(backend.max_concurrency) for backend in backends}
+    rate_limiters = {backend.name: RateLimiter(backend.requests_per_second) for backend in backends}
+
+    async def transcribe_clip(backend, audio_filename, audio_hash):
+
+        cached = cache.get(audio_hash, backend.name)
+
+        if cached is not None:
+            return cached
+
+        async with semaphores[backend.name]:
+
+            for retry_number in range(max_retries + 1):
+
+                await rate_limiters[backend.name].wait()
+
+                try:
+                    transcription, confidence = await backend.transcribe(f"{audio_file_path}{audio_filename}", audio_filename)
+                    break
+
+                except Exception as error:
+                    if retry_number == max_retries:
+                        print(f"{audio_filename} failed with {backend.name}: {error}")
+                        return None
+
+                    await asyncio.sleep(retry_delay * 2**retry_number)
+
+        cache.put(audio_hash, backend.name, transcription, confidence)
+
+        return transcription, confidence
+
+    #every backend runs at the same time. Rows with the same audio (e.g. duplicated File and Line rows)
+    # share one task so the clip is only sent once
+    tasks = {}
+
+    for backend in backends:
+        for audio_filename, audio_hash in zip(audio_filenames, audio_hashes):
+            if (audio_hash, backend.name) not in tasks:
+                tasks[(audio_hash, backend.name)] = asyncio.ensure_future(transcribe_clip(backend, audio_filename, audio_hash))
+
+    await asyncio.gather(*tasks.values())
+
+    failed_rows = []
+
+    for backend in backends:
+
+        results = [tasks[(audio_hash, backend.name)].result() for audio_hash in audio_hashes]
+
+        #writes the results to the dataframe one column at a time
+        gs_df[backend.transcription_column] = [np.nan if result is None else result[0] for result in results]
+
+        if backend.confidence_column is not None:
+            gs_df[backend.confidence_column] = [np.nan if result is None or result[1] is None else result[1] for result in results]
+
+        failed_rows.extend((file_row.File, file_row.Line, backend.name)
+                           for file_row, result in zip(gs_df.itertuples(), results) if result is None)
+
+    return gs_df, failed_rows
+
+
+@profiled("2.4")
+def run_transcriptions(gs_df, audio_file_path, backends, cache_path, **kwargs):
+    """Runs transcribe_dataframe from a script. In a notebook, await transcribe_dataframe instead."""
+
+    return asyncio.run(transcribe_dataframe(gs_df, audio_file_path, backends, cache_path, **kwargs))
+
+
+##this sets up all five services in the same way as the step 2.4 notebook
+## see the notebook for the keys, paths and clients these need
+# backends = [AmazonBackend(transcribe, be_s3_bucket_path),
+#             DeepSpeechBackend(),
+#             GoogleBackend(be_gcs_uri_path, credential_path),
+#             IBMWatsonBackend(stt),
+#             MicrosoftBackend(speech_key, speech_location)]
+
+##this will fill all of the transcription columns for be, caching the results as they come back
+## if it crashes, run it again with the same cache file and it will pick up where it left off
+# be_gs_df, failed_rows = await transcribe_dataframe(be_gs_df, be_audio_file_path, backends, "be_ASRcache.jsonl")
+
+##this is the same, but offline with the mock backend for testing
+# be_gs_df, failed_rows = await transcribe_dataframe(be_gs_df, be_audio_file_path, [MockBackend(delay=0.1)], "mock_cache.jsonl")
@@ -0,0 +1,259 @@
+"""
+This is a faster version of clean_utterance_content from the step 2.5 notebook.
+
+The notebook calls clean_utterance_content once per cell for Content and each ASR transcription, and every call
+imports num2words and word_tokenize again and builds the censored words and reductions again. Inside the loop over
+the tokens, it finds each token with tokenized_content.index(content_word), which looks through the whole list every
+time and finds the first token with the same text rather than the current one, and it copies the list to add the words
+of a reduction.
+The code here does the following instead:
+    (1) builds the rules once when this file is imported: the replacements done before tokenizing are one regular
+        expression, and the censored words and reductions are a set and a dictionary
+    (2) goes through the tokens once, by position, writing the cleaned tokens to a new list
+    (3) remembers the words num2words gives for each number, since the same numbers come up again and again
+    (4) cleans each distinct utterance of a column only once, and can spread the distinct utterances across processes
+
+The output is the same as the notebook's for every utterance in step2-5_cleaned_csvs.
+"""
+
+import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from nltk.tokenize import word_tokenize
+from num2words import num2words
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#the columns that are cleaned. a column named {column_name}_cleaned is added after each of them
+COLUMN_NAMES = ["Content", "amazon_transcription", "deepspeech_transcription",
+                "google_transcription", "IBMWatson_transcription", "microsoft_transcription"]
+
+#a list of censored words. CORAAL includes these without censoring
+#  however, the ASR services censor them. I believe it is possible to turn
+#  off the censoring filter. However, given that most everyday users of an ASR like Siri would
+#  likely not take this step, I felt it more natural to include the censorship
+CENSOR_WORDS = frozenset(["shit", "shits", "fuck", "fucks", "fucking", "fucked",
+                          "fucker", "fuckers", "motherfucker", "motherfuckers",
+                          "damn", "bitch", "bitches", "bastard", "bastards",
+                          "ass", "asses", "goddamn", "nigga", "niggas"])
+
+#a dictionary of reductions to be converted
+REDUCTIONS = {
+    "musta": ["must", "have"],
+    "woulda": ["would", "have"],
+    "shoulda": ["should", "have"],
+    "coulda": ["could", "have"],
+    "mighta": ["might", "have"],
+    "gonna": ["going", "to"],
+    "hafta": ["have", "to"],
+    "tryna": ["trying", "to"],
+    "sposta": ["supposed", "to"],
+    "finna": ["fixing", "to"],
+    "gotta": ["got", "to"],
+    "wanna": ["want", "to"],
+    "oughta": ["ought", "to"],
+    "cause": ["because"],
+    "til": ["until"],
+    "'em": ["them"],
+    "lemme": ["let", "me"],
+    "whatchu": ["what", "are", "you"],
+    "gotcha": ["got", "you"],
+}
+
+#replaces a few reductions because the nltk tokenizer will split them here
+# and the reduction cleaner later in the code won't catch them, along with a few symbols.
+# these are done in one pass, which gives the same result as the notebook's chain of str.replace calls
+# because none of the replacements contain another one's text. %HESITATION has to come before %
+PRE_TOKENIZING_REPLACEMENTS = {"gotta": "got to", "gonna": "going to", "wanna": "want to", "lemme": "let me",
+                               "%HESITATION": "", "#": "number", "&": "and", "%": "percent", "+": "plus"}
+
+PRE_TOKENIZING_REGEX = re.compile("|".join(re.escape(old) for old in PRE_TOKENIZING_REPLACEMENTS))
+
+# this list of punctuation is specific and not the same as
+#  the python string library which has string.punctuation.
+#  the notebook checks if a token is in this string, so any piece of it (e.g. "," or "./") is removed
+PUNCTUATION_TOKENS = '!"#%&\'()*+,-./:;<=>?@[\\]^_`{|}~'
+
+
+#####################################################################################################
+############################### SECTION 1: CLEANING ONE UTTERANCE ###################################
+#####################################################################################################
+
+@lru_cache(maxsize=None)
+def number_to_words(number):
+    """Takes a number as a string and returns num2words of it, remembering the result."""
+
+    return num2words(number)
+
+
+def replace_before_tokenizing(utterance_content):
+    """Does the replacements the notebook does before tokenizing, and strips the punctuation from the edges of words."""
+
+    utterance_content = PRE_TOKENIZING_REGEX.sub(lambda match: PRE_TOKENIZING_REPLACEMENTS[match.group(0)], utterance_content)
+
+    #the censoring stars are only replaced in the same order as the notebook when there are any
+    if "***" in utterance_content:
+        utterance_content = utterance_content.replace("***", "****").replace("*****", "****")
+
+    #strips the words in the utterance of hyphens and underscores
+    #  this is because if a conjunction has one of these at the end
+    #  nltk will not tokenize it correctly
+    return " ".join([word.strip(string.punctuation) for word in utterance_content.strip().split()])
+
+
+def clean_tokens(tokens):
+    """
+    Takes the tokens of an utterance and returns the cleaned tokens: censored words are replaced with stars,
+    reductions are written out, and times, dollar and cent amounts, and numbers are written as words.
+    Tokens that are only punctuation are removed.
+    """
+
+    cleaned_tokens = []
+
+    for content_word in tokens:
+
+        #replaces censored words with the correct amount of stars
+        if content_word in CENSOR_WORDS:
+            cleaned_tokens.append("****")
+
+        #replaces reductions with complete, separated words
+        elif content_word in REDUCTIONS:
+            cleaned_tokens.extend(REDUCTIONS[content_word])
+
+        #looks for strings which contain the :
+        # which will only be times in the ASR transcriptions
+        elif ":" in content_word.strip(":"):
+
+            hour, minute = content_word.split(":")[:2]
+
+            # if the minute is 00, converts to o'clock
+            cleaned_tokens.extend([number_to_words(hour), "o'clock" if minute == "00" else number_to_words(minute)])
+
+        #converts a dollar or cent amount from numbers to words, replacing the dollar sign
+        elif cleaned_tokens and cleaned_tokens[-1] == "$":
+
+            if content_word.startswith("0."):
+
+                cleaned_tokens[-1:] = [number_to_words(content_word.split(".")[1]), "cents"]
+
+            else:
+
+                dollar_amount = number_to_words(content_word.replace(",", ""))
+
+                cleaned_tokens[-1:] = dollar_amount.split() + ["dollar" if dollar_amount == "one" else "dollars"]
+
+        #converts numbers to words. commas are removed because num2words won't accept them
+        elif content_word.replace(",", "").isnumeric():
+            cleaned_tokens.extend(number_to_words(content_word.replace(",", "")).split())
+
+        # removes tokens which are only punctuation
+        elif content_word in PUNCTUATION_TOKENS:
+            continue
+
+        else:
+            cleaned_tokens.append(content_word)
+
+    return cleaned_tokens
+
+
+def clean_utterance_content(utterance_content):
+    """
+    Cleans the utterance content of both the original CORAAL utterances
+    and also the ASR outputs, the same as the step 2.5 notebook.
+    Returns NaN if utterance_content is not a string.
+    """
+
+    if type(utterance_content) != str:
+        return np.nan
+
+    tokenized_content = clean_tokens(word_tokenize(replace_before_tokenizing(utterance_content)))
+
+    #strips hyphens from the ends of words
+    #  lowercases all letters
+    #  removes any redactions in CORAAL because anytime a redaction
+    #  occurs in the audio, it is covered by a beep which the ASR
+    #  will not be able to transcribe
+    tokenized_content = " ".join([token.strip("-").lower() for token in tokenized_content if "RD-NAME" not in token])
+
+    return tokenized_content.replace("o'clock o'clock", "o'clock")
+
+
+#####################################################################################################
+############################### SECTION 2: CLEANING COLUMNS #########################################
+#####################################################################################################
+
+def clean_utterances(utterances):
+    """Takes a list of utterances and returns a list of the cleaned utterances. This is the function that runs in the worker processes."""
+
+    return [clean_utterance_content(utterance_content) for utterance_content in utterances]
+
+
+@profiled("2.5")
+def clean_columns(gs_df, column_names=COLUMN_NAMES, max_workers=1, chunk_size=500):
+    """
+    Takes a dataframe, the names of the columns to clean, and the number of worker processes to use
+    (1 cleans everything in this process, None uses the number of CPUs).
+    Returns a dictionary of column name: list of cleaned values. Each distinct utterance in the columns
+    is only cleaned once.
+    """
+
+    #the same utterance often shows up in several rows and in several ASR columns
+    utterances = list(dict.fromkeys(utterance_content for column_name in column_names
+                                    for utterance_content in gs_df[column_name] if type(utterance_content) == str))
+
+    if max_workers == 1:
+        cleaned_utterances = clean_utterances(utterances)
+
+    else:
+        chunks = [utterances[start:start + chunk_size] for start in range(0, len(utterances), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            cleaned_utterances = [cleaned_utterance for cleaned_chunk in executor.map(clean_utterances, chunks)
+                                  for cleaned_utterance in cleaned_chunk]
+
+    cleaned_by_utterance = dict(zip(utterances, cleaned_utterances))
+
+    return {column_name: [cleaned_by_utterance.get(utterance_content, np.nan) if type(utterance_content) == str else np.nan
+                          for utterance_content in gs_df[column_name]]
+            for column_name in column_names}
+
+
+def add_cleaned_columns(gs_df, column_names=COLUMN_NAMES, max_workers=1):
+    """
+    Takes a step 2.4 dataframe and adds a {column_name}_cleaned column after each of the columns,
+    the same as the step 2.5 notebook. Returns the dataframe.
+    """
+
+    cleaned_columns = clean_columns(gs_df, column_names, max_workers)
+
+    for column_name in column_names:
+
+        col_index = gs_df.columns.get_loc(column_name)
+
+        gs_df.insert(col_index+1, f"{column_name}_cleaned", pd.Series(cleaned_columns[column_name], index=gs_df.index, dtype=object))
+
+    return gs_df
+
+
+## Designate the input path where the step 2.4 CSVs are stored and the output path for the step 2.5 CSVs
+# csv_input_path = "path"
+# csv_output_path = "path"
+
+##this will clean all of the columns for the three features
+## NOTE: to use more than one process in a notebook, keep this file in the same folder as the notebook and
+##  import it with importlib.import_module("step2-05_compiled_utterance_cleaning")
+# for feature_name in ["aint_variations", "be", "done"]:
+#     gs_df = pd.read_csv(f"{csv_input_path}{feature_name}_ASRtranscripts.csv")
+#     gs_df = add_cleaned_columns(gs_df, max_workers=None)
+#     gs_df = gs_df.sort_values(by=['File', 'Line'])
+#     gs_df.to_csv(f"{csv_output_path}{feature_name}_cleanedUtterances.csv", index=False)
@@ -0,0 +1,460 @@
+"""
+This is a single alignment engine shared by the step 2.7 and step 2.8 notebooks.
+
+In the notebooks, getWER, getWordAlignments, getPreFeatureErr and getPostFeatureErr each build their
+own WagnerFischer table for the same (cleaned original, ASR output) pair, so every row of every ASR
+system is aligned at least four times, and align_WF rebuilds the alignment with list.pop(0).
+The code here does the following instead:
+    (1) fills the edit distance table with numpy, one row of the table at a time
+    (2) walks back through the table once to get the alignment, without popping from lists
+    (3) counts the errors before and after every occurrence of the feature in the same pass
+    (4) memoizes the results, so step 2.7 and step 2.8 share them for the same token lists
+
+The alignment is the one that list(WagnerFischer(...).alignments())[0] returns. That is the optimal
+alignment with the fewest edit operations. When several of those exist, wagnerfischerpp picks one by
+the order it iterates over a set of operation names, which depends on Python's hash seed and so
+changes between notebook sessions. The tie_order argument fixes that order. The default, DEFAULT_TIE_ORDER
+("ISD": insertion, then substitution, then deletion, looking back from the end of the utterance), is used
+for every row. On the published done CSVs it gives the same values as the notebook for all of the rows except
+5 LES rows and 19 VLD rows, and the cells that were left blank in the published CSV (the rows of
+ATL_se0_ag1_m_04_1 line 518 and DCA_se2_ag1_f_07_1 line 951, and the post-feature counts of DCB_se3_ag3_f_02_1
+line 2176), which are filled in here.
+
+To reproduce the published done CSVs, pass PUBLISHED_TIE_ORDERS as the tie_order. It gives the LES and VLD
+rows "SID" and every other row the default. It was fitted to that one file, and only reproduces the order the
+notebook happened to use in the sessions that made it, so it is not a property of the subcorpora.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+#the cleaning process in step 2.5 separates contractions like ain't into "ai" and "n't"
+# these are joined back into one word before aligning, the same way the step 2.8 notebook does
+FEATURE_REJOINS = {"ain't": ("ai n't", "ain't"),
+                   "isn't": ("is n't", "isn't"),
+                   "aren't": ("are n't", "aren't"),
+                   "I'm not": ("i 'm not", "i'm not"),
+                   "didn't": ("did n't", "didn't"),
+                   "haven't": ("have n't", "haven't"),
+                   "hasn't": ("has n't", "hasn't")}
+
+#features that are two tokens long once they are rejoined
+MULTI_TOKEN_FEATURES = {"I'm not": ("i'm", "not"),
+                        "i'm not": ("i'm", "not")}
+
+ASR_SYSTEMS = ["amazon", "deepspeech", "google", "IBMWatson", "microsoft"]
+
+DEFAULT_TIE_ORDER = "ISD"
+
+#the tie orders, by the start of File, that reproduce the published done CSVs. these were fitted to that one file
+PUBLISHED_TIE_ORDERS = {"LES": "SID", "VLD": "SID"}
+
+
+class WordAlignment(NamedTuple):
+    """
+    The result of aligning an original utterance with an ASR output.
+    The error count tuples have one entry per occurrence of the feature, in the order they occur,
+    so the counts for an IterationNumber n are at index n-1.
+    """
+
+    cost: int
+    wer: float
+    alignment: tuple
+    feature_indexes: tuple
+    pre_feature_error_counts: tuple
+    post_feature_error_counts: tuple
+
+
+#####################################################################################################
+############################### SECTION 1: THE EDIT DISTANCE TABLE ##################################
+#####################################################################################################
+
+def _segmented_running_min(values, resets, step_cost):
+    """
+    Takes a row of candidate values, a boolean row marking where a chain of insertions cannot
+    continue from the cell to its left, and the amount an insertion adds.
+    Returns row[j] = min(values[j], row[j-1] + step_cost) wherever that chain can continue.
+    """
+
+    offsets = np.arange(len(values), dtype=np.int64) * step_cost
+
+    #each segment is pushed below every segment before it, so a running minimum never carries
+    # over from one segment into the next
+    segment_offsets = np.cumsum(resets, dtype=np.int64) * (int(values.max()) + int(offsets[-1]) + 1)
+
+    return np.minimum.accumulate(values - offsets - segment_offsets) + offsets + segment_offsets
+
+
+def get_edit_tables(original_list, ASR_list):
+    """
+    Takes the original and ASR token lists. Returns (costs, steps, matches), where costs is the
+    edit distance table, steps holds the fewest edit operations of any optimal path to each cell,
+    and matches marks the cells whose tokens are the same.
+    Insertions, deletions and substitutions each cost 1, the same as wagnerfischerpp's defaults.
+    """
+
+    n_original = len(original_list)
+    n_ASR = len(ASR_list)
+
+    #the tokens are coded as integers so the comparisons can be done in numpy
+    vocabulary = {}
+    original_codes = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in original_list], dtype=np.int64)
+    ASR_codes = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in ASR_list], dtype=np.int64)
+
+    matches = np.zeros((n_original + 1, n_ASR + 1), dtype=bool)
+    matches[1:, 1:] = original_codes[:, None] == ASR_codes[None, :]
+
+    costs = np.empty((n_original + 1, n_ASR + 1), dtype=np.int64)
+    steps = np.empty((n_original + 1, n_ASR + 1), dtype=np.int64)
+
+    #the first row is all insertions and the first column is all deletions
+    costs[0] = steps[0] = np.arange(n_ASR + 1)
+    costs[:, 0] = steps[:, 0] = np.arange(n_original + 1)
+
+    if n_ASR == 0:
+        return costs, steps, matches
+
+    #a cell in the first column can never be reached by an insertion
+    resets = np.ones(n_ASR + 1, dtype=bool)
+
+    for i in range(1, n_original + 1):
+
+        row_matches = matches[i, 1:]
+        up_costs = costs[i - 1, 1:]
+        diagonal_costs = costs[i - 1, :-1]
+
+        #matching tokens always take the diagonal, the same as wagnerfischerpp
+        candidates = np.empty(n_ASR + 1, dtype=np.int64)
+        candidates[0] = i
+        candidates[1:] = np.where(row_matches, diagonal_costs, np.minimum(up_costs, diagonal_costs) + 1)
+
+        resets[1:] = row_matches
+        costs[i] = _segmented_running_min(candidates, resets, 1)
+
+        #marks which operations give the optimal cost at each cell
+        row_costs = costs[i, 1:]
+        deletes = ~row_matches & (up_costs + 1 == row_costs)
+        substitutes = ~row_matches & (diagonal_costs + 1 == row_costs)
+        inserts = ~row_matches & (costs[i, :-1] + 1 == row_costs)
+
+        #gets the fewest operations from the cells above and to the upper left
+        # then lets chains of optimal insertions lower them further along the row
+        big = n_original + n_ASR + 1
+        candidates[1:] = np.minimum(np.where(deletes, steps[i - 1, 1:] + 1, big),
+                                    np.where(row_matches | substitutes, steps[i - 1, :-1] + 1, big))
+
+        resets[1:] = ~inserts
+        steps[i] = _segmented_running_min(candidates, resets, 1)
+
+    return costs, steps, matches
+
+
+#####################################################################################################
+############################### SECTION 2: ALIGNING #################################################
+#####################################################################################################
+
+def get_alignment(original_list, ASR_list, tie_order="ISD"):
+    """
+    Takes the original and ASR token lists and the order to break ties between insertions ("I"),
+    substitutions ("S") and deletions ("D"). Returns (cost, alignment), where the alignment is a list
+    of (original token, ASR token) tuples with "-" for a missing token, the same as align_WF.
+    """
+
+    costs, steps, matches = get_edit_tables(original_list, ASR_list)
+
+    #the moves back through the table for each operation
+    moves = {"I": (0, 1), "S": (1, 1), "D": (1, 0)}
+
+    alignment = []
+
+    i = len(original_list)
+    j = len(ASR_list)
+
+    while i > 0 or j > 0:
+
+        if i > 0 and j > 0 and matches[i, j]:
+            operation = "M"
+
+        elif i == 0:
+            operation = "I"
+
+        elif j == 0:
+            operation = "D"
+
+        else:
+            #takes the first operation in the tie order that is on an optimal path with the fewest operations
+            for operation in tie_order:
+
+                di, dj = moves[operation]
+
+                if costs[i - di, j - dj] + 1 == costs[i, j] and steps[i - di, j - dj] + 1 == steps[i, j]:
+                    break
+
+        if operation == "I":
+            alignment.append(("-", ASR_list[j - 1]))
+            j -= 1
+
+        elif operation == "D":
+            alignment.append((original_list[i - 1], "-"))
+            i -= 1
+
+        else:
+            alignment.append((original_list[i - 1], ASR_list[j - 1]))
+            i -= 1
+            j -= 1
+
+    alignment.reverse()
+
+    return int(costs[-1, -1]), alignment
+
+
+def get_feature_indexes(alignment, feature):
+    """
+    Takes an alignment and a feature. Returns the indexes of the alignment tuples where the
+    original utterance has the feature, the same way getPreFeatureErr and getPostFeatureErr find them.
+    """
+
+    if feature in MULTI_TOKEN_FEATURES:
+
+        feature_tokens = MULTI_TOKEN_FEATURES[feature]
+
+        return tuple(x for x in range(len(alignment) - len(feature_tokens) + 1)
+                     if tuple(pair[0] for pair in alignment[x:x + len(feature_tokens)]) == feature_tokens)
+
+    return tuple(x for x, pair in enumerate(alignment) if pair[0] == feature)
+
+
+@lru_cache(maxsize=100000)
+def _align_tokens(original_tokens, ASR_tokens, feature, tie_order):
+    """
+    The memoized part of align_utterances. Takes tuples of tokens so they can be hashed.
+    """
+
+    cost, alignment = get_alignment(original_tokens, ASR_tokens, tie_order)
+
+    #running count of mismatched tuples, so the errors on either side of every occurrence
+    # of the feature can be read off without looping over the alignment again
+    errors_before = np.concatenate(([0], np.cumsum([pair[0] != pair[1] for pair in alignment], dtype=np.int64)))
+
+    feature_indexes = get_feature_indexes(alignment, feature) if feature is not None else ()
+
+    return WordAlignment(cost=cost,
+                         wer=cost / len(original_tokens) if original_tokens else np.nan,
+                         alignment=tuple(alignment),
+                         feature_indexes=feature_indexes,
+                         pre_feature_error_counts=tuple(int(errors_before[x]) for x in feature_indexes),
+                         post_feature_error_counts=tuple(int(errors_before[-1] - errors_before[x + 1]) for x in feature_indexes))
+
+
+def rejoin_feature(content, feature):
+    """
+    Takes a cleaned string and a feature. Joins the feature back into one word if the cleaning
+    process split it.
+    """
+
+    if feature in FEATURE_REJOINS:
+        split_feature, joined_feature = FEATURE_REJOINS[feature]
+        return content.replace(split_feature, joined_feature)
+
+    return content
+
+
+def align_utterances(original_utterance, ASR_output, feature=None, tie_order="ISD"):
+    """
+    Takes the cleaned original utterance and ASR output as strings, the feature and the tie order.
+    Returns a WordAlignment, or None if either is not a string.
+    With feature=None nothing is rejoined, which is what step 2.7 does for the WER.
+    """
+
+    if type(original_utterance) != str or type(ASR_output) != str:
+        return None
+
+    original_utterance = rejoin_feature(original_utterance, feature)
+    ASR_output = rejoin_feature(ASR_output, feature)
+
+    return _align_tokens(tuple(original_utterance.split()), tuple(ASR_output.split()), feature, tie_order)
+
+
+#####################################################################################################
+############################### SECTION 3: DROP-IN REPLACEMENTS #####################################
+#####################################################################################################
+
+def getWER(original_utterance, ASR_output, tie_order="ISD"):
+    """
+    Gets the word error rate from the ASR inference, the same as the step 2.7 notebook.
+    """
+
+    result = align_utterances(original_utterance, ASR_output, None, tie_order)
+
+    if result is None:
+        return np.nan
+
+    return result.wer
+
+
+def getWordAlignments(original_utterance, ASR_output, feature, tie_order="ISD"):
+    """
+    Gets alignments between intended and ASR inference, the same as the step 2.8 notebook.
+    The notebook reads the feature from a global variable, here it is passed in.
+    """
+
+    result = align_utterances(original_utterance, ASR_output, feature, tie_order)
+
+    #an empty string rather than NaN, so the cell stays empty when the list is converted to a string
+    if result is None:
+        return ""
+
+    return list(result.alignment)
+
+
+def _get_feature_error_count(error_counts, iteration_number):
+    """
+    Picks the error count for an iteration of the feature the way the step 2.8 notebook does.
+    """
+
+    if len(error_counts) == 0:
+        return np.nan
+
+    #with only one occurrence in the alignment, that occurrence is used whatever the iteration number
+    if len(error_counts) == 1:
+        return error_counts[0]
+
+    return error_counts[iteration_number - 1]
+
+
+def getPreFeatureErr(original_utterance, ASR_output, feature, iteration_number, tie_order="ISD"):
+    """
+    Gets the number of errors before the feature, the same as the step 2.8 notebook.
+    """
+
+    result = align_utterances(original_utterance, ASR_output, feature, tie_order)
+
+    if result is None:
+        return np.nan
+
+    return _get_feature_error_count(result.pre_feature_error_counts, iteration_number)
+
+
+def getPostFeatureErr(original_utterance, ASR_output, feature, iteration_number, tie_order="ISD"):
+    """
+    Gets the number of errors after the feature, the same as the step 2.8 notebook.
+    """
+
+    result = align_utterances(original_utterance, ASR_output, feature, tie_order)
+
+    if result is None:
+        return np.nan
+
+    return _get_feature_error_count(result.post_feature_error_counts, iteration_number)
+
+
+#####################################################################################################
+############################### SECTION 4: DATAFRAMES ###############################################
+#####################################################################################################
+
+def get_tie_orders(gs_df, tie_order=DEFAULT_TIE_ORDER):
+    """
+    Takes a dataframe and a tie order, or a dictionary of CORAAL subcorpus (the start of File): tie order
+    like PUBLISHED_TIE_ORDERS. Returns the tie order of each row, which is DEFAULT_TIE_ORDER for the
+    subcorpora that are not in the dictionary.
+    """
+
+    if isinstance(tie_order, str):
+        return [tie_order] * len(gs_df)
+
+    return [tie_order.get(file_name.split("_")[0], DEFAULT_TIE_ORDER) for file_name in gs_df["File"].astype(str)]
+
+
+@profiled("2.7")
+def add_WER_columns(gs_df, tie_order=DEFAULT_TIE_ORDER):
+    """
+    Takes a step 2.6 dataframe and the tie order (or a dictionary of tie orders, see get_tie_orders),
+    and adds the {asr}_transcription_cleaned_TotalWER columns in the same places as the step 2.7 notebook.
+    Returns the dataframe.
+    """
+
+    tie_orders = get_tie_orders(gs_df, tie_order)
+
+    for asr in ASR_SYSTEMS:
+
+        col_index = gs_df.columns.get_loc(f"{asr}_transcription_cleaned_WordCount")
+
+        gs_df.insert(col_index + 1, f"{asr}_transcription_cleaned_TotalWER",
+                     [getWER(original_utterance, ASR_output, row_tie_order)
+                      for original_utterance, ASR_output, row_tie_order in zip(gs_df["Content_cleaned"], gs_df[f"{asr}_transcription_cleaned"], tie_orders)])
+
+    return gs_df
+
+
+@profiled("2.8")
+def add_error_count_columns(gs_df, feature=None, tie_order=DEFAULT_TIE_ORDER):
+    """
+    Takes a step 2.7 dataframe, the feature and the tie order (or a dictionary of tie orders, see
+    get_tie_orders), and adds the Alignments, preFeature_errorCount and postFeature_errorCount columns for
+    every ASR system in the same places as the step 2.8 notebook. If no feature is given, each row's
+    AintVariation is used, so the ain't dataframe does not have to be split by variation first.
+    Returns the dataframe.
+    """
+
+    if feature is None:
+        features = gs_df["AintVariation"].tolist()
+    else:
+        features = [feature] * len(gs_df)
+
+    tie_orders = get_tie_orders(gs_df, tie_order)
+
+    for asr in ASR_SYSTEMS:
+
+        column_name = f"{asr}_transcription_cleaned"
+
+        alignments = []
+        pre_feature_errors = []
+        post_feature_errors = []
+
+        #each row is aligned once and all three columns are read from the same result
+        for original_utterance, ASR_output, row_feature, iteration_number, row_tie_order in zip(gs_df["Content_cleaned"], gs_df[column_name],
+                                                                                                features, gs_df["IterationNumber"], tie_orders):
+
+            result = align_utterances(original_utterance, ASR_output, row_feature, row_tie_order)
+
+            if result is None:
+                alignments.append("")
+                pre_feature_errors.append(np.nan)
+                post_feature_errors.append(np.nan)
+
+            else:
+                alignments.append(str(list(result.alignment)))
+                pre_feature_errors.append(_get_feature_error_count(result.pre_feature_error_counts, iteration_number))
+                post_feature_errors.append(_get_feature_error_count(result.post_feature_error_counts, iteration_number))
+
+        col_index = gs_df.columns.get_loc(column_name)
+
+        gs_df.insert(col_index + 3, f"{column_name}_Alignments", alignments)
+        gs_df.insert(col_index + 4, f"{column_name}_preFeature_errorCount", np.array(pre_feature_errors, dtype=float))
+        gs_df.insert(col_index + 5, f"{column_name}_postFeature_errorCount", np.array(post_feature_errors, dtype=float))
+
+    return gs_df
+
+
+## Designate the input path where the step 2.6 CSVs are stored and the output path for the step 2.8 CSVs
+# csv_input_path = "path"
+# csv_output_path = "path"
+
+##this will produce the step 2.7 and step 2.8 columns for all three features in one go
+# import pandas as pd
+# for feature_name, feature in [("aint_variations", None), ("be", "be"), ("done", "done")]:
+#     gs_df = pd.read_csv(f"{csv_input_path}{feature_name}_wordCount.csv")
+#     gs_df = add_WER_columns(gs_df)
+#     gs_df = add_error_count_columns(gs_df, feature)
+#     gs_df = gs_df.sort_values(by=['File', 'Line'])
+#     gs_df.to_csv(f"{csv_output_path}{feature_name}_errorCounts.csv", index=False)
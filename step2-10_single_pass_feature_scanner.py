@@ -0,0 +1,379 @@
+"""
+This is a single pass over the cleaned utterances for the step 2.10, 2.11, 2.12 and 2.12.5 notebooks.
+
+In the notebooks, checkForFeature (2.10), checkAdjacentTokens (2.11), copyFeatureColumns (2.12) and the
+Habituality/Completive loop (2.12.5) each go through every row with itertuples and write each cell with .loc,
+each of them splits the cleaned strings again for every ASR system, and each has its own chain of
+if feature == "ain't" ... elif feature == "hasn't" to join the feature back into one token.
+The code here does the following instead:
+    (1) describes each feature (and each ain't variation) once in FEATURE_VARIANTS: how step 2.5 splits it,
+        the token it is joined back into, and which adjacent token check it uses
+    (2) splits each cleaned original utterance and each cleaned ASR output once, and gets the containsFeature
+        and adjacentTokens values for every ASR system from the same tokens
+    (3) gets the correctness and Habituality/Completive columns for whole columns at once with numpy
+    (4) returns the dataframe of each of the four steps from that one pass
+
+The values are the same as the notebooks', including their codes for the cases that are left for the manual
+check in step 2.13. A new ASR system is one more name in asr_systems, and a new variation is one more entry in
+FEATURE_VARIANTS.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+ASR_SYSTEMS = ["amazon", "deepspeech", "google", "IBMWatson", "microsoft"]
+
+#the column that says which variation a row is, for the features that have more than one
+VARIATION_COLUMNS = {"aint_variations": "AintVariation"}
+
+#the column step 2.12.5 adds for each feature, which is 1 when every instance in the line is the feature
+BINARY_COLUMNS = {"be": "Habituality", "done": "Completive"}
+
+#the reductions that step 2.11 writes out before comparing the adjacent tokens
+ADJACENT_TOKEN_REPLACEMENTS = [("gon na", "going to"), ("got ta", "got to"), ("wan na", "want to"), ("i 'm a be", "i 'm going to be")]
+
+#this doesn't include modals which are compounds that contain "to"
+#  such as "going to" and "used to" because if the code checks for
+#  L1s being the same and if both are "to" then it will deem it correct
+MODALS = ["can", "could", "will", "would", "'ll", "may",
+          "might", "must", "shall", "should", "'d"]
+
+#compound modals
+MULTI_MODALS = [["going", "to"], ["got", "to"], ["has", "to"],
+                ["have", "to"], ["supposed", "to"], ["used", "to"],
+                ["ought", "to"]]
+
+#negated modals
+NEG_MODALS = [["ca", "n't"], ["could", "n't"], ["wo", "n't"],
+              ["would", "n't"], ["must", "n't"], ["should", "n't"]]
+
+#combined list. the single modals are compared with L1 and the others with L2-L1
+MEGA_MODALS = MODALS + MULTI_MODALS + NEG_MODALS
+
+
+#####################################################################################################
+############################### SECTION 1: ADJACENT TOKEN CHECKS ####################################
+#####################################################################################################
+
+# each check takes (the feature token, the cleaned original tokens, the cleaned ASR tokens,
+# InstancesCountPerLine, FeatureCountPerLine, IterationNumber) and returns the step 2.11 value.
+# a ValueError or IndexError (e.g. when the ASR output does not have the feature) is turned into -7 by the caller
+
+def check_L1_R1_or_L1(token, split_input, split_output, instances_count, feature_count, iteration_number):
+    """1 if the tokens from L1 to R1 or just the L1 tokens match, otherwise 0. NaN when the line has more than one instance."""
+
+    if instances_count != 1:
+        return np.nan
+
+    input_index = split_input.index(token)
+    output_index = split_output.index(token)
+
+    if split_input[input_index-1:input_index+2] == split_output[output_index-1:output_index+2]:
+        return 1
+
+    elif split_input[input_index-1] == split_output[output_index-1]:
+        return 1
+
+    return 0
+
+
+def check_L1_R1(token, split_input, split_output, instances_count, feature_count, iteration_number):
+    """1 if the tokens from L1 to R1 match, otherwise 0. NaN when the line has more than one instance."""
+
+    if instances_count != 1:
+        return np.nan
+
+    input_index = split_input.index(token)
+    output_index = split_output.index(token)
+
+    return 1 if split_input[input_index-1:input_index+2] == split_output[output_index-1:output_index+2] else 0
+
+
+def _compare_modals(L1_input, L2_L1_input, L1_output, L2_L1_output):
+    """Returns 0-3 for the first of the four ways the modals before the feature can match, or None."""
+
+    for match_number, (input_tokens, output_tokens) in enumerate([(L1_input, L1_output), (L2_L1_input, L2_L1_output),
+                                                                   (L1_input, L2_L1_output), (L2_L1_input, L1_output)]):
+
+        if input_tokens in MEGA_MODALS and output_tokens in MEGA_MODALS:
+            return match_number
+
+    return None
+
+
+def check_be(token, split_input, split_output, instances_count, feature_count, iteration_number):
+    """
+    The step 2.11 codes for "be". Positive codes (1-13) are the ways the adjacent tokens can match, -1 and -2 are
+    turned into 0 (incorrect) in step 2.12, and the other negative codes are left for the manual check.
+    """
+
+    if instances_count == 1:
+
+        input_index = split_input.index(token)
+        output_index = split_output.index(token)
+
+        L1_input = split_input[input_index-1]
+        L1_output = split_output[output_index-1]
+
+        if split_output[0] == "be" and split_input[0] == "be":
+            return 1
+
+        elif split_output[0] == "be" and split_input[0] != "be":
+            return -1
+
+        elif split_input[input_index-1:input_index+2] == split_output[output_index-1:output_index+2]:
+            return 2
+
+        elif L1_input == L1_output:
+            return 3
+
+        match_number = _compare_modals(L1_input, split_input[input_index-2:input_index],
+                                       L1_output, split_output[output_index-2:output_index])
+
+        if match_number is not None:
+            return 4 + match_number
+
+        elif feature_count >= 1 and L1_output in MODALS:
+            return -2
+
+        return -3
+
+    elif instances_count > 1:
+
+        input_indexes = [index for index, input_token in enumerate(split_input) if input_token == "be"]
+        output_indexes = [index for index, output_token in enumerate(split_output) if output_token == "be"]
+
+        if len(input_indexes) != len(output_indexes):
+            return -4
+
+        input_index = input_indexes[iteration_number-1]
+        output_index = output_indexes[iteration_number-1]
+
+        L1_input = split_input[input_index-1]
+        L1_output = split_output[output_index-1]
+
+        if split_input[input_index-1:input_index+2] == split_output[output_index-1:output_index+2]:
+            return 8
+
+        elif L1_input == L1_output:
+            return 9
+
+        match_number = _compare_modals(L1_input, split_input[input_index-2:input_index],
+                                       L1_output, split_output[output_index-2:output_index])
+
+        if match_number is not None:
+            return 10 + match_number
+
+        return -5
+
+    return -6
+
+
+class FeatureVariant(NamedTuple):
+    """
+    How a feature is found in the cleaned utterances.
+        split_form          how step 2.5 splits it, or None if it stays one token
+        token               the token it is joined back into
+        check_adjacent      the step 2.11 check, or None for a variation whose adjacent tokens are not checked
+    """
+
+    split_form: str
+    token: str
+    check_adjacent: object
+
+
+#the ain't variations are in the same order as the notebooks put them back together
+FEATURE_VARIANTS = {
+    "ain't": FeatureVariant("ai n't", "ain't", check_L1_R1_or_L1),
+    "isn't": FeatureVariant("is n't", "isn't", check_L1_R1_or_L1),
+    "aren't": FeatureVariant("are n't", "aren't", check_L1_R1_or_L1),
+    #the step 2.11 notebook renames this feature before checking it, so none of its checks apply
+    # and every I'm not row is left for the manual check
+    "I'm not": FeatureVariant("i 'm not", "i'mnot", None),
+    "didn't": FeatureVariant("did n't", "didn't", check_L1_R1_or_L1),
+    "haven't": FeatureVariant("have n't", "haven't", check_L1_R1_or_L1),
+    "hasn't": FeatureVariant("has n't", "hasn't", check_L1_R1_or_L1),
+    "be": FeatureVariant(None, "be", check_be),
+    "done": FeatureVariant(None, "done", check_L1_R1),
+}
+
+
+#####################################################################################################
+############################### SECTION 2: THE SINGLE PASS ##########################################
+#####################################################################################################
+
+def split_cleaned_utterance(cleaned_utterance, variant):
+    """
+    Takes a cleaned utterance and a FeatureVariant. Writes out the reductions, joins the feature back into
+    one token and splits the utterance into tokens, the same as the step 2.10 and 2.11 notebooks.
+    """
+
+    for old, new in ADJACENT_TOKEN_REPLACEMENTS:
+        cleaned_utterance = cleaned_utterance.replace(old, new)
+
+    if variant.split_form is not None:
+        cleaned_utterance = cleaned_utterance.replace(variant.split_form, variant.token)
+
+    return cleaned_utterance.split()
+
+
+def scan_row(variant, cleaned_input, cleaned_outputs, instances_count, feature_count, iteration_number):
+    """
+    Takes a FeatureVariant, a row's Content_cleaned, a list of its cleaned ASR outputs and its counts.
+    Returns a list of (containsFeature, adjacentTokens) for each ASR output.
+    """
+
+    split_input = split_cleaned_utterance(cleaned_input, variant) if type(cleaned_input) == str else None
+
+    scanned = []
+
+    for cleaned_output in cleaned_outputs:
+
+        #the notebooks give NaN and -7 when the ASR system returned nothing
+        if type(cleaned_output) != str:
+            scanned.append((np.nan, -7))
+            continue
+
+        split_output = split_cleaned_utterance(cleaned_output, variant)
+
+        contains_feature = 1 if variant.token in split_output else 0
+
+        if variant.check_adjacent is None:
+            adjacent_tokens = np.nan
+
+        #the notebook stops with an error when the original utterance doesn't have the feature
+        elif split_input is None:
+            adjacent_tokens = -7
+
+        else:
+            try:
+                adjacent_tokens = variant.check_adjacent(variant.token, split_input, split_output,
+                                                         instances_count, feature_count, iteration_number)
+            except (ValueError, IndexError):
+                adjacent_tokens = -7
+
+        scanned.append((contains_feature, adjacent_tokens))
+
+    return scanned
+
+
+def get_correctness(contains_feature, adjacent_tokens):
+    """
+    Takes arrays of containsFeature and adjacentTokens values and returns the step 2.12 correctness values:
+    0 when the feature is missing, 1 when the adjacent tokens match, 0 for the -1 and -2 codes, and NaN otherwise.
+    """
+
+    return np.select([contains_feature == 0, adjacent_tokens >= 1, np.isin(adjacent_tokens, [-1, -2])],
+                     [0.0, 1.0, 0.0], default=np.nan)
+
+
+def get_binary_column(gs_df):
+    """Returns the step 2.12.5 Habituality/Completive values: 0 with no features, 1 when every instance is the feature."""
+
+    feature_counts = gs_df["FeatureCountPerLine"].to_numpy(dtype=float)
+    instances_counts = gs_df["InstancesCountPerLine"].to_numpy(dtype=float)
+
+    return np.select([feature_counts == 0, (instances_counts == feature_counts) & (feature_counts >= 1)],
+                     [0.0, 1.0], default=np.nan)
+
+
+@profiled("2.10-2.12.5")
+def scan_features(gs_df, feature_name, asr_systems=ASR_SYSTEMS):
+    """
+    Takes a step 2.9 dataframe, its feature name (aint_variations, be or done) and the ASR systems.
+    Returns the dataframe with the containsFeature, adjacentTokens and correctness columns after each
+    cleaned ASR output and, for be and done, the Habituality/Completive column after FeatureCountPerLine.
+    The ain't rows are grouped by variation in the order of FEATURE_VARIANTS, the same as the notebooks.
+    """
+
+    if feature_name in VARIATION_COLUMNS:
+
+        variation_column = VARIATION_COLUMNS[feature_name]
+
+        unknown_variations = set(gs_df[variation_column]) - set(FEATURE_VARIANTS)
+        if unknown_variations:
+            raise Exception(f"""These variations are not in FEATURE_VARIANTS: {sorted(map(str, unknown_variations))}""")
+
+        variation_order = {variation: order for order, variation in enumerate(FEATURE_VARIANTS)}
+        gs_df = gs_df.iloc[np.argsort(gs_df[variation_column].map(variation_order).to_numpy(), kind="stable")]
+
+        variations = gs_df[variation_column].tolist()
+
+    else:
+        variations = [feature_name] * len(gs_df)
+
+    column_names = [f"{asr}_transcription_cleaned" for asr in asr_systems]
+
+    scanned_rows = [scan_row(FEATURE_VARIANTS[variation], cleaned_input, cleaned_outputs,
+                             instances_count, feature_count, iteration_number)
+                    for variation, cleaned_input, instances_count, feature_count, iteration_number, *cleaned_outputs
+                    in zip(variations, gs_df["Content_cleaned"], gs_df["InstancesCountPerLine"],
+                           gs_df["FeatureCountPerLine"], gs_df["IterationNumber"],
+                           *[gs_df[column_name] for column_name in column_names])]
+
+    #an array of rows x ASR systems x (containsFeature, adjacentTokens)
+    scanned = np.array(scanned_rows, dtype=float).reshape(len(gs_df), len(column_names), 2)
+
+    gs_df = gs_df.copy()
+
+    for asr_number, column_name in enumerate(column_names):
+
+        contains_feature = scanned[:, asr_number, 0]
+        adjacent_tokens = scanned[:, asr_number, 1]
+
+        col_index = gs_df.columns.get_loc(column_name)
+
+        gs_df.insert(col_index+1, f"{column_name}_containsFeature", contains_feature)
+        gs_df.insert(col_index+2, f"{column_name}_adjacentTokens", adjacent_tokens)
+        gs_df.insert(col_index+3, f"{column_name}_correctness", get_correctness(contains_feature, adjacent_tokens))
+
+    if feature_name in BINARY_COLUMNS:
+        gs_df.insert(gs_df.columns.get_loc("FeatureCountPerLine")+1, BINARY_COLUMNS[feature_name], get_binary_column(gs_df))
+
+    return gs_df
+
+
+def get_step_dataframes(scanned_df, feature_name, asr_systems=ASR_SYSTEMS):
+    """
+    Takes a dataframe from scan_features. Returns a dictionary of step (2.10, 2.11, 2.12 and 2.12.5):
+    the dataframe that step's notebook writes, with only the columns added up to that step.
+    """
+
+    column_names = [f"{asr}_transcription_cleaned" for asr in asr_systems]
+
+    step_columns = {"2.11": [f"{column_name}_adjacentTokens" for column_name in column_names],
+                    "2.12": [f"{column_name}_correctness" for column_name in column_names],
+                    "2.12.5": [BINARY_COLUMNS[feature_name]] if feature_name in BINARY_COLUMNS else []}
+
+    return {"2.10": scanned_df.drop(columns=step_columns["2.11"] + step_columns["2.12"] + step_columns["2.12.5"]),
+            "2.11": scanned_df.drop(columns=step_columns["2.12"] + step_columns["2.12.5"]),
+            "2.12": scanned_df.drop(columns=step_columns["2.12.5"]),
+            "2.12.5": scanned_df}
+
+
+## Designate the input path where the step 2.9 CSVs are stored and the output paths of the four steps
+# csv_input_path = "path"
+# check_for_feature_path = "path"
+# adjacent_tokens_path = "path"
+# auto_correctness_path = "path"
+# binary_check_path = "path"
+
+##this will produce the step 2.10, 2.11, 2.12 and 2.12.5 CSVs for all three features in one go
+# import pandas as pd
+# for feature_name in ["aint_variations", "be", "done"]:
+#     gs_df = pd.read_csv(f"{csv_input_path}{feature_name}_prePostWER.csv")
+#     gs_df = scan_features(gs_df, feature_name).sort_values(by=['File', 'Line'])
+#     step_dfs = get_step_dataframes(gs_df, feature_name)
+#     step_dfs["2.10"].to_csv(f"{check_for_feature_path}{feature_name}_checkForFeature.csv", index=False)
+#     step_dfs["2.11"].to_csv(f"{adjacent_tokens_path}{feature_name}_checkAdjacentTokens.csv", index=False)
+#     step_dfs["2.12"].to_csv(f"{auto_correctness_path}{feature_name}_autoCorrectness.csv", index=False)
+#     step_dfs["2.12.5"].to_csv(f"{binary_check_path}{'aint' if feature_name == 'aint_variations' else feature_name}_featureBinaryCheck.csv", index=False)
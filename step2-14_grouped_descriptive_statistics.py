@@ -0,0 +1,394 @@
+"""
+This is a grouped version of the step 2.14 notebook, with bootstrap confidence intervals for the bias ratios.
+
+In the notebook, every percentage and WER mean is its own line of code that filters the whole dataframe again
+for one ASR system and one feature class (e.g. amazon and habitual be), and the three features are three copies
+of the same screens of code. A breakdown by Speaker or by CORAAL subcorpus would be more copies of all of it.
+The code here does the following instead:
+    (1) gives every row a group number for its feature class (and any other columns to break the results down by)
+    (2) adds up the correct and incorrect counts and the pre/post feature WERs of every ASR system for all of
+        the groups at once, in one pass over a matrix of the columns
+    (3) gets the percent correct, bias ratios and mean WERs of every ASR system x group from those sums
+    (4) bootstraps the bias ratios by resampling utterances with numpy, many resamples at a time, within each
+        feature class, and returns their confidence intervals
+
+get_step_dataframes returns the same dataframes as the notebook's CSVs, with the same values down to the last digit.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+#pipeline_profiling.py is optional, so this file still works when it is copied next to a notebook on its own
+try:
+    from pipeline_profiling import profiled
+except ImportError:
+    def profiled(stage, count_rows=len, count_result_rows=None):
+        return lambda function: function
+
+
+ASR_SYSTEMS = ["amazon", "deepspeech", "google", "IBMWatson", "microsoft"]
+
+
+class FeatureClass(NamedTuple):
+    """
+    How a feature's rows are split into the feature and the non-feature, and how the notebook names the results.
+        column                  the column that is 1 for the feature and 0 for the non-feature
+        bias_ratio_label        the index of the bias ratio dataframe
+        feature_prefix          the start of the feature's CSV filenames
+        non_feature_prefix      the start of the non-feature's CSV filenames
+        bias_ratio_prefix       the start of the bias ratio CSV filename
+        no_correct_message      what the bias ratio is when none of the feature was transcribed correctly
+    """
+
+    column: str
+    bias_ratio_label: str
+    feature_prefix: str
+    non_feature_prefix: str
+    bias_ratio_prefix: str
+    no_correct_message: str
+
+
+FEATURE_CLASSES = {
+    "aint_variations": FeatureClass("Aint_NonAint", "Non-aint/aint", "aint_variations", "nonAint_variations",
+                                    "aint_variations", "No ain't correct"),
+    "be": FeatureClass("Habituality", "Non-Habitual/Habitual", "habitualBe", "nonHabitualBe",
+                       "be", "No Habitual Be correct"),
+    "done": FeatureClass("Completive", "Non-Completive/Completive", "completiveDone", "nonCompletiveDone",
+                         "done", "No Completive Done correct"),
+}
+
+#the columns that make an utterance, which are resampled together in the bootstrap
+UTTERANCE_COLUMNS = ["File", "Line"]
+
+#the most utterance indices drawn at a time in the bootstrap, to keep its memory down
+MAX_DRAWS_PER_CHUNK = 5000000
+
+
+def add_subcorpus_column(gs_df):
+    """Adds a Subcorpus column with the CORAAL subcorpus of each row (e.g. ATL for ATL_se0_ag1_f_03_1) after File. Returns the dataframe."""
+
+    gs_df.insert(gs_df.columns.get_loc("File")+1, "Subcorpus", gs_df["File"].str.split("_").str[0])
+
+    return gs_df
+
+
+#####################################################################################################
+############################### SECTION 1: GROUPED SUMS #############################################
+#####################################################################################################
+
+def get_group_codes(gs_df, key_columns):
+    """
+    Takes a dataframe and the columns to group by. Returns (the group number of each row, a dataframe of the
+    groups' key values in the order of their numbers). Rows with a missing key value get -1.
+    """
+
+    grouped = gs_df.groupby(list(key_columns), sort=True, dropna=True)
+
+    #the groups are sorted by their keys, which is also the order ngroup numbers them in
+    return grouped.ngroup().to_numpy(), grouped.size().index.to_frame(index=False)
+
+
+def get_group_sums(codes, n_groups, values):
+    """
+    Takes the group number of each row, the number of groups and a matrix of rows x values.
+    Returns a matrix of groups x the sums of the values. Rows with a group number of -1 are left out.
+    Each group's values are summed in their row order the same way numpy sums a column, so the means
+    are the same as pandas' Series.mean of the group's rows down to the last digit.
+    """
+
+    keep = codes >= 0
+    codes = codes[keep]
+    values = values[keep]
+
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+
+    #the first row of each group once the rows are sorted by group
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(sorted_codes) else np.array([], dtype=np.int64)
+
+    sums = np.zeros((n_groups, values.shape[1]))
+
+    #values x rows, so each group's rows of a value are next to each other in memory like a column of its own
+    sorted_values = np.ascontiguousarray(values[order].T)
+    stops = np.r_[starts[1:], len(sorted_codes)]
+
+    for group_number, start, stop in zip(sorted_codes[starts], starts, stops):
+        sums[group_number] = sorted_values[:, start:stop].sum(axis=1)
+
+    return sums
+
+
+def get_value_matrix(gs_df, asr_systems=ASR_SYSTEMS):
+    """
+    Takes a step 2.13 dataframe. Returns a matrix of rows x (1, then for each ASR system: correct, incorrect,
+    pre-feature WER, has a pre-feature WER, post-feature WER, has a post-feature WER), with 0 for missing WERs.
+    """
+
+    value_columns = [np.ones(len(gs_df))]
+
+    for asr in asr_systems:
+
+        column_name = f"{asr}_transcription_cleaned"
+
+        correctness = gs_df[f"{column_name}_correctness"].to_numpy(dtype=float)
+        pre_feature_WER = gs_df[f"{column_name}_preFeature_WER"].to_numpy(dtype=float)
+        post_feature_WER = gs_df[f"{column_name}_postFeature_WER"].to_numpy(dtype=float)
+
+        value_columns += [correctness == 1, correctness == 0,
+                          np.nan_to_num(pre_feature_WER), ~np.isnan(pre_feature_WER),
+                          np.nan_to_num(post_feature_WER), ~np.isnan(post_feature_WER)]
+
+    return np.column_stack(value_columns).astype(float)
+
+
+#####################################################################################################
+############################### SECTION 2: SUMMARIES ################################################
+#####################################################################################################
+
+def summarize(gs_df, class_column, group_columns=(), asr_systems=ASR_SYSTEMS):
+    """
+    Takes a step 2.13 dataframe, its feature class column (e.g. Habituality), the columns to break the results
+    down by (e.g. ["Speaker"]), and the ASR systems. Returns a dataframe with a row per group x feature class x
+    ASR system with its Count, Correct, Incorrect, PercentCorrect, PercentIncorrect, PreFeatureWER and
+    PostFeatureWER. The percentages are out of all of the group's rows, the same as the notebook.
+    """
+
+    key_columns = list(group_columns) + [class_column]
+
+    codes, keys_df = get_group_codes(gs_df, key_columns)
+    sums = get_group_sums(codes, len(keys_df), get_value_matrix(gs_df, asr_systems))
+
+    counts = sums[:, 0]
+
+    #groups x ASR systems x (correct, incorrect, pre WER sum, pre WER count, post WER sum, post WER count)
+    asr_sums = sums[:, 1:].reshape(len(keys_df), len(asr_systems), 6)
+
+    summary_df = keys_df.loc[keys_df.index.repeat(len(asr_systems))].reset_index(drop=True)
+    summary_df["ASR"] = asr_systems * len(keys_df)
+    summary_df["Count"] = np.repeat(counts, len(asr_systems)).astype(int)
+
+    correct = asr_sums[:, :, 0].ravel()
+    incorrect = asr_sums[:, :, 1].ravel()
+    repeated_counts = summary_df["Count"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary_df["Correct"] = correct.astype(int)
+        summary_df["Incorrect"] = incorrect.astype(int)
+        summary_df["PercentCorrect"] = correct / repeated_counts * 100
+        summary_df["PercentIncorrect"] = incorrect / repeated_counts * 100
+        summary_df["PreFeatureWER"] = (asr_sums[:, :, 2] / asr_sums[:, :, 3]).ravel()
+        summary_df["PostFeatureWER"] = (asr_sums[:, :, 4] / asr_sums[:, :, 5]).ravel()
+
+    return summary_df
+
+
+def get_bias_ratios(summary_df, class_column, group_columns=()):
+    """
+    Takes a dataframe from summarize. Returns a dataframe with a row per group x ASR system with the percent
+    correct of the non-feature (0) and the feature (1), and the BiasRatio of the two, which is missing
+    when none of the feature was correct.
+    """
+
+    key_columns = list(group_columns) + ["ASR"]
+
+    non_feature_df = summary_df[summary_df[class_column] == 0].set_index(key_columns)["PercentCorrect"]
+    feature_df = summary_df[summary_df[class_column] == 1].set_index(key_columns)["PercentCorrect"]
+
+    bias_ratio_df = pd.concat([non_feature_df.rename("NonFeaturePercentCorrect"), feature_df.rename("FeaturePercentCorrect")], axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bias_ratio_df["BiasRatio"] = np.where(bias_ratio_df["FeaturePercentCorrect"] == 0, np.nan,
+                                              bias_ratio_df["NonFeaturePercentCorrect"] / bias_ratio_df["FeaturePercentCorrect"])
+
+    return bias_ratio_df.reset_index()
+
+
+#####################################################################################################
+############################### SECTION 3: BOOTSTRAP ################################################
+#####################################################################################################
+
+def get_quantile(values, quantile):
+    """
+    Takes an array of numbers, some of which can be infinite, and a quantile. Returns the same quantile as np.quantile,
+    which gives NaN instead of infinity when it interpolates between a number and infinity.
+    """
+
+    lower = np.quantile(values, quantile, method="lower")
+    higher = np.quantile(values, quantile, method="higher")
+
+    if lower == higher or not np.isinf(higher):
+        return np.quantile(values, quantile) if lower != higher else lower
+
+    return np.inf
+
+
+def bootstrap_percent_correct(utterance_correct, utterance_rows, n_resamples, rng):
+    """
+    Takes a matrix of utterances x the number of correct rows for each ASR system, the number of rows in each
+    utterance, the number of resamples and a numpy random generator. Returns a matrix of resamples x the percent
+    correct of each ASR system, where each resample draws the same number of utterances with replacement.
+    """
+
+    n_utterances = len(utterance_rows)
+
+    if n_utterances == 0:
+        return np.full((n_resamples, utterance_correct.shape[1]), np.nan)
+
+    percent_correct = np.empty((n_resamples, utterance_correct.shape[1]))
+    chunk_size = max(1, MAX_DRAWS_PER_CHUNK // n_utterances)
+
+    for start in range(0, n_resamples, chunk_size):
+
+        stop = min(start + chunk_size, n_resamples)
+
+        #every utterance index of this chunk of resamples is drawn at once
+        draws = rng.integers(0, n_utterances, size=(stop - start, n_utterances))
+
+        percent_correct[start:stop] = utterance_correct[draws].sum(axis=1) / utterance_rows[draws].sum(axis=1)[:, None] * 100
+
+    return percent_correct
+
+
+@profiled("2.14")
+def bootstrap_bias_ratios(gs_df, class_column, group_columns=(), asr_systems=ASR_SYSTEMS, n_resamples=1000,
+                          confidence=0.95, seed=0, utterance_columns=UTTERANCE_COLUMNS):
+    """
+    Takes a step 2.13 dataframe, its feature class column, the columns to break the results down by, the ASR systems,
+    the number of resamples, the confidence level, the seed, and the columns that make an utterance (None resamples
+    the rows). Returns the get_bias_ratios dataframe with CILower and CIUpper percentile confidence intervals and the
+    number of DefinedResamples (the ones where some of the feature or of the rest was correct). A resample where none of
+    the feature was correct has an infinite ratio, so CIUpper is infinite when more of them than the upper tail do.
+    Utterances are resampled within each group and feature class, so each resample has as many utterances of each
+    feature class as the data, and the instances in the same utterance stay together.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    summary_df = summarize(gs_df, class_column, group_columns, asr_systems)
+    bias_ratio_df = get_bias_ratios(summary_df, class_column, group_columns)
+
+    gs_df = gs_df[gs_df[class_column].isin([0, 1])]
+
+    #the correct counts and number of rows of each utterance, for every group x class x utterance at once
+    if utterance_columns is None:
+        utterance_codes = np.arange(len(gs_df))
+    else:
+        utterance_codes = gs_df.groupby(list(utterance_columns), sort=False, dropna=False).ngroup().to_numpy()
+
+    stratum_codes, strata_df = get_group_codes(gs_df, list(group_columns) + [class_column])
+
+    cell_df = pd.DataFrame({"stratum": stratum_codes, "utterance": utterance_codes})
+    cell_codes, cells_df = get_group_codes(cell_df, ["stratum", "utterance"])
+
+    value_matrix = get_value_matrix(gs_df, asr_systems)
+    cell_sums = get_group_sums(cell_codes, len(cells_df), value_matrix[:, [0] + [1 + 6*asr_number for asr_number in range(len(asr_systems))]])
+
+    cell_strata = cells_df["stratum"].to_numpy()
+
+    #resamples x ASR systems percent correct for each stratum
+    stratum_percents = {}
+
+    for stratum_number in range(len(strata_df)):
+
+        stratum_cells = cell_sums[cell_strata == stratum_number]
+
+        stratum_percents[stratum_number] = bootstrap_percent_correct(stratum_cells[:, 1:], stratum_cells[:, 0], n_resamples, rng)
+
+    stratum_numbers = {tuple(key): stratum_number for stratum_number, key in enumerate(strata_df.itertuples(index=False))}
+
+    alpha = (1 - confidence) / 2
+    ci_rows = []
+
+    group_keys = bias_ratio_df[list(group_columns)].drop_duplicates().itertuples(index=False) if group_columns else [()]
+
+    for group_key in group_keys:
+
+        non_feature_stratum = stratum_numbers.get(tuple(group_key) + (0,))
+        feature_stratum = stratum_numbers.get(tuple(group_key) + (1,))
+
+        if non_feature_stratum is None or feature_stratum is None:
+            resampled_ratios = np.full((n_resamples, len(asr_systems)), np.nan)
+
+        else:
+            feature_percents = stratum_percents[feature_stratum]
+
+            #a resample where none of the feature but some of the rest was correct has an infinite ratio,
+            # which has to stay in the interval. only resamples where neither was correct are left out
+            with np.errstate(divide="ignore", invalid="ignore"):
+                resampled_ratios = stratum_percents[non_feature_stratum] / feature_percents
+
+        for asr_number, asr in enumerate(asr_systems):
+
+            defined_ratios = resampled_ratios[:, asr_number][~np.isnan(resampled_ratios[:, asr_number])]
+
+            #the intervals of ASR systems with no defined resamples are left missing
+            if len(defined_ratios):
+                ci_lower, ci_upper = get_quantile(defined_ratios, alpha), get_quantile(defined_ratios, 1 - alpha)
+            else:
+                ci_lower, ci_upper = np.nan, np.nan
+
+            ci_rows.append(tuple(group_key) + (asr, ci_lower, ci_upper, len(defined_ratios)))
+
+    ci_df = pd.DataFrame(ci_rows, columns=list(group_columns) + ["ASR", "CILower", "CIUpper", "DefinedResamples"])
+
+    return bias_ratio_df.merge(ci_df, on=list(group_columns) + ["ASR"], how="left")
+
+
+#####################################################################################################
+############################### SECTION 4: THE NOTEBOOK DATAFRAMES ##################################
+#####################################################################################################
+
+@profiled("2.14")
+def get_step_dataframes(gs_df, feature_name, asr_systems=ASR_SYSTEMS):
+    """
+    Takes a step 2.13 dataframe and its feature name (aint_variations, be or done). Returns a dictionary of
+    CSV filename: dataframe with the five dataframes the step 2.14 notebook writes for the feature, from one summary.
+    """
+
+    feature_class = FEATURE_CLASSES[feature_name]
+
+    summary_df = summarize(gs_df, feature_class.column, asr_systems=asr_systems)
+
+    step_dfs = {}
+
+    for class_value, prefix in [(1, feature_class.feature_prefix), (0, feature_class.non_feature_prefix)]:
+
+        class_df = summary_df[summary_df[feature_class.column] == class_value].set_index("ASR").reindex(asr_systems)
+
+        percentage_df = pd.DataFrame([class_df["PercentCorrect"].to_numpy(), class_df["PercentIncorrect"].to_numpy()],
+                                     columns=asr_systems, index=["correct", "incorrect"])
+
+        pre_post_WER_df = pd.DataFrame([class_df["PreFeatureWER"].to_numpy(), class_df["PostFeatureWER"].to_numpy()],
+                                       columns=asr_systems, index=["pre-feature", "post-feature"], dtype=object)
+
+        step_dfs[f"{prefix}_percentCorrect.csv"] = percentage_df.round(2)
+        step_dfs[f"{prefix}_summaryWER.csv"] = pre_post_WER_df
+
+    bias_ratios = get_bias_ratios(summary_df, feature_class.column).set_index("ASR")["BiasRatio"].reindex(asr_systems)
+
+    #the notebook writes a message instead of the ratio when none of the feature was correct
+    step_dfs[f"{feature_class.bias_ratio_prefix}_biasRatio.csv"] = pd.DataFrame(
+        [[feature_class.no_correct_message if np.isnan(bias_ratio) else bias_ratio for bias_ratio in bias_ratios]],
+        columns=asr_systems, index=[feature_class.bias_ratio_label], dtype=object)
+
+    return step_dfs
+
+
+## Designate the input path where the step 2.13 CSVs are stored and the output path for the step 2.14 CSVs
+# csv_input_path = "path"
+# csv_output_path = "path"
+
+##this will produce the step 2.14 CSVs for all three features, and the bootstrap confidence intervals of the bias ratios
+# for feature_name in ["aint_variations", "be", "done"]:
+#     gs_df = pd.read_csv(f"{csv_input_path}{feature_name}_manualCorrectness.csv")
+#     for filename, step_df in get_step_dataframes(gs_df, feature_name).items():
+#         step_df.to_csv(f"{csv_output_path}{filename}")
+#     bootstrap_df = bootstrap_bias_ratios(gs_df, FEATURE_CLASSES[feature_name].column)
+#     bootstrap_df.to_csv(f"{csv_output_path}{FEATURE_CLASSES[feature_name].bias_ratio_prefix}_biasRatio_bootstrapCI.csv", index=False)
+
+##the same results broken down by speaker or by CORAAL subcorpus
+# gs_df = add_subcorpus_column(pd.read_csv(f"{csv_input_path}be_manualCorrectness.csv"))
+# subcorpus_summary_df = summarize(gs_df, "Habituality", group_columns=["Subcorpus"])
+# speaker_bias_ratio_df = bootstrap_bias_ratios(gs_df, "Habituality", group_columns=["Speaker"])